@@ -1,24 +1,131 @@
-from flask import Flask, render_template, request, jsonify, g, session
+from flask import Flask, render_template, request, jsonify, g, session, Response, has_request_context
+import atexit
+import itertools
 import json
+import math
 import psycopg2
 import psycopg2.errorcodes
+import psycopg2.extensions
+import psycopg2.pool
+from psycopg2.extras import Json, execute_values
 import time
 import logging
+import logging.handlers
+import queue
 import random
+import socket
 import os
 import sys
+import threading
 import uuid
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest, multiprocess
 
 
-# Configure logging for IBM Cloud Code Engine
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# ===== Structured Logging =====
+# One JSON object per line on stdout (Cloud Logs indexes it as $d.message.*), stamped with the
+# request's trace and span IDs so lines join against app_traces. Request threads only enqueue the
+# record; a listener thread formats and writes it.
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()  # json | text
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')  # per-logger overrides, e.g. "werkzeug=WARNING,app=DEBUG"
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 100))  # keep 1 in N of each sampled event
+LOG_TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Pass as extra= for high-frequency events; sampling is per message template
+LOG_SAMPLED = {'sampled': True}
+
+LOG_RECORDS_DROPPED = Counter('booking_log_records_dropped_total', 'Log records dropped because the log queue was full')
+
+
+class _SampleFilter(logging.Filter):
+    """Lets through 1 in `every` records of each sampled message template; others pass untouched."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(every, 1)
+        self._counts = {}
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False):
+            return True
+        counter = self._counts.get(record.msg)
+        if counter is None:
+            counter = self._counts.setdefault(record.msg, itertools.count())
+        if next(counter) % self.every:
+            return False
+        record.sample_rate = self.every
+        return True
+
+
+class _TraceQueueHandler(logging.handlers.QueueHandler):
+    """Non-blocking handler: stamps the trace context and enqueues the record unformatted.
+
+    Drops (and counts) records when the queue is full rather than stall a request on stdout.
+    """
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only the trace context has to be read here
+        if has_request_context():
+            record.trace_id = g.get('trace_id')
+            stack = g.get('span_stack')
+            record.span_id = stack[-1] if stack else g.get('span_id')
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            entry["span_id"] = _span_hex(getattr(record, 'span_id', None))
+        if hasattr(record, 'sample_rate'):
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Route all logging through the queue/listener pipeline and apply LOG_LEVEL and LOG_LEVELS."""
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(_JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(LOG_TEXT_FORMAT))
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _TraceQueueHandler(log_queue)
+    handler.addFilter(_SampleFilter(LOG_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+    for item in filter(None, (part.strip() for part in LOG_LEVELS.split(','))):
+        name, _, level = item.partition('=')
+        try:
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+        except ValueError:
+            root.warning("Ignoring invalid LOG_LEVELS entry %r", item)
+
+    listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    listener.start()
+    listener.pid = os.getpid()  # a forked worker inherits the object but not its thread
+    atexit.register(listener.stop)
+    return listener
+
+
+log_listener = configure_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
@@ -33,65 +140,807 @@ DB_USER = os.environ.get('DB_USER', 'hippo')
 DB_PASSWORD = os.environ.get('DB_PASSWORD', 'datalake')
 DB_SSLMODE = os.environ.get('DB_SSLMODE', 'prefer')
 
+# ===== Prometheus Metrics =====
+# Latency buckets (seconds) sized for a booking app whose requests sit between a few ms and a few seconds
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    'booking_request_duration_seconds', 'HTTP request latency per endpoint',
+    ['endpoint', 'method'], buckets=REQUEST_LATENCY_BUCKETS
+)
+REQUEST_ERRORS = Counter(
+    'booking_request_errors_total', 'HTTP requests answered with status >= 400',
+    ['endpoint', 'method']
+)
+# Under gunicorn every worker writes to PROMETHEUS_MULTIPROC_DIR; gauges then sum over live workers
+REQUESTS_IN_FLIGHT = Gauge('booking_requests_in_flight', 'HTTP requests currently being handled',
+                           multiprocess_mode='livesum')
+DB_CONNECTIONS_OPEN = Gauge('booking_db_connections_open', 'Database connections currently open, idle pooled ones included',
+                            multiprocess_mode='livesum')
+DB_CONNECTIONS_IN_USE = Gauge('booking_db_connections_in_use', 'Database connections currently checked out',
+                              multiprocess_mode='livesum')
+DB_CONNECT_FAILURES = Counter('booking_db_connect_failures_total', 'Failed database connection attempts')
+TRACE_WRITE_FAILURES = Counter('booking_trace_write_failures_total', 'app_traces inserts that failed')
+
+# (endpoint rule, method) -> (latency histogram child, error counter child).
+# Filled for every registered route at import time so the request path never builds label sets.
+_endpoint_metrics = {}
+
+
+def _endpoint_metric_children(rule, method):
+    children = _endpoint_metrics.get((rule, method))
+    if children is None:
+        children = (REQUEST_LATENCY.labels(rule, method), REQUEST_ERRORS.labels(rule, method))
+        _endpoint_metrics[(rule, method)] = children
+    return children
+
+
+class _TrackedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that keeps the connection gauges in sync and times commits as spans.
+
+    While checked out of the DB pool, close() hands the connection back instead of closing it.
+    """
+    pool = None
+    in_use = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        DB_CONNECTIONS_OPEN.inc()
+
+    def check_out(self, pool=None):
+        self.pool = pool
+        self.in_use = True
+        DB_CONNECTIONS_IN_USE.inc()
+        return self
+
+    def close(self):
+        if self.in_use:
+            self.in_use = False
+            DB_CONNECTIONS_IN_USE.dec()
+        if self.pool is not None:
+            pool, self.pool = self.pool, None
+            pool.putconn(self)  # rolls back an open transaction; closes the connection if it is broken
+            return
+        if not self.closed:
+            DB_CONNECTIONS_OPEN.dec()
+        super().close()
+
+    def commit(self):
+        if not _spans_active():
+            return super().commit()
+        with trace_span('db.commit'):
+            return super().commit()
+
+
+class _TracedCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor that records each statement as a span of the current request."""
+
+    def execute(self, query, vars=None):
+        if not _spans_active():
+            return super().execute(query, vars)
+        with trace_span('db.query', sql=_span_sql(query)) as attrs:
+            result = super().execute(query, vars)
+            attrs['rows'] = self.rowcount
+            return result
+
+    def executemany(self, query, vars_list):
+        if not _spans_active():
+            return super().executemany(query, vars_list)
+        with trace_span('db.query', sql=_span_sql(query)) as attrs:
+            result = super().executemany(query, vars_list)
+            attrs['rows'] = self.rowcount
+            return result
+
+
 # ===== Tracing System =====
-def init_tracing_table():
-    """Create the tracing table if it doesn't exist."""
+# app_traces is range-partitioned by day on timestamp. Expired days are dropped
+# (or detached into an archive schema) whole, so retention never deletes rows.
+TRACE_RETENTION_DAYS = int(os.environ.get('TRACE_RETENTION_DAYS', 30))
+TRACE_PARTITION_PREMAKE_DAYS = int(os.environ.get('TRACE_PARTITION_PREMAKE_DAYS', 3))
+TRACE_ARCHIVE_SCHEMA = os.environ.get('TRACE_ARCHIVE_SCHEMA', '')  # empty = drop expired partitions
+TRACE_MAINTENANCE_INTERVAL_S = int(os.environ.get('TRACE_MAINTENANCE_INTERVAL_S', 3600))
+TRACE_MAINTENANCE_LOCK_KEY = 7210401  # advisory lock, so only one replica runs maintenance at a time
+TRACE_PARTITION_PREFIX = 'app_traces_p'
+
+TRACE_PARTITIONS = Gauge('booking_trace_partitions', 'Daily app_traces partitions currently attached',
+                         multiprocess_mode='max')
+
+# Fixed-width columns first (widest alignment first) so rows carry no padding.
+# Action names live once in trace_actions; status_code indexes TRACE_STATUSES.
+APP_TRACES_DDL = '''
+    CREATE TABLE IF NOT EXISTS app_traces (
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        trace_id UUID NOT NULL,
+        span_id BIGINT,
+        parent_span_id BIGINT,
+        id SERIAL,
+        duration_ms REAL,
+        action_code SMALLINT NOT NULL,
+        status_code SMALLINT NOT NULL DEFAULT 0,
+        user_ip INET,
+        method TEXT,
+        endpoint TEXT,
+        details JSONB,
+        spans JSONB,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp)
+'''
+APP_TRACES_COLUMNS = 'timestamp, trace_id, span_id, parent_span_id, id, duration_ms, action_code, status_code, user_ip, method, endpoint, details, spans'
+
+TRACE_STATUSES = ('success', 'error')
+_action_codes = {}  # action name → trace_actions.code, shared by every request thread
+_action_names = {}  # trace_actions.code → action name
+
+ACTION_CODES_SQL = 'SELECT code, name FROM trace_actions'
+# Only for names not in the table yet: ON CONFLICT DO NOTHING still draws a value from the
+# SMALLSERIAL sequence, so inserting on every cache miss (each worker start) would exhaust it
+ADD_ACTION_SQL = 'INSERT INTO trace_actions (name) VALUES (%s) ON CONFLICT (name) DO NOTHING RETURNING code'
+
+
+def _cache_action_codes(rows):
+    for code, name in rows:
+        _action_codes[name], _action_names[code] = code, name
+
+
+def _action_code(cur, name):
+    """SMALLINT code for an action name, adding it to trace_actions on first use."""
+    code = _action_codes.get(name)
+    if code is not None:
+        return code
+    cur.execute(ACTION_CODES_SQL)
+    _cache_action_codes(cur.fetchall())
+    if name in _action_codes:
+        return _action_codes[name]
+    cur.execute(ADD_ACTION_SQL, (name,))
+    row = cur.fetchone()
+    if row is None:
+        # Another worker added it concurrently, after this statement's snapshot was taken
+        cur.execute('SELECT code FROM trace_actions WHERE name = %s', (name,))
+        row = cur.fetchone()
+    # Commit now so the cached code can't outlive a trace insert that rolls back
+    cur.connection.commit()
+    _cache_action_codes([(row[0], name)])
+    return row[0]
+
+
+def _action_name_map(cur, codes):
+    """code → name for the given codes, reloading the dictionary if another worker added some."""
+    if any(c not in _action_names for c in codes):
+        cur.execute(ACTION_CODES_SQL)
+        _cache_action_codes(cur.fetchall())
+    return _action_names
+
+
+def _format_trace_details(details):
+    """Render structured details as the text the trace endpoints have always returned."""
+    if details is None or 'message' in details:
+        return details and details['message']
+    text = f"User: {details.get('user', 'N/A')}, Phone: {details.get('phone', 'N/A')}, Seats: {','.join(details.get('seats') or [])}"
+    return text + ' → Stored in DB' if details.get('stored') else text
+
+
+def _partition_name(day):
+    return f"{TRACE_PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def _create_trace_partition(cur, day):
+    """Create the partition for one day; rows that already landed in the default partition move into it."""
+    name = _partition_name(day)
+    start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+    cur.execute('SELECT to_regclass(%s) IS NOT NULL', (name,))
+    if cur.fetchone()[0]:
+        return False
+    cur.execute('SELECT EXISTS (SELECT 1 FROM app_traces_default WHERE timestamp >= %s AND timestamp < %s)', (start, end))
+    if not cur.fetchone()[0]:
+        cur.execute(f"CREATE TABLE {name} PARTITION OF app_traces FOR VALUES FROM ('{start}') TO ('{end}')")
+        return True
+    # Maintenance fell behind and the default partition caught this day — move those rows over
+    cur.execute(f'CREATE TABLE {name} (LIKE app_traces INCLUDING DEFAULTS)')
+    cur.execute(f'''
+        WITH moved AS (
+            DELETE FROM app_traces_default WHERE timestamp >= %s AND timestamp < %s RETURNING {APP_TRACES_COLUMNS}
+        )
+        INSERT INTO {name} ({APP_TRACES_COLUMNS}) SELECT {APP_TRACES_COLUMNS} FROM moved
+    ''', (start, end))
+    cur.execute(f"ALTER TABLE app_traces ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+    return True
+
+
+def _migrate_legacy_traces(cur, today):
+    """Rebuild an app_traces table from an older release in the current layout (rows within retention only).
+
+    Covers both the original plain table and the partitioned table with text columns. Trace IDs and
+    IPs that don't parse are dropped or nulled; booking details are parsed back into their fields.
+    """
+    cur.execute('''
+        SELECT c.relkind, a.atttypid = 'uuid'::regtype
+        FROM pg_class c JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = 'trace_id'
+        WHERE c.oid = to_regclass('app_traces')
+    ''')
+    row = cur.fetchone()
+    if not row or row == ('p', True):
+        return
+    logger.info("Migrating app_traces to the compact partitioned layout")
+    cur.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'app_traces'::regclass")
+    for (partition,) in cur.fetchall():
+        cur.execute(f'ALTER TABLE {partition} RENAME TO {partition}_legacy')
+    cur.execute('ALTER TABLE app_traces RENAME TO app_traces_legacy')
+    cur.execute('DROP INDEX IF EXISTS idx_trace_id, idx_trace_timestamp')
+    cur.execute('ALTER INDEX IF EXISTS app_traces_pkey RENAME TO app_traces_legacy_pkey')
+    # The rollup is rebuilt from the migrated rows by init_tracing_table
+    cur.execute('DROP TABLE IF EXISTS trace_sessions')
+    cur.execute(APP_TRACES_DDL)
+    cur.execute('CREATE TABLE IF NOT EXISTS app_traces_default PARTITION OF app_traces DEFAULT')
+    cutoff = today - timedelta(days=TRACE_RETENTION_DAYS)
+    cur.execute('SELECT MIN(timestamp)::date FROM app_traces_legacy WHERE timestamp >= %s', (cutoff,))
+    first_day = cur.fetchone()[0] or today
+    day = first_day
+    while day <= today:
+        _create_trace_partition(cur, day)
+        day += timedelta(days=1)
+
+    for target in ('uuid', 'inet'):
+        cur.execute(f'''
+            CREATE FUNCTION pg_temp.try_{target}(value TEXT) RETURNS {target} AS $$
+            BEGIN RETURN value::{target}; EXCEPTION WHEN others THEN RETURN NULL; END
+            $$ LANGUAGE plpgsql IMMUTABLE
+        ''')
+    cur.execute('''
+        INSERT INTO trace_actions (name)
+        SELECT DISTINCT action FROM app_traces_legacy ORDER BY action
+        ON CONFLICT (name) DO NOTHING
+    ''')
+    cur.execute(f'''
+        INSERT INTO app_traces ({APP_TRACES_COLUMNS})
+        SELECT COALESCE(t.timestamp, CURRENT_TIMESTAMP), pg_temp.try_uuid(t.trace_id), NULL, NULL, t.id, t.duration_ms,
+               a.code, CASE WHEN t.status = 'error' THEN 1 ELSE 0 END, pg_temp.try_inet(t.user_ip),
+               t.method, t.endpoint,
+               CASE WHEN m IS NOT NULL THEN jsonb_build_object(
+                        'user', m[1], 'phone', m[2], 'seats', COALESCE(to_jsonb(string_to_array(NULLIF(m[3], ''), ',')), '[]'),
+                        'stored', m[4] IS NOT NULL)
+                    WHEN t.details IS NOT NULL THEN jsonb_build_object('message', t.details) END,
+               NULL
+        FROM app_traces_legacy t
+        JOIN trace_actions a ON a.name = t.action
+        LEFT JOIN LATERAL regexp_match(t.details, '^User: (.*), Phone: (.*), Seats: ([^ ]*)( → Stored in DB)?$') m ON TRUE
+        WHERE (t.timestamp >= %s OR t.timestamp IS NULL) AND pg_temp.try_uuid(t.trace_id) IS NOT NULL
+    ''', (cutoff,))
+    cur.execute("SELECT setval(pg_get_serial_sequence('app_traces', 'id'), "
+                "COALESCE((SELECT MAX(id) FROM app_traces_legacy), 0) + 1, false)")
+    cur.execute('DROP TABLE app_traces_legacy')
+
+
+def maintain_trace_partitions():
+    """Pre-create upcoming daily partitions and drop (or archive) expired ones.
+
+    Each step is a catalog operation, whatever the row count. Returns a summary of what changed.
+    """
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
         with conn.cursor() as cur:
+            cur.execute('SELECT pg_try_advisory_xact_lock(%s), CURRENT_DATE', (TRACE_MAINTENANCE_LOCK_KEY,))
+            locked, today = cur.fetchone()
+            if not locked:
+                return {"status": "skipped", "reason": "maintenance running elsewhere"}
+
+            created = [
+                _partition_name(today + timedelta(days=offset))
+                for offset in range(-1, TRACE_PARTITION_PREMAKE_DAYS + 1)
+                if _create_trace_partition(cur, today + timedelta(days=offset))
+            ]
+
+            cutoff = today - timedelta(days=TRACE_RETENTION_DAYS)
             cur.execute('''
-                CREATE TABLE IF NOT EXISTS app_traces (
-                    id SERIAL PRIMARY KEY,
-                    trace_id VARCHAR(36) NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    action VARCHAR(100) NOT NULL,
-                    endpoint VARCHAR(200),
-                    method VARCHAR(10),
-                    details TEXT,
-                    status VARCHAR(20) DEFAULT 'success',
-                    duration_ms NUMERIC(10,2),
-                    user_ip VARCHAR(50)
-                )
-            ''')
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_trace_id ON app_traces(trace_id)')
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_trace_timestamp ON app_traces(timestamp DESC)')
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'app_traces'::regclass AND c.relname LIKE %s
+            ''', (TRACE_PARTITION_PREFIX + '%',))
+            partitions = sorted(r[0] for r in cur.fetchall())
+            expired = [p for p in partitions if p[len(TRACE_PARTITION_PREFIX):] < f"{cutoff:%Y%m%d}"]
+            for name in expired:
+                if TRACE_ARCHIVE_SCHEMA:
+                    cur.execute(f'CREATE SCHEMA IF NOT EXISTS {TRACE_ARCHIVE_SCHEMA}')
+                    cur.execute(f'ALTER TABLE app_traces DETACH PARTITION {name}')
+                    cur.execute(f'ALTER TABLE {name} SET SCHEMA {TRACE_ARCHIVE_SCHEMA}')
+                else:
+                    cur.execute(f'DROP TABLE {name}')
+            # Stragglers the default partition caught for days that are now expired (small by design)
+            cur.execute('DELETE FROM app_traces_default WHERE timestamp < %s', (cutoff,))
+            # Rollup rows for traces whose events are gone
+            cur.execute('DELETE FROM trace_sessions WHERE started_at < %s', (cutoff,))
+            pruned_sessions = cur.rowcount
+            cur.execute('DELETE FROM latency_rollup WHERE minute < %s', (cutoff,))
         conn.commit()
+        TRACE_PARTITIONS.set(len(partitions) - len(expired))
+        summary = {
+            "status": "success",
+            "created": created,
+            "archived" if TRACE_ARCHIVE_SCHEMA else "dropped": expired,
+            "pruned_sessions": pruned_sessions,
+        }
+        if created or expired:
+            logger.info("Trace partition maintenance: %s", summary)
+        return summary
+    finally:
         conn.close()
+
+
+def start_trace_maintenance():
+    """Run partition maintenance every TRACE_MAINTENANCE_INTERVAL_S on a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(TRACE_MAINTENANCE_INTERVAL_S)
+            try:
+                maintain_trace_partitions()
+            except Exception as e:
+                logger.error("Trace partition maintenance failed: %s", e)
+    threading.Thread(target=loop, name='trace-maintenance', daemon=True).start()
+
+
+def init_tracing_table():
+    """Create the partitioned tracing table, its rollup and today's partitions."""
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                # Processes starting together (replicas, uvicorn workers) run this one at a time
+                cur.execute('SELECT pg_advisory_xact_lock(%s)', (TRACE_MAINTENANCE_LOCK_KEY,))
+                cur.execute('SELECT CURRENT_DATE')
+                today = cur.fetchone()[0]
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS trace_actions (
+                        code SMALLSERIAL PRIMARY KEY,
+                        name TEXT NOT NULL UNIQUE
+                    )
+                ''')
+                _migrate_legacy_traces(cur, today)
+                cur.execute(APP_TRACES_DDL)
+                # Tables created before spans were recorded (metadata-only change)
+                cur.execute('ALTER TABLE app_traces ADD COLUMN IF NOT EXISTS span_id BIGINT, '
+                            'ADD COLUMN IF NOT EXISTS parent_span_id BIGINT, ADD COLUMN IF NOT EXISTS spans JSONB')
+                # Catches rows outside every daily range, so an insert never fails if maintenance falls behind
+                cur.execute('CREATE TABLE IF NOT EXISTS app_traces_default PARTITION OF app_traces DEFAULT')
+                cur.execute('CREATE INDEX IF NOT EXISTS idx_trace_id ON app_traces(trace_id)')
+                cur.execute('CREATE INDEX IF NOT EXISTS idx_trace_timestamp ON app_traces(timestamp DESC)')
+                # One row per trace, kept current by log_trace, so /getRecentTraces never scans app_traces
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS trace_sessions (
+                        trace_id UUID PRIMARY KEY,
+                        started_at TIMESTAMP NOT NULL,
+                        ended_at TIMESTAMP NOT NULL,
+                        event_count INTEGER NOT NULL,
+                        actions SMALLINT[] NOT NULL,
+                        user_ip INET,
+                        has_error BOOLEAN NOT NULL DEFAULT FALSE
+                    )
+                ''')
+                cur.execute('CREATE INDEX IF NOT EXISTS idx_trace_sessions_started ON trace_sessions(started_at DESC)')
+                # One row per instance, endpoint and UTC minute; buckets/counts is a sparse log-scale histogram
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS latency_rollup (
+                        minute TIMESTAMP NOT NULL,
+                        endpoint TEXT NOT NULL,
+                        method TEXT NOT NULL,
+                        instance TEXT NOT NULL,
+                        count INTEGER NOT NULL,
+                        errors INTEGER NOT NULL,
+                        sum_ms DOUBLE PRECISION NOT NULL,
+                        max_ms REAL NOT NULL,
+                        buckets SMALLINT[] NOT NULL,
+                        counts INTEGER[] NOT NULL,
+                        PRIMARY KEY (minute, endpoint, method, instance)
+                    )
+                ''')
+                # First run against an existing app_traces: build the rollup once from history
+                cur.execute('SELECT NOT EXISTS (SELECT 1 FROM trace_sessions)')
+                if cur.fetchone()[0]:
+                    cur.execute('''
+                        INSERT INTO trace_sessions
+                        SELECT trace_id, MIN(timestamp), MAX(timestamp), COUNT(*),
+                               ARRAY_AGG(DISTINCT action_code), MAX(user_ip), BOOL_OR(status_code = 1)
+                        FROM app_traces
+                        GROUP BY trace_id
+                        ON CONFLICT (trace_id) DO NOTHING
+                    ''')
+            conn.commit()
+        finally:
+            conn.close()
+        maintain_trace_partitions()
         logger.info("Tracing table initialized successfully")
     except Exception as e:
-        logger.error(f"Failed to initialize tracing table: {e}")
+        logger.error("Failed to initialize tracing table: %s", e)
+
+# Inserts the event and folds it into its trace_sessions row in one statement.
+# The event time defaults to the transaction's; writers that batch events must pass each one's own.
+# The action code set stays sorted and distinct, matching ARRAY_AGG(DISTINCT action_code).
+LOG_TRACE_SQL = '''
+    WITH ev AS (
+        INSERT INTO app_traces (trace_id, span_id, parent_span_id, action_code, endpoint, method,
+                                details, status_code, duration_ms, user_ip, spans, timestamp)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, COALESCE(%s::timestamptz, CURRENT_TIMESTAMP))
+        RETURNING trace_id, timestamp, action_code, user_ip, status_code
+    )
+    INSERT INTO trace_sessions (trace_id, started_at, ended_at, event_count, actions, user_ip, has_error)
+    SELECT trace_id, timestamp, timestamp, 1, ARRAY[action_code], user_ip, status_code = 1 FROM ev
+    ON CONFLICT (trace_id) DO UPDATE SET
+        started_at = LEAST(trace_sessions.started_at, EXCLUDED.started_at),
+        ended_at = GREATEST(trace_sessions.ended_at, EXCLUDED.ended_at),
+        event_count = trace_sessions.event_count + 1,
+        actions = CASE WHEN EXCLUDED.actions[1] = ANY(trace_sessions.actions) THEN trace_sessions.actions
+                       ELSE ARRAY(SELECT unnest(trace_sessions.actions || EXCLUDED.actions) ORDER BY 1) END,
+        user_ip = GREATEST(trace_sessions.user_ip, EXCLUDED.user_ip),
+        has_error = trace_sessions.has_error OR EXCLUDED.has_error
+'''
+
+def log_trace(trace_id, action, endpoint=None, method=None, details=None, status='success', duration_ms=None, user_ip=None,
+              span_id=None, parent_span_id=None, spans=None):
+    """Log a trace entry to the database and update the trace's session rollup.
+
+    `details` is a dict stored as JSONB; `user_ip` must be an address or None; span IDs are signed 64-bit ints.
+    `spans` is the request's child spans as recorded by trace_span.
+    """
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    LOG_TRACE_SQL,
+                    (trace_id, span_id, parent_span_id, _action_code(cur, action), endpoint, method,
+                     Json(details) if details is not None else None,
+                     TRACE_STATUSES.index(status), duration_ms, user_ip, Json(spans) if spans else None, None)
+                )
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        TRACE_WRITE_FAILURES.inc()
+        logger.error("Failed to log trace: %s", e)
+
+# ===== Request Spans =====
+# Child spans of the request span — DB connect, each query and commit, template rendering — timed
+# with perf_counter_ns. They are collected on g and stored with the request's app_traces row.
+TRACE_SPANS_MAX = int(os.environ.get('TRACE_SPANS_MAX', 200))  # per request; further spans are dropped
+SPAN_SQL_MAX_CHARS = 120
 
-def log_trace(trace_id, action, endpoint=None, method=None, details=None, status='success', duration_ms=None, user_ip=None):
-    """Log a trace entry to the database."""
+
+def _spans_active():
+    return has_request_context() and g.get('trace_spans') is not None
+
+
+def _span_sql(query):
+    """Statement text for a span: whitespace collapsed and truncated, never the bound values."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(str(query).split())[:SPAN_SQL_MAX_CHARS]
+
+
+@contextmanager
+def trace_span(name, **attrs):
+    """Time the block as a child of the current span; also usable as a decorator.
+
+    Yields the span's attribute dict so the block can annotate it. Outside a traced request it only yields.
+    """
+    if not _spans_active():
+        yield attrs
+        return
+    spans, stack = g.trace_spans, g.span_stack
+    span_id = random.getrandbits(63) or 1
+    parent_id = stack[-1]
+    stack.append(span_id)
+    start = time.perf_counter_ns()
+    error = None
+    try:
+        yield attrs
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter_ns()
+        stack.pop()
+        if len(spans) < TRACE_SPANS_MAX:
+            span = {"span_id": _span_hex(span_id), "parent_span_id": _span_hex(parent_id), "name": name,
+                    "start_us": (start - g.trace_start_ns) // 1000, "duration_us": (end - start) // 1000}
+            if attrs:
+                span["attrs"] = attrs
+            if error:
+                span["error"] = error
+            spans.append(span)
+
+
+def _span_tree(root_span_id, spans):
+    """Nest a request's stored spans under its own span, children in start order."""
+    known = {s["span_id"] for s in spans}
+    children = {}
+    for s in sorted(spans, key=lambda s: s["start_us"]):
+        # A parent past TRACE_SPANS_MAX wasn't stored; hang its children off the request span
+        parent = s["parent_span_id"] if s["parent_span_id"] in known else root_span_id
+        children.setdefault(parent, []).append(s)
+
+    def build(span_id):
+        nodes = []
+        for s in children.get(span_id, []):
+            node = {"name": s["name"], "span_id": s["span_id"],
+                    "start_ms": s["start_us"] / 1000, "duration_ms": s["duration_us"] / 1000}
+            for key in ("attrs", "error"):
+                if key in s:
+                    node[key] = s[key]
+            node["children"] = build(s["span_id"])
+            nodes.append(node)
+        return nodes
+    return build(root_span_id)
+
+
+def render_traced(template, **context):
+    with trace_span('template.render', template=template):
+        return render_template(template, **context)
+
+# ===== Latency Histograms =====
+# Per-endpoint, per-minute histograms of request duration with fixed log-scale buckets:
+# bucket i covers (LATENCY_BUCKET_MIN_MS * 2^((i-1)/4), LATENCY_BUCKET_MIN_MS * 2^(i/4)], ~19% wide.
+# Closed minutes are flushed to latency_rollup, where /latencyStats merges them across instances.
+LATENCY_BUCKET_MIN_MS = 0.1
+LATENCY_BUCKETS_PER_DOUBLING = 4
+LATENCY_BUCKETS = 96  # top bucket ends at ~23 minutes
+LATENCY_FLUSH_S = int(os.environ.get('LATENCY_FLUSH_S', 60))
+LATENCY_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+_latency_minutes = {}  # (epoch minute, endpoint, method) → [count, errors, sum_ms, max_ms, {bucket: count}]
+_latency_lock = threading.Lock()
+
+LATENCY_UPSERT_SQL = '''
+    INSERT INTO latency_rollup (minute, endpoint, method, instance, count, errors, sum_ms, max_ms, buckets, counts)
+    VALUES %s
+    ON CONFLICT (minute, endpoint, method, instance) DO UPDATE SET
+        count = latency_rollup.count + EXCLUDED.count,
+        errors = latency_rollup.errors + EXCLUDED.errors,
+        sum_ms = latency_rollup.sum_ms + EXCLUDED.sum_ms,
+        max_ms = GREATEST(latency_rollup.max_ms, EXCLUDED.max_ms),
+        buckets = latency_rollup.buckets || EXCLUDED.buckets,
+        counts = latency_rollup.counts || EXCLUDED.counts
+'''
+
+
+def latency_bucket(duration_ms):
+    if duration_ms <= LATENCY_BUCKET_MIN_MS:
+        return 0
+    return min(math.ceil(math.log2(duration_ms / LATENCY_BUCKET_MIN_MS) * LATENCY_BUCKETS_PER_DOUBLING),
+               LATENCY_BUCKETS - 1)
+
+
+def latency_bucket_upper_ms(bucket):
+    return LATENCY_BUCKET_MIN_MS * 2 ** (bucket / LATENCY_BUCKETS_PER_DOUBLING)
+
+
+def _merge_histogram(into, other):
+    into[0] += other[0]
+    into[1] += other[1]
+    into[2] += other[2]
+    into[3] = max(into[3], other[3])
+    for bucket, n in other[4].items():
+        into[4][bucket] = into[4].get(bucket, 0) + n
+
+
+def record_latency(endpoint, method, duration_ms, error=False):
+    """Add one request to the current minute's histogram for its endpoint."""
+    key = (int(time.time() // 60), endpoint, method)
+    with _latency_lock:
+        hist = _latency_minutes.get(key)
+        if hist is None:
+            hist = _latency_minutes[key] = [0, 0, 0.0, 0.0, {}]
+        hist[0] += 1
+        hist[1] += int(error)
+        hist[2] += duration_ms
+        hist[3] = max(hist[3], duration_ms)
+        bucket = latency_bucket(duration_ms)
+        hist[4][bucket] = hist[4].get(bucket, 0) + 1
+
+
+def flush_latency_histograms(include_current=False):
+    """Write closed minutes (or everything, at shutdown) to latency_rollup. Returns rows written."""
+    current = int(time.time() // 60)
+    with _latency_lock:
+        batch = [(key, _latency_minutes.pop(key)) for key in list(_latency_minutes)
+                 if include_current or key[0] < current]
+    if not batch:
+        return 0
+    # Host and pid, so each worker process owns its rows
+    instance = f"{os.environ.get('HOSTNAME') or socket.gethostname()}:{os.getpid()}"
+    rows = [
+        (datetime.utcfromtimestamp(minute * 60), endpoint, method, instance,
+         count, errors, sum_ms, max_ms, list(buckets), list(buckets.values()))
+        for (minute, endpoint, method), (count, errors, sum_ms, max_ms, buckets) in batch
+    ]
     try:
         conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                '''INSERT INTO app_traces (trace_id, action, endpoint, method, details, status, duration_ms, user_ip)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)''',
-                (trace_id, action, endpoint, method, details, status, duration_ms, user_ip)
-            )
-        conn.commit()
-        conn.close()
+        try:
+            with conn.cursor() as cur:
+                execute_values(cur, LATENCY_UPSERT_SQL, rows)
+            conn.commit()
+        finally:
+            conn.close()
+        return len(rows)
     except Exception as e:
-        logger.error(f"Failed to log trace: {e}")
+        logger.error("Failed to flush latency histograms: %s", e)
+        # Keep them for the next flush
+        with _latency_lock:
+            for key, hist in batch:
+                if key in _latency_minutes:
+                    _merge_histogram(_latency_minutes[key], hist)
+                else:
+                    _latency_minutes[key] = hist
+        return 0
+
+
+def start_latency_flusher():
+    """Flush closed minutes every LATENCY_FLUSH_S, and everything left at interpreter exit."""
+    def loop():
+        while True:
+            time.sleep(LATENCY_FLUSH_S)
+            flush_latency_histograms()
+    threading.Thread(target=loop, name='latency-flusher', daemon=True).start()
+    atexit.register(flush_latency_histograms, include_current=True)
+
+
+def latency_percentiles(hist):
+    """Summary of a merged histogram; percentiles are bucket geometric midpoints (within ~9%), capped at the observed max."""
+    count, errors, sum_ms, max_ms, buckets = hist
+    summary = {
+        "count": count,
+        "errors": errors,
+        "avg_ms": round(sum_ms / count, 2) if count else None,
+        "max_ms": round(max_ms, 2),
+    }
+    ranked = sorted(buckets.items())
+    for q in LATENCY_PERCENTILES:
+        target, seen = q * count, 0
+        for bucket, n in ranked:
+            seen += n
+            if seen >= target:
+                midpoint = latency_bucket_upper_ms(bucket - 0.5) if bucket else LATENCY_BUCKET_MIN_MS
+                summary[f"p{round(q * 100)}_ms"] = round(min(midpoint, max_ms), 2)
+                break
+    under_3s = sum(n for bucket, n in ranked if latency_bucket_upper_ms(bucket) <= 3000)
+    summary["pct_under_3s"] = round(under_3s * 100 / count, 1) if count else 0.0
+    return summary
+
+@app.before_request
+def before_request_metrics():
+    """Start the latency clock for the Prometheus request histogram."""
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def after_request_metrics(response):
+    """Record request latency and errors against the matched route.
+
+    Registered before the tracing hooks so it runs last and the latency includes the trace write.
+    """
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        latency, errors = _endpoint_metric_children(rule, request.method)
+        latency.observe(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors.inc()
+    return response
+
+@app.teardown_request
+def teardown_request_metrics(exc):
+    REQUESTS_IN_FLIGHT.dec()
+
+def _valid_trace_id(value):
+    """The value if it is a UUID (the trace_id column type), else None."""
+    try:
+        return str(uuid.UUID(value)) if value else None
+    except ValueError:
+        return None
+
+def _new_trace_id():
+    # getrandbits is far cheaper than uuid4's urandom call, and trace IDs needn't be unguessable
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
+def _parse_traceparent(header):
+    """(trace_id, parent_span_id, flags) from a W3C traceparent header, or None if missing or invalid."""
+    if not header:
+        return None
+    parts = header.strip().lower().split('-')
+    if len(parts) < 4 or parts[0] == 'ff' or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) < 2:
+        return None
+    try:
+        if not int(parts[1], 16) or not int(parts[2], 16):
+            return None
+    except ValueError:
+        return None
+    return parts[1], parts[2], parts[3][:2]
+
+def _span_to_db(span_hex):
+    """16-hex span ID as the signed BIGINT it is stored as."""
+    value = int(span_hex, 16)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _span_hex(value):
+    return f"{value & 0xFFFFFFFFFFFFFFFF:016x}" if value is not None else None
+
+FORM_MIMETYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+# Never recorded as trace events (nor are /getTraceDetails/<id> lookups)
+TRACE_SKIP_ENDPOINTS = ('/health', '/favicon.ico', '/getRecentTraces', '/traceStats', '/latencyStats', '/metrics')
 
 @app.before_request
 def before_request_trace():
-    """Generate or reuse trace_id for every request and start timer."""
-    if request.path == '/':
+    """Resolve the trace for this request, start its span and the timer.
+
+    Trace ID from: W3C traceparent header > ?trace_id= > trace_id form field (form posts only) > session > new.
+    """
+    inbound = _parse_traceparent(request.headers.get('traceparent'))
+    g.parent_span_id, g.trace_flags = None, '01'
+    if inbound:
+        # Called by the MCP server (or another traced service) — join its trace as a child span
+        trace_hex, parent_hex, g.trace_flags = inbound
+        g.trace_id = str(uuid.UUID(hex=trace_hex))
+        g.parent_span_id = _span_to_db(parent_hex)
+    elif request.path == '/':
         # Fresh session — new trace_id when user opens the app
-        g.trace_id = str(uuid.uuid4())
+        g.trace_id = _new_trace_id()
     else:
-        # Read trace_id from: query param > form data > session > generate new
-        g.trace_id = (request.args.get('trace_id') or
-                      request.form.get('trace_id') or
-                      session.get('trace_id') or
-                      str(uuid.uuid4()))
-    # Always update session as backup
-    session['trace_id'] = g.trace_id
+        form_trace_id = request.form.get('trace_id') if request.mimetype in FORM_MIMETYPES else None
+        g.trace_id = (_valid_trace_id(request.args.get('trace_id')) or
+                      _valid_trace_id(form_trace_id) or
+                      _valid_trace_id(session.get('trace_id')) or
+                      _new_trace_id())
+    g.span_id = random.getrandbits(63) or 1
+    if request.path not in TRACE_SKIP_ENDPOINTS and not request.path.startswith('/getTraceDetails'):
+        g.trace_spans, g.span_stack = [], [g.span_id]
+    # Only write the session when the trace changes; an untouched session isn't re-signed or re-sent
+    if not inbound and session.get('trace_id') != g.trace_id:
+        session['trace_id'] = g.trace_id
     g.trace_start = time.time()
-    g.user_ip = request.remote_addr or 'unknown'
+    g.trace_start_ns = time.perf_counter_ns()
+    g.user_ip = request.remote_addr
+
+def trace_action(method, path, rule, status, form):
+    """(action, details) recorded in app_traces for a finished request; `form` is the parsed form data."""
+    # Route pattern, not the raw path, so the action dictionary stays bounded
+    action = f"{method} {rule}"
+    details = None
+    if path == '/update' and method == 'POST':
+        action = 'BOOK_SEATS'
+        try:
+            user_data = json.loads(form.get('userdetails', '{}'))
+            seat_data = json.loads(form.get('data_seats', '{}'))
+            selected = [k for k, v in seat_data.items() if v == 'reserved']
+            details = {"user": user_data.get('name', 'N/A'), "phone": user_data.get('number', 'N/A'),
+                       "seats": sorted(selected)}
+            if status == 'success':
+                action = 'BOOKING_CONFIRMED'
+                details["stored"] = True
+            else:
+                action = 'BOOKING_FAILED'
+        except:
+            details = 'Booking attempt'
+    elif path == '/':
+        action = 'USER_OPENED_APP'
+        details = 'User loaded the booking page'
+    elif path == '/details':
+        action = 'VIEW_BOOKING_CONFIRMATION'
+        details = 'User viewing booking confirmation page'
+    elif path == '/get':
+        action = 'LOAD_SEAT_MAP'
+        details = 'Fetched current seat availability from DB'
+    elif path == '/getUsersDetails':
+        action = 'VIEW_ALL_BOOKINGS'
+        details = 'User viewed all booking records'
+    elif path == '/resetBookings':
+        action = 'RESET_ALL_BOOKINGS'
+        details = 'All bookings cleared, all seats reset to available'
+    elif path == '/create':
+        action = 'INIT_SEATS_TABLE'
+        details = 'Database tables initialized'
+    elif path.startswith('/simulate'):
+        action = 'SRE_ERROR_SIMULATION'
+        details = path
+    if isinstance(details, str):
+        details = {"message": details}
+    return action, details
 
 @app.after_request
 def after_request_trace(response):
@@ -100,53 +949,23 @@ def after_request_trace(response):
 
     # Add trace_id to response header for debugging/correlation
     response.headers['X-Trace-Id'] = trace_id
+    if 'span_id' in g:
+        response.headers['traceparent'] = f"00-{trace_id.replace('-', '')}-{_span_hex(g.span_id)}-{g.trace_flags}"
 
     # Skip health checks, static files, and trace endpoints from logging
-    skip_endpoints = ['/health', '/favicon.ico', '/getRecentTraces']
-    if request.path in skip_endpoints or request.path.startswith('/getTraceDetails'):
+    if request.path in TRACE_SKIP_ENDPOINTS or request.path.startswith('/getTraceDetails'):
         return response
+    # Stop collecting, so log_trace's own connection and insert aren't recorded as spans of this request
+    spans, g.trace_spans = g.get('trace_spans'), None
 
     try:
         duration_ms = round((time.time() - g.trace_start) * 1000, 2)
         status = 'success' if response.status_code < 400 else 'error'
+        record_latency(request.url_rule.rule if request.url_rule is not None else '<unmatched>',
+                       request.method, duration_ms, status == 'error')
 
-        action = f"{request.method} {request.path}"
-        details = None
-        if request.path == '/update' and request.method == 'POST':
-            action = 'BOOK_SEATS'
-            try:
-                user_data = json.loads(request.form.get('userdetails', '{}'))
-                seat_data = json.loads(request.form.get('data_seats', '{}'))
-                selected = [k for k, v in seat_data.items() if v == 'reserved']
-                details = f"User: {user_data.get('name', 'N/A')}, Phone: {user_data.get('number', 'N/A')}, Seats: {','.join(sorted(selected))}"
-                if status == 'success':
-                    action = 'BOOKING_CONFIRMED'
-                    details += ' → Stored in DB'
-                else:
-                    action = 'BOOKING_FAILED'
-            except:
-                details = 'Booking attempt'
-        elif request.path == '/':
-            action = 'USER_OPENED_APP'
-            details = 'User loaded the booking page'
-        elif request.path == '/details':
-            action = 'VIEW_BOOKING_CONFIRMATION'
-            details = 'User viewing booking confirmation page'
-        elif request.path == '/get':
-            action = 'LOAD_SEAT_MAP'
-            details = 'Fetched current seat availability from DB'
-        elif request.path == '/getUsersDetails':
-            action = 'VIEW_ALL_BOOKINGS'
-            details = 'User viewed all booking records'
-        elif request.path == '/resetBookings':
-            action = 'RESET_ALL_BOOKINGS'
-            details = 'All bookings cleared, all seats reset to available'
-        elif request.path == '/create':
-            action = 'INIT_SEATS_TABLE'
-            details = 'Database tables initialized'
-        elif request.path.startswith('/simulate'):
-            action = 'SRE_ERROR_SIMULATION'
-            details = request.path
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        action, details = trace_action(request.method, request.path, rule, status, request.form)
 
         log_trace(
             trace_id=trace_id,
@@ -156,37 +975,88 @@ def after_request_trace(response):
             details=details,
             status=status,
             duration_ms=duration_ms,
-            user_ip=getattr(g, 'user_ip', 'unknown')
+            user_ip=getattr(g, 'user_ip', None),
+            span_id=g.span_id,
+            parent_span_id=g.parent_span_id,
+            spans=spans
         )
     except Exception as e:
-        logger.error(f"Tracing after_request error: {e}")
+        logger.error("Tracing after_request error: %s", e)
 
     return response
 
+# ===== Database Connections =====
+# Each serving process keeps a pool of up to DB_POOL_MAX connections, opened after the fork
+# (start_worker_services). Without a pool, or when it is exhausted, a connection is opened per call.
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))  # 0 = no pool
+DB_POOL_EXHAUSTED = Counter('booking_db_pool_exhausted_total', 'Connections opened outside the pool because it was exhausted')
+
+_db_pool = None
+
+
+def _db_connect_kwargs():
+    return dict(database=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT,
+                sslmode=DB_SSLMODE, connection_factory=_TrackedConnection, cursor_factory=_TracedCursor)
+
+
+def init_db_pool():
+    """Open this process's connection pool; must run in the process that will use it (after any fork)."""
+    global _db_pool
+    if DB_POOL_MAX <= 0:
+        return
+    try:
+        _db_pool = psycopg2.pool.ThreadedConnectionPool(min(DB_POOL_MIN, DB_POOL_MAX), DB_POOL_MAX,
+                                                        **_db_connect_kwargs())
+        logger.info("Database pool ready (max %s connections)", DB_POOL_MAX)
+    except Exception as e:
+        # Connect per call until the database is reachable
+        logger.error("Could not create database pool: %s", e)
+
+
+@trace_span('db.connect')
 def get_db_connection():
-    """Create a database connection using environment variables."""
-    logger.info(f"Connecting to database at {DB_HOST}:{DB_PORT}/{DB_NAME}")
+    """A database connection from the pool, or a new one.
+
+    Callers must close() it in a finally block: a pooled connection that is never closed
+    stays checked out (idle in transaction) for the life of the process.
+    """
+    pool = _db_pool
+    if pool is not None:
+        try:
+            conn = pool.getconn()
+        except psycopg2.pool.PoolError:
+            DB_POOL_EXHAUSTED.inc()
+        else:
+            if not conn.closed:
+                return conn.check_out(pool)
+            pool.putconn(conn, close=True)
+    logger.debug("Connecting to database at %s:%s/%s", DB_HOST, DB_PORT, DB_NAME)
     try:
-        conn = psycopg2.connect(
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT,
-            sslmode=DB_SSLMODE
-        )
-        logger.info("Database connection successful")
-        return conn
+        conn = psycopg2.connect(**_db_connect_kwargs())
+        logger.info("Database connection successful", extra=LOG_SAMPLED)
+        return conn.check_out()
     except Exception as e:
-        logger.error(f"Database connection failed: {e}")
+        DB_CONNECT_FAILURES.inc()
+        logger.error("Database connection failed: %s", e)
         raise
 
 # Health check endpoint for Code Engine
 @app.route("/health")
 def health():
-    logger.info("Health check requested")
+    logger.info("Health check requested", extra=LOG_SAMPLED)
     return jsonify({"status": "healthy"}), 200
 
+# Prometheus scrape endpoint
+@app.route("/metrics")
+def metrics():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Aggregate every gunicorn worker, not just the one answering the scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), headers={'Content-Type': CONTENT_TYPE_LATEST})
+    return Response(generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
 global data_seats
 
 data_seats ={
@@ -205,18 +1075,20 @@ data_seats ={
 
 @app.route("/")
 def home():
-	return render_template("UI.html", trace_id=g.trace_id)
+	return render_traced("UI.html", trace_id=g.trace_id)
 
 @app.route("/chat")
 def chat():
-	return render_template("Chat.html")
+	return render_traced("Chat.html")
 
 @app.route("/create")
 def create_table():
 	conn = get_db_connection()
-	for k,v in data_seats.items():
-		insert_seats(k, v, conn)
-	conn.close()
+	try:
+		for k,v in data_seats.items():
+			insert_seats(k, v, conn)
+	finally:
+		conn.close()
 	return "<h1>Table Created, click <a href='/'>here</a> to open the app</h1>"
 
 def insert_seats(seat_no, status, conn):
@@ -224,7 +1096,7 @@ def insert_seats(seat_no, status, conn):
 		cur.execute('CREATE TABLE IF NOT EXISTS userdetails (phone_no VARCHAR PRIMARY KEY, name VARCHAR, seats VARCHAR)')
 		cur.execute('CREATE TABLE IF NOT EXISTS screen (seat_no VARCHAR PRIMARY KEY, status VARCHAR)')
 		cur.execute("INSERT INTO screen (seat_no, status) VALUES (%s,%s)", (seat_no, status))
-		logging.debug("insert_seats(): status message: {}".format(cur.statusmessage))
+		logger.debug("insert_seats(): status message: %s", cur.statusmessage)
 	conn.commit()
 
 @app.route("/update", methods=['GET', 'POST'])
@@ -247,7 +1119,7 @@ def update_seats():
 				logger.warning("Reservation failed: phone number is empty")
 				return jsonify({"flag": 1, "error": "Phone number is required. Please enter your phone number."}), 400
 			if not number.isdigit() or len(number) < 7:
-				logger.warning(f"Reservation failed: invalid phone number '{number}'")
+				logger.warning("Reservation failed: invalid phone number '%s'", number)
 				return jsonify({"flag": 1, "error": "Please enter a valid phone number (at least 7 digits)."}), 400
 
 			for k,v in x.items():
@@ -259,7 +1131,7 @@ def update_seats():
 				logger.warning("Reservation failed: no seats selected")
 				return jsonify({"flag": 1, "error": "Please select at least one seat before reserving."}), 400
 
-			logger.info(f"Reservation attempt: name={name}, phone={number}, seats={seats}")
+			logger.info("Reservation attempt: name=%s, phone=%s, seats=%s", name, number, seats)
 			seats_string = ','.join(seats)
 
 			# --- Check if any selected seats are already booked ---
@@ -270,47 +1142,46 @@ def update_seats():
 					cur.execute(f"SELECT seat_no FROM screen WHERE seat_no IN ({placeholders}) AND status = 'blocked'", seats)
 					already_booked = [row[0] for row in cur.fetchall()]
 				if already_booked:
-					conn.close()
-					logger.warning(f"Seats already booked: {already_booked}")
+					logger.warning("Seats already booked: %s", already_booked)
 					return jsonify({"flag": 1, "error": f"Seats {', '.join(already_booked)} are already booked. Please select different seats."}), 409
 
 				update(seats, conn)
 				with conn.cursor() as cur:
 					cur.execute("INSERT INTO userdetails (phone_no, name, seats) VALUES (%s,%s,%s)", (number, name, seats_string))
-					logger.info(f"Booking saved: {name} - {number} - {seats_string}")
+					logger.info("Booking saved: %s - %s - %s", name, number, seats_string)
 				conn.commit()
-				conn.close()
 				return jsonify({"flag": 0, "message": f"Successfully reserved seats: {seats_string}"})
 
 			except psycopg2.errors.UniqueViolation:
 				conn.rollback()
-				conn.close()
-				logger.error(f"Duplicate phone number: {number}")
+				logger.error("Duplicate phone number: %s", number)
 				return jsonify({"flag": 1, "error": f"Phone number {number} has already been used for a booking. Please use a different phone number."}), 409
 
 			except psycopg2.Error as db_err:
 				if conn:
 					conn.rollback()
-					conn.close()
-				logger.error(f"Database error during reservation: {db_err}")
+				logger.error("Database error during reservation: %s", db_err)
 				return jsonify({"flag": 1, "error": "A database error occurred. Please try again later."}), 500
 
+			finally:
+				conn.close()
+
 		except json.JSONDecodeError as e:
-			logger.error(f"Invalid request data: {e}")
+			logger.error("Invalid request data: %s", e)
 			return jsonify({"flag": 1, "error": "Invalid request data. Please refresh the page and try again."}), 400
 
 		except Exception as e:
-			logger.error(f"Unexpected error during reservation: {e}")
+			logger.error("Unexpected error during reservation: %s", e)
 			return jsonify({"flag": 1, "error": "An unexpected error occurred. Please try again."}), 500
 
 	return jsonify({"flag": 1, "error": "Invalid request method."}), 405
 
+@trace_span('update_seats')
 def update(seats,conn):
 	for i in seats:
-		print(type(i))
 		with conn.cursor() as cur:
 			cur.execute("UPDATE screen SET status = %s WHERE seat_no = %s",("blocked",i,))
-			print("update_book_details(): status message: {}".format(cur.statusmessage))
+			logger.debug("update_book_details(): seat %s status message: %s", i, cur.statusmessage)
 		conn.commit()
 
 @app.route("/getUsersDetails")
@@ -318,11 +1189,13 @@ def usersDetails():
     temp = {}
     arr = []
     conn = get_db_connection()
-    with conn.cursor() as cur:
-        cur.execute("SELECT * FROM userdetails")
-        rows = cur.fetchall()
-    conn.commit()
-    conn.close()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT * FROM userdetails")
+            rows = cur.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
     for row in rows:
         temp = {
             "phone_no": row[0],
@@ -335,20 +1208,22 @@ def usersDetails():
 @app.route("/details")
 def details():
 	# trace_id comes from query param (set by booking page redirect)
-	return render_template("Seats.html", trace_id=g.trace_id)
+	return render_traced("Seats.html", trace_id=g.trace_id)
 
 @app.route("/get")
 def staus():
 	data_new={}
 	conn = get_db_connection()
-	with conn.cursor() as cur:
-		cur.execute("SELECT * FROM screen")
-		logging.debug("print_balances(): status message: {}".format(cur.statusmessage))
-		rows = cur.fetchall()
-	conn.commit()
-	for row in rows:
-		data_new[row[0]]=row[1]
-	conn.close()
+	try:
+		with conn.cursor() as cur:
+			cur.execute("SELECT * FROM screen")
+			logger.debug("print_balances(): status message: %s", cur.statusmessage)
+			rows = cur.fetchall()
+		conn.commit()
+		for row in rows:
+			data_new[row[0]]=row[1]
+	finally:
+		conn.close()
 	x = json.dumps(data_new)
 	return x
 
@@ -360,15 +1235,17 @@ def reset_bookings():
     """Reset all bookings - clear userdetails and reset all seats to available."""
     try:
         conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM userdetails")
-            cur.execute("UPDATE screen SET status = 'available'")
-            logger.info("All bookings have been reset")
-        conn.commit()
-        conn.close()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM userdetails")
+                cur.execute("UPDATE screen SET status = 'available'")
+                logger.info("All bookings have been reset")
+            conn.commit()
+        finally:
+            conn.close()
         return jsonify({"status": "success", "message": "All bookings have been reset. All seats are now available."})
     except Exception as e:
-        logger.error(f"Failed to reset bookings: {e}")
+        logger.error("Failed to reset bookings: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
@@ -376,26 +1253,23 @@ def reset_bookings():
 
 @app.route("/getRecentTraces")
 def get_recent_traces():
-    """Get recent unique trace IDs with summary info."""
+    """Get recent unique trace IDs with summary info (top-N from the trace_sessions rollup)."""
     try:
         limit = request.args.get('limit', 20, type=int)
         conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute('''
-                SELECT trace_id,
-                       MIN(timestamp) as started_at,
-                       MAX(timestamp) as ended_at,
-                       COUNT(*) as event_count,
-                       ARRAY_AGG(DISTINCT action) as actions,
-                       MAX(user_ip) as user_ip,
-                       CASE WHEN BOOL_OR(status = 'error') THEN 'error' ELSE 'success' END as overall_status
-                FROM app_traces
-                GROUP BY trace_id
-                ORDER BY MIN(timestamp) DESC
-                LIMIT %s
-            ''', (limit,))
-            rows = cur.fetchall()
-        conn.close()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('''
+                    SELECT trace_id, started_at, ended_at, event_count, actions, user_ip,
+                           CASE WHEN has_error THEN 'error' ELSE 'success' END as overall_status
+                    FROM trace_sessions
+                    ORDER BY started_at DESC
+                    LIMIT %s
+                ''', (limit,))
+                rows = cur.fetchall()
+                names = _action_name_map(cur, {code for row in rows for code in row[4]})
+        finally:
+            conn.close()
 
         traces = []
         for row in rows:
@@ -404,31 +1278,42 @@ def get_recent_traces():
                 "started_at": row[1].isoformat() if row[1] else None,
                 "ended_at": row[2].isoformat() if row[2] else None,
                 "event_count": row[3],
-                "actions": row[4],
-                "user_ip": row[5],
+                "actions": sorted(names.get(code, '?') for code in row[4]),
+                "user_ip": row[5] or 'unknown',
                 "overall_status": row[6]
             })
         return jsonify({"status": "success", "total": len(traces), "traces": traces})
     except Exception as e:
-        logger.error(f"Failed to get traces: {e}")
+        logger.error("Failed to get traces: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
 @app.route("/getTraceDetails/<trace_id>")
 def get_trace_details(trace_id):
     """Get the full end-to-end transaction flow for a specific trace ID."""
+    if not _valid_trace_id(trace_id):
+        return jsonify({"status": "error", "message": f"No trace found with ID: {trace_id}"}), 404
     try:
         conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute('''
-                SELECT id, trace_id, timestamp, action, endpoint, method,
-                       details, status, duration_ms, user_ip
-                FROM app_traces
-                WHERE trace_id = %s
-                ORDER BY timestamp ASC
-            ''', (trace_id,))
-            rows = cur.fetchall()
-        conn.close()
+        try:
+            with conn.cursor() as cur:
+                # Bound the lookup by the trace's time span so only its day partitions are scanned
+                cur.execute('SELECT started_at, ended_at FROM trace_sessions WHERE trace_id = %s', (trace_id,))
+                span = cur.fetchone()
+                time_filter, args = '', (trace_id,)
+                if span:
+                    time_filter, args = 'AND timestamp BETWEEN %s AND %s', (trace_id, span[0], span[1])
+                cur.execute(f'''
+                    SELECT id, trace_id, timestamp, action_code, endpoint, method,
+                           details, status_code, duration_ms, user_ip, span_id, parent_span_id, spans
+                    FROM app_traces
+                    WHERE trace_id = %s {time_filter}
+                    ORDER BY timestamp ASC, id ASC
+                ''', args)
+                rows = cur.fetchall()
+                names = _action_name_map(cur, {row[3] for row in rows})
+        finally:
+            conn.close()
 
         if not rows:
             return jsonify({"status": "error", "message": f"No trace found with ID: {trace_id}"}), 404
@@ -439,13 +1324,16 @@ def get_trace_details(trace_id):
                 "id": row[0],
                 "trace_id": row[1],
                 "timestamp": row[2].isoformat() if row[2] else None,
-                "action": row[3],
+                "action": names.get(row[3], '?'),
                 "endpoint": row[4],
                 "method": row[5],
-                "details": row[6],
-                "status": row[7],
-                "duration_ms": float(row[8]) if row[8] else None,
-                "user_ip": row[9]
+                "details": _format_trace_details(row[6]),
+                "status": TRACE_STATUSES[row[7]],
+                "duration_ms": row[8] or None,
+                "user_ip": row[9] or 'unknown',
+                "span_id": _span_hex(row[10]),
+                "parent_span_id": _span_hex(row[11]),
+                "spans": _span_tree(_span_hex(row[10]), row[12] or [])
             })
 
         # Calculate total duration
@@ -465,7 +1353,233 @@ def get_trace_details(trace_id):
             "events": events
         })
     except Exception as e:
-        logger.error(f"Failed to get trace details: {e}")
+        logger.error("Failed to get trace details: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Aggregates over a whole window are computed in SQL and reused for TRACE_STATS_CACHE_S
+TRACE_STATS_CACHE_S = int(os.environ.get('TRACE_STATS_CACHE_S', 30))
+TRACE_FUNNEL = ('USER_OPENED_APP', 'LOAD_SEAT_MAP', 'BOOKING_CONFIRMED')
+_trace_stats_cache = {}  # window hours → (expires_at, stats)
+_trace_stats_lock = threading.Lock()
+
+
+def _pct(part, whole):
+    return round(part * 100 / whole, 1) if whole else 0.0
+
+
+def compute_trace_stats(hours):
+    """Session, per-action latency, funnel and flow aggregates for the last `hours`."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT LOCALTIMESTAMP - %s * INTERVAL '1 hour', LOCALTIMESTAMP", (hours,))
+            since, now = cur.fetchone()
+
+            cur.execute('''
+                SELECT COUNT(*), COALESCE(SUM(event_count), 0),
+                       AVG(EXTRACT(EPOCH FROM ended_at - started_at) * 1000),
+                       COUNT(*) FILTER (WHERE has_error),
+                       COUNT(*) FILTER (WHERE (SELECT code FROM trace_actions WHERE name = 'BOOKING_CONFIRMED') = ANY(actions)),
+                       COUNT(DISTINCT user_ip)
+                FROM trace_sessions
+                WHERE started_at >= %s
+            ''', (since,))
+            sessions, events, avg_duration, error_sessions, booking_sessions, unique_ips = cur.fetchone()
+
+            # Literal time bound, so the planner prunes to the window's partitions
+            cur.execute('''
+                SELECT action_code, COUNT(*), COUNT(*) FILTER (WHERE status_code = 1),
+                       percentile_cont(ARRAY[0.5, 0.9, 0.95, 0.99]) WITHIN GROUP (ORDER BY duration_ms),
+                       AVG(duration_ms), MAX(duration_ms)
+                FROM app_traces
+                WHERE timestamp >= %s
+                GROUP BY action_code
+                ORDER BY COUNT(*) DESC
+            ''', (since,))
+            action_rows = cur.fetchall()
+
+            # Traces that reached each step after the previous one
+            cur.execute('''
+                SELECT COUNT(opened), COUNT(*) FILTER (WHERE loaded >= opened),
+                       COUNT(*) FILTER (WHERE loaded >= opened AND booked >= loaded)
+                FROM (
+                    SELECT MIN(t.timestamp) FILTER (WHERE a.name = %s) AS opened,
+                           MIN(t.timestamp) FILTER (WHERE a.name = %s) AS loaded,
+                           MAX(t.timestamp) FILTER (WHERE a.name = %s) AS booked
+                    FROM app_traces t
+                    JOIN trace_actions a ON a.code = t.action_code
+                    WHERE t.timestamp >= %s AND a.name IN %s
+                    GROUP BY t.trace_id
+                ) steps
+            ''', (*TRACE_FUNNEL, since, TRACE_FUNNEL))
+            opened, loaded, booked = cur.fetchone()
+
+            cur.execute('''
+                SELECT actions, COUNT(*)
+                FROM trace_sessions
+                WHERE started_at >= %s
+                GROUP BY actions
+                ORDER BY COUNT(*) DESC
+                LIMIT 5
+            ''', (since,))
+            flow_rows = cur.fetchall()
+
+            names = _action_name_map(cur, {r[0] for r in action_rows} | {c for r in flow_rows for c in r[0]})
+    finally:
+        conn.close()
+
+    def ms(value):
+        return round(float(value), 2) if value is not None else None
+
+    return {
+        "window_hours": hours,
+        "since": since.isoformat(),
+        "generated_at": now.isoformat(),
+        "sessions": {
+            "total_sessions": sessions,
+            "total_events": events,
+            "avg_events_per_session": round(events / sessions, 1) if sessions else 0,
+            "avg_session_duration_ms": round(float(avg_duration), 1) if avg_duration is not None else 0,
+            "error_sessions": error_sessions,
+            "success_rate_pct": round(100 - _pct(error_sessions, sessions), 1) if sessions else 0.0,
+            "error_rate_pct": _pct(error_sessions, sessions),
+            "booking_sessions": booking_sessions,
+            "booking_rate_pct": _pct(booking_sessions, sessions),
+            "unique_users_by_ip": unique_ips,
+        },
+        "actions": [
+            {
+                "action": names.get(code, '?'),
+                "count": count,
+                "errors": errors,
+                "p50_ms": ms(pcts[0]) if pcts else None,
+                "p90_ms": ms(pcts[1]) if pcts else None,
+                "p95_ms": ms(pcts[2]) if pcts else None,
+                "p99_ms": ms(pcts[3]) if pcts else None,
+                "avg_ms": ms(avg),
+                "max_ms": ms(peak),
+            }
+            for code, count, errors, pcts, avg, peak in action_rows
+        ],
+        "funnel": {
+            "opened_app": opened,
+            "loaded_seats": loaded,
+            "booked": booked,
+            "open_to_load_pct": _pct(loaded, opened),
+            "load_to_book_pct": _pct(booked, loaded),
+            "overall_conversion_pct": _pct(booked, opened),
+        },
+        "top_flows": [
+            {"flow": ','.join(sorted(names.get(c, '?') for c in codes)), "count": count}
+            for codes, count in flow_rows
+        ],
+    }
+
+
+def cached_trace_stats(hours):
+    """(cached, stats) for the window, recomputed at most every TRACE_STATS_CACHE_S."""
+    hours = min(max(hours, 1 / 60), TRACE_RETENTION_DAYS * 24)
+    now = time.monotonic()
+    with _trace_stats_lock:
+        cached = _trace_stats_cache.get(hours)
+    if cached and cached[0] > now:
+        return True, cached[1]
+
+    stats = compute_trace_stats(hours)
+    with _trace_stats_lock:
+        # Drop expired windows so odd ?hours= values don't accumulate
+        for key in [k for k, (expires, _) in _trace_stats_cache.items() if expires <= now]:
+            del _trace_stats_cache[key]
+        _trace_stats_cache[hours] = (now + TRACE_STATS_CACHE_S, stats)
+    return False, stats
+
+
+@app.route("/traceStats")
+def trace_stats():
+    """Exact trace analytics over the last ?hours= (default 1), cached per window."""
+    try:
+        cached, stats = cached_trace_stats(request.args.get('hours', 1, type=float))
+        return jsonify({"status": "success", "cached": cached, **stats})
+    except Exception as e:
+        logger.error("Failed to compute trace stats: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def compute_latency_stats(minutes, resolution, endpoint=None):
+    """Latency percentiles from latency_rollup over the last `minutes`, per `resolution`-minute slot."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT date_trunc('minute', CURRENT_TIMESTAMP AT TIME ZONE 'UTC')")
+            until = cur.fetchone()[0] + timedelta(minutes=1)
+            since = until - timedelta(minutes=minutes)
+            endpoint_filter = 'AND endpoint = %s' if endpoint else ''
+            # Slot start = window start + whole multiples of the resolution
+            slot = "%s + floor(EXTRACT(EPOCH FROM minute - %s) / %s) * %s * INTERVAL '1 second'"
+            slot_args = (since, since, resolution * 60, resolution * 60)
+            filter_args = (since, until, *([endpoint] if endpoint else []))
+            cur.execute(f'''
+                SELECT {slot} AS slot, endpoint, method,
+                       SUM(count), SUM(errors), SUM(sum_ms), MAX(max_ms)
+                FROM latency_rollup
+                WHERE minute >= %s AND minute < %s {endpoint_filter}
+                GROUP BY 1, 2, 3
+            ''', (*slot_args, *filter_args))
+            totals = cur.fetchall()
+            cur.execute(f'''
+                SELECT {slot} AS slot, endpoint, method, b.bucket, SUM(b.n)
+                FROM latency_rollup, unnest(buckets, counts) AS b(bucket, n)
+                WHERE minute >= %s AND minute < %s {endpoint_filter}
+                GROUP BY 1, 2, 3, 4
+            ''', (*slot_args, *filter_args))
+            bucket_rows = cur.fetchall()
+            cur.execute(f'''
+                SELECT COUNT(DISTINCT instance) FROM latency_rollup
+                WHERE minute >= %s AND minute < %s {endpoint_filter}
+            ''', filter_args)
+            instances = cur.fetchone()[0]
+    finally:
+        conn.close()
+
+    hists = {(slot, ep, method): [int(count), int(errors), float(sum_ms), float(max_ms), {}]
+             for slot, ep, method, count, errors, sum_ms, max_ms in totals}
+    for slot, ep, method, bucket, n in bucket_rows:
+        buckets = hists[(slot, ep, method)][4]
+        buckets[bucket] = buckets.get(bucket, 0) + int(n)
+
+    overall = {}
+    series = []
+    for (slot, ep, method), hist in sorted(hists.items()):
+        series.append({"slot_start": slot.isoformat(), "endpoint": ep, "method": method,
+                       **latency_percentiles(hist)})
+        _merge_histogram(overall.setdefault(slot, [0, 0, 0.0, 0.0, {}]), hist)
+
+    return {
+        "from": since.isoformat(),
+        "to": until.isoformat(),
+        "resolution_minutes": resolution,
+        "instances": instances,
+        "overall": [{"slot_start": slot.isoformat(), **latency_percentiles(hist)}
+                    for slot, hist in sorted(overall.items())],
+        "series": series,
+    }
+
+
+@app.route("/latencyStats")
+def latency_stats():
+    """Real-traffic latency percentiles from latency_rollup, merged across instances.
+
+    ?minutes= window (default 60), ?resolution= minutes per slot (default 0 = one slot for the
+    whole window), ?endpoint= route pattern filter. The current minute shows up once flushed.
+    """
+    try:
+        minutes = max(request.args.get('minutes', 60, type=int), 1)
+        resolution = max(request.args.get('resolution', 0, type=int), 0) or minutes
+        return jsonify({"status": "success",
+                        **compute_latency_stats(minutes, resolution, request.args.get('endpoint'))})
+    except Exception as e:
+        logger.error("Failed to get latency stats: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
@@ -483,7 +1597,7 @@ def simulate_error():
         error_type = '500'
 
     if error_type == '404':
-        logger.error(f"SIMULATED ERROR: 404 Not Found - Resource '/fake/page' does not exist")
+        logger.error("SIMULATED ERROR: 404 Not Found - Resource '/fake/page' does not exist")
         return jsonify({
             "error": "Not Found",
             "message": "The requested resource '/fake/page' was not found on this server.",
@@ -491,7 +1605,7 @@ def simulate_error():
         }), 404
 
     elif error_type == '500':
-        logger.error(f"SIMULATED ERROR: 500 Internal Server Error - Application crashed during request processing")
+        logger.error("SIMULATED ERROR: 500 Internal Server Error - Application crashed during request processing")
         return jsonify({
             "error": "Internal Server Error",
             "message": "The server encountered an unexpected condition that prevented it from fulfilling the request.",
@@ -499,7 +1613,7 @@ def simulate_error():
         }), 500
 
     elif error_type == '503':
-        logger.error(f"SIMULATED ERROR: 503 Service Unavailable - Server is overloaded or under maintenance")
+        logger.error("SIMULATED ERROR: 503 Service Unavailable - Server is overloaded or under maintenance")
         return jsonify({
             "error": "Service Unavailable",
             "message": "The server is temporarily unable to handle the request due to maintenance or overload.",
@@ -507,8 +1621,8 @@ def simulate_error():
         }), 503
 
     elif error_type == 'db_error':
-        logger.error(f"SIMULATED ERROR: psycopg2.OperationalError - connection to database 'hippo' failed: Connection refused")
-        logger.error(f"SIMULATED ERROR: DatabaseError - could not translate host name to address: Name or service not known")
+        logger.error("SIMULATED ERROR: psycopg2.OperationalError - connection to database 'hippo' failed: Connection refused")
+        logger.error("SIMULATED ERROR: DatabaseError - could not translate host name to address: Name or service not known")
         return jsonify({
             "error": "Database Connection Error",
             "message": "psycopg2.OperationalError: connection refused - database server is not accepting connections.",
@@ -516,8 +1630,8 @@ def simulate_error():
         }), 500
 
     elif error_type == 'timeout':
-        logger.error(f"SIMULATED ERROR: Request timeout exceeded - operation took longer than 30 seconds")
-        logger.error(f"SIMULATED ERROR: TimeoutError - The read operation timed out")
+        logger.error("SIMULATED ERROR: Request timeout exceeded - operation took longer than 30 seconds")
+        logger.error("SIMULATED ERROR: TimeoutError - The read operation timed out")
         return jsonify({
             "error": "Request Timeout",
             "message": "The server timed out waiting for the request to complete.",
@@ -525,10 +1639,10 @@ def simulate_error():
         }), 504
 
     elif error_type == 'exception':
-        logger.error(f"SIMULATED ERROR: Unhandled Exception - Traceback (most recent call last):")
-        logger.error(f"SIMULATED ERROR:   File 'app.py', line 42, in process_booking")
-        logger.error(f"SIMULATED ERROR:   ZeroDivisionError: division by zero")
-        logger.error(f"SIMULATED ERROR: Exception: Critical application failure in booking module")
+        logger.error("SIMULATED ERROR: Unhandled Exception - Traceback (most recent call last):")
+        logger.error("SIMULATED ERROR:   File 'app.py', line 42, in process_booking")
+        logger.error("SIMULATED ERROR:   ZeroDivisionError: division by zero")
+        logger.error("SIMULATED ERROR: Exception: Critical application failure in booking module")
         return jsonify({
             "error": "Unhandled Exception",
             "message": "Traceback: ZeroDivisionError - division by zero in process_booking",
@@ -554,12 +1668,33 @@ def simulate_error():
         return jsonify({"error": f"Unknown error type: {error_type}", "valid_types": ["404", "500", "503", "db_error", "timeout", "exception", "all"]}), 400
 
 
+# Preallocate metric label sets for every route (HEAD/OPTIONS are answered by Flask itself)
+for _rule in app.url_map.iter_rules():
+    for _method in _rule.methods - {'HEAD', 'OPTIONS'}:
+        _endpoint_metric_children(_rule.rule, _method)
+
+
+# ===== Process Lifecycle =====
+# Production runs under gunicorn (gunicorn.conf.py): init_tracing_table once in the master before
+# any worker starts, then start_worker_services in each worker after the fork.
+
+def start_worker_services():
+    """Per-process startup: logging pipeline, DB pool and background jobs (threads don't survive a fork).
+
+    Shutdown needs no hook: the atexit handlers registered here flush latency minutes and drain the log queue.
+    """
+    global log_listener
+    if log_listener.pid != os.getpid():
+        log_listener = configure_logging()
+    init_db_pool()
+    start_trace_maintenance()
+    start_latency_flusher()
+
+
 if __name__ == '__main__':
+    # Development server; see gunicorn.conf.py for production
     port = int(os.environ.get('PORT', 8080))  # Code Engine uses PORT env var
-    logger.info(f"Starting Movie Ticket Booking App on port {port}")
-    # Initialize tracing table on startup
-    try:
-        init_tracing_table()
-    except Exception as e:
-        logger.warning(f"Could not initialize tracing table on startup: {e}")
+    logger.info("Starting Movie Ticket Booking App on port %s", port)
+    init_tracing_table()
+    start_worker_services()
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,505 @@
+"""
+Async booking service — the booking app's data routes on ASGI and asyncpg.
+
+An optional alternative to app.py for high-concurrency deployments:
+
+    pip install -r requirements-async.txt
+    uvicorn async_app:app --host 0.0.0.0 --port 8080 --workers 2
+
+Serves /, /details, /chat, /get, /update, /getUsersDetails, /resetBookings,
+/health and the trace endpoints with the same responses as app.py. It reads and
+writes the same tables, app_traces included, and shares the session cookie.
+/create, /metrics and the error simulations stay on the Flask app.
+
+Requests never wait on the trace INSERT. Each finished request queues its
+event, and a writer task inserts the queued events in pipelined batches
+(executemany). SQL and trace helpers come from app.py, so both services record
+traces identically. The cached analytics (/traceStats, /latencyStats) run their
+psycopg2 queries in the threadpool.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import functools
+import ipaddress
+from datetime import datetime, timezone
+
+import asyncpg
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.templating import Jinja2Templates
+from itsdangerous import BadSignature
+from starlette.concurrency import run_in_threadpool
+
+import app as booking
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DB_POOL_MIN = int(os.environ.get("ASYNC_DB_POOL_MIN", 2))
+ASYNC_DB_POOL_MAX = int(os.environ.get("ASYNC_DB_POOL_MAX", 20))
+TRACE_QUEUE_MAX = int(os.environ.get("TRACE_QUEUE_MAX", 10000))   # events waiting to be written; more are dropped
+TRACE_BATCH_MAX = int(os.environ.get("TRACE_BATCH_MAX", 500))     # events per executemany
+TRACE_WRITE_RETRIES = int(os.environ.get("TRACE_WRITE_RETRIES", 3))  # attempts after a deadlock
+
+
+def _pg(sql: str) -> str:
+    """psycopg2 %s placeholders → asyncpg $1..$n, so both apps run one copy of the SQL."""
+    parts = sql.split("%s")
+    return "".join(f"{part}${i}" for i, part in enumerate(parts[:-1], 1)) + parts[-1]
+
+
+LOG_TRACE_SQL = _pg(booking.LOG_TRACE_SQL)
+ADD_ACTION_SQL = _pg(booking.ADD_ACTION_SQL)
+
+app = FastAPI(title="Movie Ticket Booking (async)")
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+
+pool: asyncpg.Pool = None
+_trace_queue: asyncio.Queue = None
+_trace_writer: asyncio.Task = None
+
+# Flask's signed session cookie, so a user can move between the two services mid-trace
+_session_serializer = booking.app.session_interface.get_signing_serializer(booking.app)
+SESSION_COOKIE = booking.app.config["SESSION_COOKIE_NAME"]
+SESSION_MAX_AGE = int(booking.app.permanent_session_lifetime.total_seconds())
+
+
+async def _init_connection(conn):
+    # jsonb in and out as Python objects, like psycopg2's Json adapter
+    await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+# ── Lifecycle ───────────────────────────────────────────────────────
+@app.on_event("startup")
+async def startup():
+    global pool, _trace_queue, _trace_writer
+    await run_in_threadpool(booking.init_tracing_table)
+    booking.start_trace_maintenance()
+    booking.start_latency_flusher()
+    pool = await asyncpg.create_pool(
+        database=booking.DB_NAME, user=booking.DB_USER, password=booking.DB_PASSWORD,
+        host=booking.DB_HOST, port=int(booking.DB_PORT), ssl=booking.DB_SSLMODE,
+        min_size=min(ASYNC_DB_POOL_MIN, ASYNC_DB_POOL_MAX), max_size=ASYNC_DB_POOL_MAX,
+        init=_init_connection,
+    )
+    _trace_queue = asyncio.Queue(maxsize=TRACE_QUEUE_MAX)
+    _trace_writer = asyncio.create_task(_write_traces_forever())
+    logger.info("Async booking service ready (pool max %s connections)", ASYNC_DB_POOL_MAX)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Not cancelled: that could drop the batch being written. The writer sees the sentinel,
+    # writes everything still queued and returns, then the pool can go away.
+    await _trace_queue.put(None)
+    await _trace_writer
+    await pool.close()
+
+
+# ── Trace writing ───────────────────────────────────────────────────
+async def _action_code(conn, name: str) -> int:
+    """SMALLINT code for an action name (same dictionary and cache as app.py)."""
+    code = booking._action_codes.get(name)
+    if code is None:
+        booking._cache_action_codes(await conn.fetch(booking.ACTION_CODES_SQL))
+        code = booking._action_codes.get(name)
+    if code is None:
+        code = await conn.fetchval(ADD_ACTION_SQL, name)
+        if code is None:
+            # Another worker added it concurrently, after this statement's snapshot was taken
+            code = await conn.fetchval("SELECT code FROM trace_actions WHERE name = $1", name)
+        booking._cache_action_codes([(code, name)])
+    return code
+
+
+async def _action_name_map(conn, codes) -> dict:
+    if any(c not in booking._action_names for c in codes):
+        booking._cache_action_codes(await conn.fetch(booking.ACTION_CODES_SQL))
+    return booking._action_names
+
+
+async def _write_traces(batch: list):
+    """
+    Insert queued events; executemany pipelines the whole batch in one round trip per sync.
+
+    The batch is one transaction, so every event carries its own timestamp, and rows are
+    sorted by trace so concurrent writers lock trace_sessions rows in the same order.
+    A deadlock retries the batch; any other error retries it row by row, so one bad
+    event doesn't take the rest with it.
+    """
+    try:
+        async with pool.acquire() as conn:
+            rows = sorted(
+                [(trace_id, span_id, parent_id, await _action_code(conn, action), endpoint, method,
+                  details, status_code, duration_ms, user_ip, None, ended_at)
+                 for trace_id, span_id, parent_id, action, endpoint, method,
+                     details, status_code, duration_ms, user_ip, ended_at in batch],
+                key=lambda row: row[0])
+            for attempt in range(1, TRACE_WRITE_RETRIES + 1):
+                try:
+                    await conn.executemany(LOG_TRACE_SQL, rows)
+                    return
+                except asyncpg.exceptions.DeadlockDetectedError:
+                    if attempt == TRACE_WRITE_RETRIES:
+                        raise
+                    await asyncio.sleep(random.uniform(0.01, 0.05) * attempt)
+                except asyncpg.PostgresError as e:
+                    if len(rows) == 1:
+                        raise
+                    logger.warning("Trace batch of %s failed (%s); writing events one at a time", len(rows), e)
+                    break
+            failed = 0
+            for row in rows:
+                try:
+                    await conn.execute(LOG_TRACE_SQL, *row)
+                except asyncpg.PostgresError as e:
+                    failed += 1
+                    logger.error("Failed to write trace event for %s: %s", row[0], e)
+            booking.TRACE_WRITE_FAILURES.inc(failed)
+    except Exception as e:
+        booking.TRACE_WRITE_FAILURES.inc(len(batch))
+        logger.error("Failed to write %s trace events: %s", len(batch), e)
+
+
+async def _write_traces_forever():
+    """Write queued events in batches until shutdown's None sentinel arrives and the queue is empty."""
+    stopping = False
+    while not (stopping and _trace_queue.empty()):
+        batch = [await _trace_queue.get()]
+        while len(batch) < TRACE_BATCH_MAX and not _trace_queue.empty():
+            batch.append(_trace_queue.get_nowait())
+        if None in batch:
+            stopping = True
+            batch = [event for event in batch if event is not None]
+        if batch:
+            await _write_traces(batch)
+
+
+# ── Request tracing ─────────────────────────────────────────────────
+def _session_trace_id(request: Request):
+    raw = request.cookies.get(SESSION_COOKIE)
+    if not raw:
+        return None
+    try:
+        return _session_serializer.loads(raw, max_age=SESSION_MAX_AGE).get("trace_id")
+    except BadSignature:
+        return None
+
+
+def _client_ip(request: Request):
+    """Client address for the INET column, or None when it isn't one (e.g. a unix socket peer)."""
+    try:
+        return str(ipaddress.ip_address(request.client.host))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _arg(request: Request, name: str, default, type_):
+    """Query parameter converted with type_, or the default if missing or invalid (as Flask's args.get)."""
+    try:
+        return type_(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def traced(handler):
+    """The async counterpart of app.py's before/after_request tracing, wrapped around one route."""
+    @functools.wraps(handler)
+    async def wrapper(request: Request):
+        started = time.perf_counter()
+        path, method = request.url.path, request.method
+        mimetype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        form = await request.form() if mimetype in booking.FORM_MIMETYPES else None
+
+        # Same order as app.py: traceparent > ?trace_id= > form field > session > new
+        inbound = booking._parse_traceparent(request.headers.get("traceparent"))
+        parent_span_id, trace_flags = None, "01"
+        session_trace_id = _session_trace_id(request)
+        if inbound:
+            trace_hex, parent_hex, trace_flags = inbound
+            trace_id = booking._valid_trace_id(trace_hex)
+            parent_span_id = booking._span_to_db(parent_hex)
+        elif path == "/":
+            trace_id = booking._new_trace_id()
+        else:
+            trace_id = (booking._valid_trace_id(request.query_params.get("trace_id")) or
+                        booking._valid_trace_id(form.get("trace_id") if form else None) or
+                        booking._valid_trace_id(session_trace_id) or
+                        booking._new_trace_id())
+        span_id = random.getrandbits(63) or 1
+        request.state.trace_id = trace_id
+
+        try:
+            response = await handler(request)
+        except Exception:
+            logger.exception("Unhandled error on %s %s", method, path)
+            response = PlainTextResponse("Internal Server Error", status_code=500)
+
+        response.headers["X-Trace-Id"] = trace_id
+        response.headers["traceparent"] = f"00-{trace_id.replace('-', '')}-{booking._span_hex(span_id)}-{trace_flags}"
+        if not inbound and session_trace_id != trace_id:
+            response.set_cookie(SESSION_COOKIE, _session_serializer.dumps({"trace_id": trace_id}),
+                                httponly=True, path="/")
+        if path in booking.TRACE_SKIP_ENDPOINTS or path.startswith("/getTraceDetails"):
+            return response
+
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        status = "success" if response.status_code < 400 else "error"
+        rule = request.scope["route"].path_format
+        booking.record_latency(rule, method, duration_ms, status == "error")
+        action, details = booking.trace_action(method, path, rule, status, form or {})
+        try:
+            _trace_queue.put_nowait((trace_id, span_id, parent_span_id, action, path, method, details,
+                                     booking.TRACE_STATUSES.index(status), duration_ms, _client_ip(request),
+                                     datetime.now(timezone.utc)))
+        except asyncio.QueueFull:
+            booking.TRACE_WRITE_FAILURES.inc()
+        return response
+    return wrapper
+
+
+# ── Pages ───────────────────────────────────────────────────────────
+@app.get("/", response_class=HTMLResponse)
+@traced
+async def home(request: Request):
+    return templates.TemplateResponse(request, "UI.html", {"trace_id": request.state.trace_id})
+
+
+@app.get("/details", response_class=HTMLResponse)
+@traced
+async def details(request: Request):
+    return templates.TemplateResponse(request, "Seats.html", {"trace_id": request.state.trace_id})
+
+
+@app.get("/chat", response_class=HTMLResponse)
+@traced
+async def chat(request: Request):
+    return templates.TemplateResponse(request, "Chat.html", {})
+
+
+@app.get("/health")
+@traced
+async def health(request: Request):
+    return JSONResponse({"status": "healthy"})
+
+
+# ── Booking routes ──────────────────────────────────────────────────
+@app.get("/get")
+@traced
+async def seat_status(request: Request):
+    rows = await pool.fetch("SELECT * FROM screen")
+    # app.py returns the JSON string as an HTML response; the page parses it either way
+    return HTMLResponse(json.dumps({row[0]: row[1] for row in rows}))
+
+
+@app.get("/getUsersDetails")
+@traced
+async def users_details(request: Request):
+    rows = await pool.fetch("SELECT * FROM userdetails")
+    return HTMLResponse(json.dumps([{"phone_no": row[0], "name": row[1], "seats": row[2]} for row in rows]))
+
+
+def _booking_error(message: str, status_code: int) -> JSONResponse:
+    return JSONResponse({"flag": 1, "error": message}, status_code=status_code)
+
+
+@app.api_route("/update", methods=["GET", "POST"])
+@traced
+async def update_seats(request: Request):
+    if request.method != "POST":
+        return _booking_error("Invalid request method.", 405)
+    try:
+        form = await request.form()
+        x = json.loads(form["data_seats"])
+        user_data = json.loads(form["userdetails"])
+        name = user_data.get("name", "").strip()
+        number = user_data.get("number", "").strip()
+
+        # --- Input validation ---
+        if not name:
+            logger.warning("Reservation failed: name is empty")
+            return _booking_error("Name is required. Please enter your name.", 400)
+        if not number:
+            logger.warning("Reservation failed: phone number is empty")
+            return _booking_error("Phone number is required. Please enter your phone number.", 400)
+        if not number.isdigit() or len(number) < 7:
+            logger.warning("Reservation failed: invalid phone number '%s'", number)
+            return _booking_error("Please enter a valid phone number (at least 7 digits).", 400)
+
+        seats = [k for k, v in x.items() if v == "reserved"]
+        if not seats:
+            logger.warning("Reservation failed: no seats selected")
+            return _booking_error("Please select at least one seat before reserving.", 400)
+
+        logger.info("Reservation attempt: name=%s, phone=%s, seats=%s", name, number, seats)
+        seats_string = ",".join(seats)
+
+        async with pool.acquire() as conn:
+            try:
+                # One transaction: the seat rows are locked while checked, so two bookings of the
+                # same seat can't both pass, and a rejected booking leaves no seats blocked
+                async with conn.transaction():
+                    rows = await conn.fetch(
+                        "SELECT seat_no, status FROM screen WHERE seat_no = ANY($1::varchar[]) FOR UPDATE", seats)
+                    already_booked = [row[0] for row in rows if row[1] == "blocked"]
+                    if not already_booked:
+                        await conn.executemany("UPDATE screen SET status = $1 WHERE seat_no = $2",
+                                               [("blocked", seat) for seat in seats])
+                        await conn.execute("INSERT INTO userdetails (phone_no, name, seats) VALUES ($1, $2, $3)",
+                                           number, name, seats_string)
+            except asyncpg.UniqueViolationError:
+                logger.error("Duplicate phone number: %s", number)
+                return _booking_error(f"Phone number {number} has already been used for a booking. "
+                                      "Please use a different phone number.", 409)
+            except asyncpg.PostgresError as db_err:
+                logger.error("Database error during reservation: %s", db_err)
+                return _booking_error("A database error occurred. Please try again later.", 500)
+
+        if already_booked:
+            logger.warning("Seats already booked: %s", already_booked)
+            return _booking_error(f"Seats {', '.join(already_booked)} are already booked. "
+                                  "Please select different seats.", 409)
+        logger.info("Booking saved: %s - %s - %s", name, number, seats_string)
+        return JSONResponse({"flag": 0, "message": f"Successfully reserved seats: {seats_string}"})
+
+    except json.JSONDecodeError as e:
+        logger.error("Invalid request data: %s", e)
+        return _booking_error("Invalid request data. Please refresh the page and try again.", 400)
+    except Exception as e:
+        logger.error("Unexpected error during reservation: %s", e)
+        return _booking_error("An unexpected error occurred. Please try again.", 500)
+
+
+@app.api_route("/resetBookings", methods=["GET", "POST"])
+@traced
+async def reset_bookings(request: Request):
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("DELETE FROM userdetails")
+                await conn.execute("UPDATE screen SET status = 'available'")
+        logger.info("All bookings have been reset")
+        return JSONResponse({"status": "success",
+                             "message": "All bookings have been reset. All seats are now available."})
+    except Exception as e:
+        logger.error("Failed to reset bookings: %s", e)
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+# ── Trace endpoints ─────────────────────────────────────────────────
+@app.get("/getRecentTraces")
+@traced
+async def get_recent_traces(request: Request):
+    limit = _arg(request, "limit", 20, int)
+    try:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT trace_id, started_at, ended_at, event_count, actions, user_ip,
+                       CASE WHEN has_error THEN 'error' ELSE 'success' END as overall_status
+                FROM trace_sessions
+                ORDER BY started_at DESC
+                LIMIT $1
+            ''', limit)
+            names = await _action_name_map(conn, {code for row in rows for code in row[4]})
+        traces = [{
+            "trace_id": str(row[0]),
+            "started_at": row[1].isoformat() if row[1] else None,
+            "ended_at": row[2].isoformat() if row[2] else None,
+            "event_count": row[3],
+            "actions": sorted(names.get(code, "?") for code in row[4]),
+            "user_ip": str(row[5]) if row[5] else "unknown",
+            "overall_status": row[6],
+        } for row in rows]
+        return JSONResponse({"status": "success", "total": len(traces), "traces": traces})
+    except Exception as e:
+        logger.error("Failed to get traces: %s", e)
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+@app.get("/getTraceDetails/{trace_id}")
+@traced
+async def get_trace_details(request: Request):
+    trace_id = request.path_params["trace_id"]
+    not_found = JSONResponse({"status": "error", "message": f"No trace found with ID: {trace_id}"}, status_code=404)
+    if not booking._valid_trace_id(trace_id):
+        return not_found
+    try:
+        async with pool.acquire() as conn:
+            # Bound the lookup by the trace's time span so only its day partitions are scanned
+            span = await conn.fetchrow("SELECT started_at, ended_at FROM trace_sessions WHERE trace_id = $1",
+                                       trace_id)
+            time_filter, args = "", (trace_id,)
+            if span:
+                time_filter, args = "AND timestamp BETWEEN $2 AND $3", (trace_id, span[0], span[1])
+            rows = await conn.fetch(f'''
+                SELECT id, trace_id, timestamp, action_code, endpoint, method,
+                       details, status_code, duration_ms, user_ip, span_id, parent_span_id, spans
+                FROM app_traces
+                WHERE trace_id = $1 {time_filter}
+                ORDER BY timestamp ASC, id ASC
+            ''', *args)
+            names = await _action_name_map(conn, {row[3] for row in rows})
+        if not rows:
+            return not_found
+
+        events = [{
+            "id": row[0],
+            "trace_id": str(row[1]),
+            "timestamp": row[2].isoformat() if row[2] else None,
+            "action": names.get(row[3], "?"),
+            "endpoint": row[4],
+            "method": row[5],
+            "details": booking._format_trace_details(row[6]),
+            "status": booking.TRACE_STATUSES[row[7]],
+            # REAL arrives as the raw float4; both apps write it rounded to 2 places
+            "duration_ms": round(row[8], 2) if row[8] else None,
+            "user_ip": str(row[9]) if row[9] else "unknown",
+            "span_id": booking._span_hex(row[10]),
+            "parent_span_id": booking._span_hex(row[11]),
+            "spans": booking._span_tree(booking._span_hex(row[10]), row[12] or []),
+        } for row in rows]
+        first_ts, last_ts = rows[0][2], rows[-1][2]
+        total_duration_ms = (last_ts - first_ts).total_seconds() * 1000 if first_ts and last_ts else 0
+        return JSONResponse({
+            "status": "success",
+            "trace_id": trace_id,
+            "total_events": len(events),
+            "total_duration_ms": round(total_duration_ms, 2),
+            "started_at": events[0]["timestamp"],
+            "ended_at": events[-1]["timestamp"],
+            "user_ip": events[0]["user_ip"],
+            "overall_status": "error" if any(e["status"] == "error" for e in events) else "success",
+            "events": events,
+        })
+    except Exception as e:
+        logger.error("Failed to get trace details: %s", e)
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+@app.get("/traceStats")
+@traced
+async def trace_stats(request: Request):
+    try:
+        cached, stats = await run_in_threadpool(booking.cached_trace_stats, _arg(request, "hours", 1, float))
+        return JSONResponse({"status": "success", "cached": cached, **stats})
+    except Exception as e:
+        logger.error("Failed to compute trace stats: %s", e)
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+@app.get("/latencyStats")
+@traced
+async def latency_stats(request: Request):
+    try:
+        minutes = max(_arg(request, "minutes", 60, int), 1)
+        resolution = max(_arg(request, "resolution", 0, int), 0) or minutes
+        stats = await run_in_threadpool(booking.compute_latency_stats, minutes, resolution,
+                                        request.query_params.get("endpoint"))
+        return JSONResponse({"status": "success", **stats})
+    except Exception as e:
+        logger.error("Failed to get latency stats: %s", e)
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
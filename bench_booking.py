@@ -0,0 +1,213 @@
+"""
+Benchmark — booking app, Flask (gunicorn) vs async (uvicorn), side by side.
+
+Starts both services with the same number of worker processes and drives each
+with the same mixed workload at high concurrency. Prints throughput, latency
+percentiles and error counts. Bookings are reset before each service runs.
+
+Workload per virtual user: mostly seat-map reads (/get), plus bookings
+(/update), booking lists, recent traces and page loads. Each user carries its
+own ?trace_id=, like the booking page does, and keeps no cookies.
+
+Usage:
+    python bench_booking.py                                  # 2 workers each, 200 users, 15 s
+    python bench_booking.py --workers 4 --concurrency 500 --duration 30
+    python bench_booking.py --flask-url http://10.0.0.5:8080 --async-url http://10.0.0.5:8081
+
+Both services read the DB_* environment variables. A URL means that service is
+already running and is not started here. Requires requirements-async.txt.
+"""
+
+import argparse
+import asyncio
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SEATS = [f"{row}{col}" for row in range(1, 11) for col in "ABCDEF"]
+
+# (weight, method, path)
+WORKLOAD = [
+    (60, "GET", "/get"),
+    (20, "POST", "/update"),
+    (10, "GET", "/getUsersDetails"),
+    (5, "GET", "/getRecentTraces"),
+    (5, "GET", "/"),
+]
+
+
+class _NoCookies(http.cookiejar.CookieJar):
+    def set_cookie(self, cookie):
+        pass
+
+
+# ── Servers ─────────────────────────────────────────────────────────
+def start_server(kind: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    env.setdefault("LOG_LEVEL", "WARNING")
+    if kind == "flask":
+        cmd = ["gunicorn", "--config", "gunicorn.conf.py", "app:app"]
+    else:
+        cmd = ["uvicorn", "async_app:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--no-access-log", "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=HERE, env=env)
+
+
+def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ── Load ────────────────────────────────────────────────────────────
+async def _user(client: httpx.AsyncClient, url: str, deadline: float, measure_from: float,
+                user_id: str, results: list):
+    rng = random.Random(user_id)
+    weights = [w for w, _, _ in WORKLOAD]
+    trace_id = str(uuid.uuid4())
+    n = 0
+    while time.perf_counter() < deadline:
+        _, method, path = rng.choices(WORKLOAD, weights)[0]
+        params = {"trace_id": trace_id}
+        data = None
+        if method == "POST":
+            n += 1
+            seats = rng.sample(SEATS, rng.randint(1, 2))
+            data = {"userdetails": json.dumps({"name": f"bench-{user_id}", "number": f"9{user_id}{n:06d}"}),
+                    "data_seats": json.dumps({seat: "reserved" for seat in seats})}
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url + path, params=params, data=data)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        if started >= measure_from:
+            results.append((path, status, (time.perf_counter() - started) * 1000))
+
+
+async def _drive(url: str, users: int, duration: float, warmup: float, offset: int) -> list:
+    results = []
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(limits=limits, timeout=30, cookies=_NoCookies()) as client:
+        now = time.perf_counter()
+        await asyncio.gather(*(
+            _user(client, url, now + warmup + duration, now + warmup, f"{offset + i:05d}", results)
+            for i in range(users)
+        ))
+    return results
+
+
+def _drive_process(args) -> list:
+    return asyncio.run(_drive(*args))
+
+
+def run_load(url: str, concurrency: int, duration: float, warmup: float, processes: int) -> list:
+    """Spread the virtual users over client processes so the load generator isn't the bottleneck."""
+    httpx.post(f"{url}/resetBookings", timeout=30)
+    share = [concurrency // processes + (1 if i < concurrency % processes else 0) for i in range(processes)]
+    jobs = [(url, n, duration, warmup, sum(share[:i])) for i, n in enumerate(share) if n]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        return [row for chunk in pool.map(_drive_process, jobs) for row in chunk]
+
+
+# ── Report ──────────────────────────────────────────────────────────
+def _pct(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def summarize(results: list, duration: float) -> dict:
+    latencies = sorted(ms for _, _, ms in results)
+    by_path = {}
+    for path, status, ms in results:
+        by_path.setdefault(path, []).append(ms)
+    return {
+        "requests": len(results),
+        "rps": len(results) / duration,
+        "p50": _pct(latencies, 0.50), "p95": _pct(latencies, 0.95), "p99": _pct(latencies, 0.99),
+        "max": latencies[-1] if latencies else 0.0,
+        "rejected_4xx": sum(1 for _, status, _ in results if 400 <= status < 500),
+        "errors": sum(1 for _, status, _ in results if status == 0 or status >= 500),
+        "paths": {path: (len(v) / duration, _pct(sorted(v), 0.95)) for path, v in sorted(by_path.items())},
+    }
+
+
+def print_report(summaries: dict, args):
+    names = list(summaries)
+    print(f"\n{args.concurrency} concurrent users, {args.duration:.0f}s measured, "
+          f"{args.workers} workers per service, {args.processes} client processes\n")
+    print(f"{'':<16}" + "".join(f"{name:>14}" for name in names))
+    rows = [("requests", "requests", "{:.0f}"), ("req/s", "rps", "{:.0f}"), ("p50 ms", "p50", "{:.1f}"),
+            ("p95 ms", "p95", "{:.1f}"), ("p99 ms", "p99", "{:.1f}"), ("max ms", "max", "{:.1f}"),
+            ("4xx (booked)", "rejected_4xx", "{:.0f}"), ("errors", "errors", "{:.0f}")]
+    for label, key, fmt in rows:
+        print(f"{label:<16}" + "".join(f"{fmt.format(summaries[name][key]):>14}" for name in names))
+    print("\nper endpoint — req/s, p95 ms")
+    for _, _, path in WORKLOAD:
+        cells = []
+        for name in names:
+            rps, p95 = summaries[name]["paths"].get(path, (0.0, 0.0))
+            cells.append(f"{rps:>7.0f} {p95:>6.1f}")
+        print(f"{path:<16}" + "".join(f"{cell:>14}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds per service")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes per service")
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1), help="client processes")
+    parser.add_argument("--flask-url")
+    parser.add_argument("--async-url")
+    parser.add_argument("--flask-port", type=int, default=8180)
+    parser.add_argument("--async-port", type=int, default=8181)
+    parser.add_argument("--only", choices=["flask", "async"])
+    args = parser.parse_args()
+
+    summaries = {}
+    for kind in ("flask", "async"):
+        if args.only and kind != args.only:
+            continue
+        url = getattr(args, f"{kind}_url")
+        proc = None
+        if not url:
+            url = f"http://127.0.0.1:{getattr(args, f'{kind}_port')}"
+            proc = start_server(kind, getattr(args, f"{kind}_port"), args.workers)
+        try:
+            wait_ready(url)
+            print(f"running {kind} at {url} ...", file=sys.stderr)
+            results = run_load(url, args.concurrency, args.duration, args.warmup, args.processes)
+        finally:
+            if proc:
+                stop_server(proc)
+        summaries[kind] = summarize(results, args.duration)
+    print_report(summaries, args)
+
+
+if __name__ == "__main__":
+    main()
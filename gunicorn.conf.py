@@ -0,0 +1,71 @@
+"""
+Gunicorn configuration for the booking app (production entry point).
+
+    gunicorn --config gunicorn.conf.py app:app
+
+gthread workers: each worker serves GUNICORN_THREADS requests at once, and every
+request holds at most one database connection at a time, so a worker's pool is
+sized to its threads plus the two background jobs. The worker count is then
+capped so all pools together stay within DB_MAX_CONNECTIONS.
+
+The app is preloaded in the master, which creates the tracing tables once
+(when_ready). Each worker then opens its own DB pool and starts its background
+jobs after the fork (post_fork), since sockets and threads are not inherited.
+"""
+
+import multiprocessing
+import os
+import shutil
+
+# ===== Sizing =====
+CPU_COUNT = multiprocessing.cpu_count()
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 40))  # this app's share of max_connections
+BACKGROUND_CONNECTIONS = 2  # trace maintenance + latency flusher
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+db_pool_max = threads + BACKGROUND_CONNECTIONS
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             max(1, min(2 * CPU_COUNT + 1, DB_MAX_CONNECTIONS // db_pool_max))))
+# Read by app.py at import, which happens after this file is loaded
+os.environ.setdefault('DB_POOL_MAX', str(db_pool_max))
+
+# ===== Server =====
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+preload_app = True
+# Longer than the load balancer's idle timeout, so it never reuses a connection we just closed
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 75))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Recycle workers gradually (jitter keeps them from restarting together) to bound slow leaks
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+# Heartbeat files on tmpfs; a container's overlay filesystem can stall them
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = None  # every request is already recorded in app_traces
+errorlog = '-'
+
+# ===== Metrics =====
+# Each worker writes its metrics here and /metrics aggregates them; set before prometheus_client is imported
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    # First load only (a HUP re-reads this file while workers still write there): start empty
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = '/tmp/booking-prometheus'
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+# ===== Hooks =====
+def when_ready(server):
+    """Once, in the master, before the first worker is forked."""
+    from app import init_tracing_table
+    init_tracing_table()
+
+
+def post_fork(server, worker):
+    from app import start_worker_services
+    start_worker_services()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -6,11 +6,14 @@ Provides tools for monitoring Movie Ticket App, querying logs, and checking heal
 import os
 import json
 import logging
+import random
 import requests
 import threading
 import time as time_module
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, has_request_context
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,7 +26,7 @@ app = Flask(__name__)
 def after_request(response):
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-API-Key'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-API-Key, traceparent, tracestate'
     return response
 
 # Configuration from environment variables
@@ -40,6 +43,151 @@ CODE_ENGINE_REGION = os.environ.get('CODE_ENGINE_REGION', 'us-south')
 # Microsoft Teams Webhook configuration
 TEAMS_WEBHOOK_URL = os.environ.get('TEAMS_WEBHOOK_URL', 'https://default76a2ae5a9f004f6b95ed5d33d77c4d.61.environment.api.powerplatform.com:443/powerautomate/automations/direct/workflows/a1f73be7e4194ca7934bf767e8905a8c/triggers/manual/paths/invoke?api-version=1&sp=%2Ftriggers%2Fmanual%2Frun&sv=1.0&sig=fvjrbCmYXrlUpjjAcknEExXFrUOhhGdBNYH4QhAaHn8')
 
+# ============== Prometheus Metrics ==============
+# Latency buckets (seconds): MCP tools range from sub-second proxies to multi-second log scans and restarts
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+UPSTREAM_SERVICES = ('cloud_logs', 'iam', 'code_engine', 'teams')
+
+HTTP_REQUEST_LATENCY = Histogram(
+    'mcp_http_request_duration_seconds', 'HTTP request latency per endpoint',
+    ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUEST_ERRORS = Counter(
+    'mcp_http_request_errors_total', 'HTTP requests answered with status >= 400',
+    ['endpoint', 'method']
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge('mcp_http_requests_in_flight', 'HTTP requests currently being handled')
+TOOL_LATENCY = Histogram(
+    'mcp_tool_duration_seconds', 'MCP tool execution latency', ['tool'], buckets=LATENCY_BUCKETS
+)
+TOOL_ERRORS = Counter('mcp_tool_errors_total', 'MCP tool executions that returned an error', ['tool'])
+UPSTREAM_CALLS = Counter(
+    'mcp_upstream_requests_total', 'Outbound calls to IBM Cloud / Teams APIs', ['service', 'outcome']
+)
+UPSTREAM_LATENCY = Histogram(
+    'mcp_upstream_request_duration_seconds', 'Outbound call latency to IBM Cloud / Teams APIs',
+    ['service'], buckets=LATENCY_BUCKETS
+)
+MONITORING_ACTIVE = Gauge('mcp_monitoring_active', 'Whether a monitoring loop is running (1) or not (0)', ['loop'])
+MONITORING_CHECKS = Gauge('mcp_monitoring_checks', 'Checks completed by the current monitoring loop', ['loop'])
+MONITORING_HISTORY_DEPTH = Gauge('mcp_monitoring_history_depth', 'Check results buffered in monitoring history', ['loop'])
+RUNBOOK_RESTARTS = Gauge('mcp_runbook_restarts', 'Auto-restarts performed by the current runbook loop')
+
+# Label sets are bound once here (and per route / per tool further down) so hot paths only do a dict lookup
+_upstream_metrics = {
+    service: (UPSTREAM_CALLS.labels(service, 'ok'), UPSTREAM_CALLS.labels(service, 'error'), UPSTREAM_LATENCY.labels(service))
+    for service in UPSTREAM_SERVICES
+}
+_endpoint_metrics = {}
+
+
+def _endpoint_metric_children(rule, method):
+    children = _endpoint_metrics.get((rule, method))
+    if children is None:
+        children = (HTTP_REQUEST_LATENCY.labels(rule, method), HTTP_REQUEST_ERRORS.labels(rule, method))
+        _endpoint_metrics[(rule, method)] = children
+    return children
+
+
+def _upstream_request(service, method, url, **kwargs):
+    """requests.request() wrapper that counts calls, errors and latency per upstream service"""
+    ok, errors, latency = _upstream_metrics[service]
+    start = time_module.perf_counter()
+    try:
+        response = requests.request(method, url, **kwargs)
+    except Exception:
+        latency.observe(time_module.perf_counter() - start)
+        errors.inc()
+        raise
+    latency.observe(time_module.perf_counter() - start)
+    (errors if response.status_code >= 400 else ok).inc()
+    return response
+
+
+@app.before_request
+def before_request_metrics():
+    g.metrics_start = time_module.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+
+
+@app.after_request
+def after_request_metrics(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        latency, errors = _endpoint_metric_children(rule, request.method)
+        latency.observe(time_module.perf_counter() - start)
+        if response.status_code >= 400:
+            errors.inc()
+    return response
+
+
+@app.teardown_request
+def teardown_request_metrics(exc):
+    HTTP_REQUESTS_IN_FLIGHT.dec()
+
+
+# ============== Trace Context (W3C traceparent) ==============
+# A traceparent from the SRE agent is continued: this request becomes a child span, and every call
+# to the booking app carries it, so the app records its trace rows under the orchestrator's trace ID.
+
+def _parse_traceparent(header):
+    """(trace_id, parent_span_id, flags) from a traceparent header, or None if missing or invalid"""
+    if not header:
+        return None
+    parts = header.strip().lower().split('-')
+    if len(parts) < 4 or parts[0] == 'ff' or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) < 2:
+        return None
+    try:
+        if not int(parts[1], 16) or not int(parts[2], 16):
+            return None
+    except ValueError:
+        return None
+    return parts[1], parts[2], parts[3][:2]
+
+
+@app.before_request
+def before_request_trace():
+    inbound = _parse_traceparent(request.headers.get('traceparent'))
+    if inbound:
+        g.trace_id, g.parent_span_id, g.trace_flags = inbound
+    else:
+        g.trace_id, g.parent_span_id, g.trace_flags = f"{random.getrandbits(128) or 1:032x}", None, '01'
+    g.span_id = f"{random.getrandbits(64) or 1:016x}"
+    g.tracestate = request.headers.get('tracestate', '')
+
+
+@app.after_request
+def after_request_trace(response):
+    if 'span_id' in g:
+        response.headers['traceparent'] = f"00-{g.trace_id}-{g.span_id}-{g.trace_flags}"
+        if request.path not in ('/health', '/metrics'):
+            logger.info(f"trace={g.trace_id} span={g.span_id} parent={g.parent_span_id or '-'} "
+                        f"{request.method} {request.path} -> {response.status_code}")
+    return response
+
+
+def _outbound_trace_headers():
+    if not has_request_context() or 'span_id' not in g:
+        return {}
+    headers = {'traceparent': f"00-{g.trace_id}-{g.span_id}-{g.trace_flags}"}
+    if g.tracestate:
+        headers['tracestate'] = g.tracestate
+    return headers
+
+
+class _TraceContextAdapter(HTTPAdapter):
+    """Adds the current request's trace context to every call sent through it"""
+
+    def add_headers(self, prepared, **kwargs):
+        prepared.headers.update(_outbound_trace_headers())
+
+
+# Calls to the booking app go through this session: trace headers plus reused keep-alive connections
+app_http = requests.Session()
+app_http.mount(APP_URL, _TraceContextAdapter())
+
+
 # ============== Continuous Monitoring State ==============
 _monitoring_state = {
     'active': False,
@@ -69,6 +217,13 @@ _runbook_monitoring_state = {
     'teams_webhook_url': '',
 }
 
+# Monitoring gauges are read at scrape time — the loops themselves pay nothing
+for _loop_name, _state in (('monitoring', _monitoring_state), ('runbook', _runbook_monitoring_state)):
+    MONITORING_ACTIVE.labels(_loop_name).set_function(lambda st=_state: 1 if st['active'] else 0)
+    MONITORING_CHECKS.labels(_loop_name).set_function(lambda st=_state: st['check_count'])
+    MONITORING_HISTORY_DEPTH.labels(_loop_name).set_function(lambda st=_state: len(st['history']))
+RUNBOOK_RESTARTS.set_function(lambda: _runbook_monitoring_state['restart_count'])
+
 
 def _send_teams_notification(webhook_url, result):
     """Send a monitoring result as a Microsoft Teams Adaptive Card via webhook."""
@@ -232,7 +387,7 @@ def _send_teams_notification(webhook_url, result):
                 "size": "Small"
             })
 
-        resp = requests.post(webhook_url, json=card, timeout=10)
+        resp = _upstream_request('teams', 'POST', webhook_url, json=card, timeout=10)
         if resp.status_code in (200, 202):
             logger.info(f"Teams notification sent successfully ({overall})")
         else:
@@ -259,7 +414,7 @@ def _run_single_health_check():
 
     # --- App health ---
     try:
-        resp = requests.get(f"{APP_URL}/health", timeout=10)
+        resp = app_http.get(f"{APP_URL}/health", timeout=10)
         if resp.status_code == 200:
             result['app_health'] = {
                 'status': 'healthy',
@@ -280,7 +435,7 @@ def _run_single_health_check():
 
     # --- DB health ---
     try:
-        resp = requests.get(f"{APP_URL}/get", timeout=15)
+        resp = app_http.get(f"{APP_URL}/get", timeout=15)
         if resp.status_code == 200:
             result['db_health'] = {
                 'status': 'healthy',
@@ -478,7 +633,7 @@ def _monitoring_loop():
                         }
                     }]
                 }
-                requests.post(webhook_url, json=crash_card, timeout=10)
+                _upstream_request('teams', 'POST', webhook_url, json=crash_card, timeout=10)
             except Exception:
                 pass
         return
@@ -509,7 +664,7 @@ def _monitoring_loop():
                     }
                 }]
             }
-            requests.post(webhook_url, json=stop_card, timeout=10)
+            _upstream_request('teams', 'POST', webhook_url, json=stop_card, timeout=10)
         except Exception as e:
             logger.error(f"Failed to send Teams stop notification: {e}")
 
@@ -710,7 +865,7 @@ def _send_runbook_teams_event(webhook_url, event_type, details=None):
     }
 
     try:
-        resp = requests.post(webhook_url, json=card, timeout=10)
+        resp = _upstream_request('teams', 'POST', webhook_url, json=card, timeout=10)
         if resp.status_code in (200, 202):
             logger.info(f"Runbook Teams notification sent: {event_type}")
         else:
@@ -899,8 +1054,8 @@ def get_bearer_token():
     
     # Get new token
     try:
-        response = requests.post(
-            'https://iam.cloud.ibm.com/identity/token',
+        response = _upstream_request(
+            'iam', 'POST', 'https://iam.cloud.ibm.com/identity/token',
             headers={'Content-Type': 'application/x-www-form-urlencoded'},
             data=f'grant_type=urn:ibm:params:oauth:grant-type:apikey&apikey={IBM_API_KEY}'
         )
@@ -941,8 +1096,8 @@ def query_cloud_logs(query, start_date=None, end_date=None, limit=100):
         }
     }
     
-    response = requests.post(
-        url,
+    response = _upstream_request(
+        'cloud_logs', 'POST', url,
         headers={
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json',
@@ -1029,7 +1184,7 @@ def discover_code_engine_apps():
     }
     
     # Step 1: List all projects
-    projects_response = requests.get(f"{base_url}/projects", headers=headers, timeout=30)
+    projects_response = _upstream_request('code_engine', 'GET', f"{base_url}/projects", headers=headers, timeout=30)
     if projects_response.status_code != 200:
         return {"status": "error", "message": f"Failed to list projects: {projects_response.text}"}
     
@@ -1041,8 +1196,8 @@ def discover_code_engine_apps():
         project_id = project.get('id', '')
         project_name = project.get('name', '')
         
-        apps_response = requests.get(
-            f"{base_url}/projects/{project_id}/apps",
+        apps_response = _upstream_request(
+            'code_engine', 'GET', f"{base_url}/projects/{project_id}/apps",
             headers=headers, timeout=30
         )
         if apps_response.status_code == 200:
@@ -1095,8 +1250,8 @@ def scale_code_engine_app(project_id, app_name, min_scale, max_scale=None):
     url = f"https://api.{CODE_ENGINE_REGION}.codeengine.cloud.ibm.com/v2/projects/{project_id}/apps/{app_name}"
     
     # First, get the current app configuration for ETag
-    get_response = requests.get(
-        url,
+    get_response = _upstream_request(
+        'code_engine', 'GET', url,
         headers={
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
@@ -1115,8 +1270,8 @@ def scale_code_engine_app(project_id, app_name, min_scale, max_scale=None):
         "scale_max_instances": max_scale
     }
     
-    patch_response = requests.patch(
-        url,
+    patch_response = _upstream_request(
+        'code_engine', 'PATCH', url,
         headers={
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/merge-patch+json',
@@ -1146,8 +1301,8 @@ def get_code_engine_app_status(project_id, app_name):
     
     url = f"https://api.{CODE_ENGINE_REGION}.codeengine.cloud.ibm.com/v2/projects/{project_id}/apps/{app_name}"
     
-    response = requests.get(
-        url,
+    response = _upstream_request(
+        'code_engine', 'GET', url,
         headers={
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
@@ -1175,7 +1330,7 @@ def get_app_instances(project_id, app_name):
     """Get running instances of a Code Engine app with CPU/memory/restart details"""
     token = get_bearer_token()
     url = f"https://api.{CODE_ENGINE_REGION}.codeengine.cloud.ibm.com/v2/projects/{project_id}/apps/{app_name}/instances"
-    response = requests.get(url, headers={'Authorization': f'Bearer {token}'}, timeout=30)
+    response = _upstream_request('code_engine', 'GET', url, headers={'Authorization': f'Bearer {token}'}, timeout=30)
     if response.status_code == 200:
         instances = response.json().get('instances', [])
         instance_details = []
@@ -1210,7 +1365,7 @@ def get_app_revisions(project_id, app_name):
     """Get deployment revisions history for an app"""
     token = get_bearer_token()
     url = f"https://api.{CODE_ENGINE_REGION}.codeengine.cloud.ibm.com/v2/projects/{project_id}/apps/{app_name}/revisions"
-    response = requests.get(url, headers={'Authorization': f'Bearer {token}'}, timeout=30)
+    response = _upstream_request('code_engine', 'GET', url, headers={'Authorization': f'Bearer {token}'}, timeout=30)
     if response.status_code == 200:
         revisions = response.json().get('revisions', [])
         rev_details = []
@@ -1234,7 +1389,7 @@ def get_build_status(project_id, limit=5):
     """Get recent build runs status for a project"""
     token = get_bearer_token()
     url = f"https://api.{CODE_ENGINE_REGION}.codeengine.cloud.ibm.com/v2/projects/{project_id}/build_runs?limit={limit}"
-    response = requests.get(url, headers={'Authorization': f'Bearer {token}'}, timeout=30)
+    response = _upstream_request('code_engine', 'GET', url, headers={'Authorization': f'Bearer {token}'}, timeout=30)
     if response.status_code == 200:
         build_runs = response.json().get('build_runs', [])
         builds = []
@@ -1273,7 +1428,7 @@ def measure_response_times(num_samples=5):
         for _ in range(num_samples):
             try:
                 start = time.time()
-                resp = requests.get(url, timeout=30)
+                resp = app_http.get(url, timeout=30)
                 elapsed_ms = (time.time() - start) * 1000
                 samples.append(elapsed_ms)
                 status_code = resp.status_code
@@ -1333,6 +1488,7 @@ def measure_response_times(num_samples=5):
     
     return {
         "status": "success",
+        "source": f"synthetic probes, {num_samples} per endpoint",
         "total_requests": len(all_times),
         "total_errors": total_errors,
         "p50_ms": round(global_p50, 2),
@@ -1347,6 +1503,52 @@ def measure_response_times(num_samples=5):
     }
 
 
+def real_traffic_latency(minutes=15):
+    """Percentiles over real requests from the app's latency histograms; None if there was no traffic.
+
+    Same shape as measure_response_times, so callers fall back to probing when this returns None.
+    """
+    try:
+        resp = app_http.get(f"{APP_URL}/latencyStats", params={'minutes': minutes}, timeout=15)
+        resp.raise_for_status()
+        data = resp.json()
+    except Exception:
+        return None
+    overall = data.get('overall') or [{}]
+    total = overall[0]
+    if not total.get('count'):
+        return None
+
+    endpoints = {}
+    for e in data.get('series', []):
+        endpoints[f"{e['method']} {e['endpoint']}"] = {
+            "samples": e['count'],
+            "avg_ms": e['avg_ms'],
+            "p50_ms": e['p50_ms'],
+            "p90_ms": e['p90_ms'],
+            "p95_ms": e['p95_ms'],
+            "p99_ms": e['p99_ms'],
+            "max_ms": e['max_ms'],
+            "error_count": e['errors'],
+            "sla_status": "PASS" if e['p95_ms'] < 3000 else ("WARNING" if e['p95_ms'] < 5000 else "FAIL"),
+        }
+    return {
+        "status": "success",
+        "source": f"real traffic, last {minutes} min ({data.get('instances', 0)} instance(s))",
+        "total_requests": total['count'],
+        "total_errors": total['errors'],
+        "p50_ms": total['p50_ms'],
+        "p90_ms": total['p90_ms'],
+        "p95_ms": total['p95_ms'],
+        "p99_ms": total['p99_ms'],
+        "avg_ms": total['avg_ms'],
+        "pct_requests_under_3s": total['pct_under_3s'],
+        "sla_target": "95% of requests < 3s",
+        "sla_met": total['pct_under_3s'] >= 95,
+        "endpoints": endpoints
+    }
+
+
 # ============== MCP Tools ==============
 
 @app.route('/health', methods=['GET'])
@@ -1355,11 +1557,17 @@ def mcp_health():
     return jsonify({"status": "healthy", "service": "SRE MCP Server"})
 
 
+@app.route('/metrics', methods=['GET'])
+def mcp_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
 @app.route('/tools/check_app_health', methods=['GET', 'POST'])
 def check_app_health():
     """Check if the Movie Ticket App is running and healthy"""
     try:
-        response = requests.get(f"{APP_URL}/health", timeout=10)
+        response = app_http.get(f"{APP_URL}/health", timeout=10)
         if response.status_code == 200:
             return jsonify({
                 "status": "healthy",
@@ -1391,7 +1599,7 @@ def check_app_health():
 def check_database_health():
     """Check database connectivity by calling the app's /get endpoint"""
     try:
-        response = requests.get(f"{APP_URL}/get", timeout=15)
+        response = app_http.get(f"{APP_URL}/get", timeout=15)
         if response.status_code == 200:
             return jsonify({
                 "status": "healthy",
@@ -1523,7 +1731,7 @@ def query_logs():
 def get_seat_status():
     """Get current seat availability from the Movie Ticket App"""
     try:
-        response = requests.get(f"{APP_URL}/get", timeout=15)
+        response = app_http.get(f"{APP_URL}/get", timeout=15)
         response.raise_for_status()
         
         seats = response.json()
@@ -1548,7 +1756,7 @@ def get_seat_status():
 def get_bookings():
     """Get all booking details from the Movie Ticket App"""
     try:
-        response = requests.get(f"{APP_URL}/getUsersDetails", timeout=15)
+        response = app_http.get(f"{APP_URL}/getUsersDetails", timeout=15)
         response.raise_for_status()
         
         bookings = response.json()
@@ -1577,7 +1785,7 @@ def get_system_status():
     
     # Check app health
     try:
-        response = requests.get(f"{APP_URL}/health", timeout=10)
+        response = app_http.get(f"{APP_URL}/health", timeout=10)
         status["app"] = {
             "status": "healthy" if response.status_code == 200 else "unhealthy",
             "response_time_ms": response.elapsed.total_seconds() * 1000
@@ -1587,7 +1795,7 @@ def get_system_status():
     
     # Check database
     try:
-        response = requests.get(f"{APP_URL}/get", timeout=15)
+        response = app_http.get(f"{APP_URL}/get", timeout=15)
         status["database"] = {
             "status": "healthy" if response.status_code == 200 else "unhealthy",
             "response_time_ms": response.elapsed.total_seconds() * 1000
@@ -1885,7 +2093,7 @@ def rest_get_recent_traces():
         else:
             limit = request.args.get('limit', 20, type=int)
 
-        response = requests.get(f"{APP_URL}/getRecentTraces?limit={limit}", timeout=15)
+        response = app_http.get(f"{APP_URL}/getRecentTraces?limit={limit}", timeout=15)
         response.raise_for_status()
         return jsonify(response.json())
     except Exception as e:
@@ -1905,7 +2113,7 @@ def rest_get_trace_details():
         if not trace_id:
             return jsonify({"status": "error", "message": "trace_id is required"}), 400
 
-        response = requests.get(f"{APP_URL}/getTraceDetails/{trace_id}", timeout=15)
+        response = app_http.get(f"{APP_URL}/getTraceDetails/{trace_id}", timeout=15)
         response.raise_for_status()
         return jsonify(response.json())
     except Exception as e:
@@ -1922,7 +2130,7 @@ def rest_simulate_error():
         else:
             error_type = request.args.get('error_type', '500')
 
-        response = requests.post(
+        response = app_http.post(
             f"{APP_URL}/simulate/error",
             json={"error_type": error_type},
             timeout=15
@@ -1941,7 +2149,7 @@ def rest_simulate_error():
 def rest_reset_bookings():
     """Reset all bookings in the app"""
     try:
-        response = requests.post(f"{APP_URL}/resetBookings", timeout=15)
+        response = app_http.post(f"{APP_URL}/resetBookings", timeout=15)
         response.raise_for_status()
         return jsonify(response.json())
     except Exception as e:
@@ -1954,12 +2162,12 @@ def rest_get_trace_summary():
     try:
         if request.method == 'POST':
             data = request.get_json(silent=True) or {}
-            limit = data.get('limit', 50)
+            hours = data.get('hours', 1)
         else:
-            limit = request.args.get('limit', 50, type=int)
+            hours = request.args.get('hours', 1, type=float)
 
         # Delegate to MCP tool handler
-        result = execute_mcp_tool('get_trace_summary', {'limit': limit})
+        result = execute_mcp_tool('get_trace_summary', {'hours': hours})
         return jsonify(result)
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -2147,7 +2355,7 @@ MCP_TOOLS = [
     },
     {
         "name": "get_response_times",
-        "description": "Measure response times (latency) for all app endpoints with percentile metrics (P50/P90/P95/P99). SLA target: 95% of requests must complete under 3 seconds. Takes 5 samples per endpoint.",
+        "description": "Measure response times (latency) for all app endpoints with percentile metrics (P50/P90/P95/P99). SLA target: 95% of requests must complete under 3 seconds. Uses real traffic from the last 15 minutes; with no traffic, takes 5 probe samples per endpoint.",
         "inputSchema": {
             "type": "object",
             "properties": {},
@@ -2343,14 +2551,14 @@ MCP_TOOLS = [
     },
     {
         "name": "get_trace_summary",
-        "description": "Get analytics summary of all traced user sessions. Shows total sessions, total events, avg events per session, avg session duration, booking success rate, most common user flows, error rate, and peak usage times. Use this for a high-level view of app usage patterns and health trends.",
+        "description": "Get analytics summary of all traced user sessions in a time window. Shows total sessions, total events, avg events per session, avg session duration, booking success rate, most common user flows, error rate, per-action latency percentiles (p50/p90/p95/p99) and the open → seat map → booking funnel. Use this for a high-level view of app usage patterns and health trends.",
         "inputSchema": {
             "type": "object",
             "properties": {
-                "limit": {
-                    "type": "integer",
-                    "description": "Number of recent traces to analyze (default: 50)",
-                    "default": 50
+                "hours": {
+                    "type": "number",
+                    "description": "Number of hours to look back (default: 1)",
+                    "default": 1
                 }
             },
             "required": []
@@ -2466,11 +2674,30 @@ def mcp_endpoint():
         })
 
 
+_tool_metrics = {
+    name: (TOOL_LATENCY.labels(name), TOOL_ERRORS.labels(name))
+    for name in [t['name'] for t in MCP_TOOLS] + ['unknown']
+}
+
+
 def execute_mcp_tool(tool_name, args):
+    """Execute an MCP tool, recording its latency and error metrics"""
+    latency, errors = _tool_metrics.get(tool_name) or _tool_metrics['unknown']
+    start = time_module.perf_counter()
+    try:
+        result = _execute_mcp_tool(tool_name, args)
+    finally:
+        latency.observe(time_module.perf_counter() - start)
+    if isinstance(result, dict) and (result.get('error') or result.get('status') == 'error'):
+        errors.inc()
+    return result
+
+
+def _execute_mcp_tool(tool_name, args):
     """Execute an MCP tool and return the result"""
     try:
         if tool_name == 'check_app_health':
-            response = requests.get(APP_URL, timeout=30)
+            response = app_http.get(APP_URL, timeout=30)
             return {
                 "status": "healthy" if response.status_code == 200 else "unhealthy",
                 "app_url": APP_URL,
@@ -2480,7 +2707,7 @@ def execute_mcp_tool(tool_name, args):
         
         elif tool_name == 'check_database_health':
             try:
-                response = requests.get(f"{APP_URL}/get", timeout=30)
+                response = app_http.get(f"{APP_URL}/get", timeout=30)
                 return {
                     "status": "healthy" if response.status_code == 200 else "unhealthy",
                     "message": "Database connection is working" if response.status_code == 200 else "Database connection issue detected"
@@ -2540,14 +2767,14 @@ def execute_mcp_tool(tool_name, args):
         elif tool_name == 'get_system_status':
             # Check app health
             try:
-                app_response = requests.get(APP_URL, timeout=30)
+                app_response = app_http.get(APP_URL, timeout=30)
                 app_status = {"status": "healthy" if app_response.status_code == 200 else "unhealthy"}
             except Exception as e:
                 app_status = {"status": "unhealthy", "error": str(e)}
             
             # Check database
             try:
-                db_response = requests.get(f"{APP_URL}/get", timeout=30)
+                db_response = app_http.get(f"{APP_URL}/get", timeout=30)
                 db_status = {"status": "healthy" if db_response.status_code == 200 else "unhealthy"}
             except Exception as e:
                 db_status = {"status": "unhealthy", "error": str(e)}
@@ -2564,9 +2791,9 @@ def execute_mcp_tool(tool_name, args):
         elif tool_name == 'get_seat_bookings':
             try:
                 # Get seat status
-                seats_response = requests.get(f"{APP_URL}/get", timeout=30)
+                seats_response = app_http.get(f"{APP_URL}/get", timeout=30)
                 # Get booking details (who booked)
-                bookings_response = requests.get(f"{APP_URL}/getUsersDetails", timeout=30)
+                bookings_response = app_http.get(f"{APP_URL}/getUsersDetails", timeout=30)
                 
                 if seats_response.status_code == 200:
                     seats = seats_response.json()
@@ -2702,8 +2929,8 @@ def execute_mcp_tool(tool_name, args):
             return result
         
         elif tool_name == 'get_response_times':
-            # Measure response times and check SLAs
-            result = measure_response_times()
+            # Real-traffic percentiles when there is traffic, synthetic probes otherwise
+            result = real_traffic_latency() or measure_response_times()
             return result
         
         elif tool_name == 'get_deployment_history':
@@ -2756,7 +2983,7 @@ def execute_mcp_tool(tool_name, args):
             # Also check app_traces for error traces (reliable DB-based source)
             trace_errors = 0
             try:
-                traces_resp = requests.get(f"{APP_URL}/getRecentTraces?limit=50", timeout=15)
+                traces_resp = app_http.get(f"{APP_URL}/getRecentTraces?limit=50", timeout=15)
                 if traces_resp.status_code == 200:
                     traces_data = traces_resp.json()
                     traces_list = traces_data.get('traces', [])
@@ -2783,7 +3010,7 @@ def execute_mcp_tool(tool_name, args):
             
             # ---- Collect all raw data first ----
             # Latency
-            latency = measure_response_times(num_samples=5)
+            latency = real_traffic_latency() or measure_response_times(num_samples=5)
             p50 = latency.get('p50_ms', -1)
             p90 = latency.get('p90_ms', -1)
             p95 = latency.get('p95_ms', -1)
@@ -2798,7 +3025,7 @@ def execute_mcp_tool(tool_name, args):
             
             # App & DB health
             try:
-                app_resp = requests.get(APP_URL, timeout=30)
+                app_resp = app_http.get(APP_URL, timeout=30)
                 app_status = 'UP' if app_resp.status_code == 200 else 'DOWN'
                 app_latency_ms = round(app_resp.elapsed.total_seconds() * 1000)
             except:
@@ -2806,7 +3033,7 @@ def execute_mcp_tool(tool_name, args):
                 app_latency_ms = -1
             
             try:
-                db_resp = requests.get(f"{APP_URL}/get", timeout=30)
+                db_resp = app_http.get(f"{APP_URL}/get", timeout=30)
                 db_status = 'UP' if db_resp.status_code == 200 else 'DOWN'
                 db_latency_ms = round(db_resp.elapsed.total_seconds() * 1000)
             except:
@@ -2859,7 +3086,7 @@ def execute_mcp_tool(tool_name, args):
             total_seats = booked_seats = available_seats = 0
             occupancy_pct = 0.0
             try:
-                seats_resp = requests.get(f"{APP_URL}/get", timeout=15)
+                seats_resp = app_http.get(f"{APP_URL}/get", timeout=15)
                 if seats_resp.status_code == 200:
                     seat_data = seats_resp.json()
                     total_seats = len(seat_data)
@@ -2873,20 +3100,12 @@ def execute_mcp_tool(tool_name, args):
             request_count = 0
             booking_count = 0
             try:
-                traces_resp = requests.get(f"{APP_URL}/getRecentTraces?limit=50", timeout=15)
-                if traces_resp.status_code == 200:
-                    traces_data = traces_resp.json()
-                    traces_list = traces_data if isinstance(traces_data, list) else traces_data.get('traces', [])
-                    # Count total traced requests (each trace = a user session with multiple events)
-                    for t in traces_list:
-                        actions = t.get('actions', [])
-                        # Handle actions as list or comma-separated string
-                        actions_str = ','.join(actions) if isinstance(actions, list) else str(actions)
-                        event_count = t.get('event_count', 0)
-                        request_count += event_count
-                        # Count booking transactions
-                        if 'BOOKING_CONFIRMED' in actions_str or 'BOOK_SEATS' in actions_str:
-                            booking_count += 1
+                stats_resp = app_http.get(f"{APP_URL}/traceStats", params={'hours': 1}, timeout=15)
+                if stats_resp.status_code == 200:
+                    sessions = stats_resp.json().get('sessions', {})
+                    # Traced requests and booking sessions over the last hour
+                    request_count = sessions.get('total_events', 0)
+                    booking_count = sessions.get('booking_sessions', 0)
             except:
                 pass
             
@@ -3008,7 +3227,7 @@ def execute_mcp_tool(tool_name, args):
                         "signal": "Traffic",
                         "status": traffic_status,
                         "metric": "Request Volume",
-                        "current_value": f"{request_count} requests in recent traces, {booking_count} booking transactions",
+                        "current_value": f"{request_count} requests in the last hour, {booking_count} booking transactions",
                         "target": "Non-zero traffic",
                         "sla_met": request_count > 0
                     },
@@ -3204,7 +3423,7 @@ def execute_mcp_tool(tool_name, args):
         elif tool_name == 'get_recent_traces':
             limit = args.get('limit', 20)
             try:
-                response = requests.get(f"{APP_URL}/getRecentTraces?limit={limit}", timeout=15)
+                response = app_http.get(f"{APP_URL}/getRecentTraces?limit={limit}", timeout=15)
                 response.raise_for_status()
                 data = response.json()
                 return data
@@ -3216,7 +3435,7 @@ def execute_mcp_tool(tool_name, args):
             if not trace_id:
                 return {"status": "error", "message": "trace_id is required. Use get_recent_traces first to find a trace ID."}
             try:
-                response = requests.get(f"{APP_URL}/getTraceDetails/{trace_id}", timeout=15)
+                response = app_http.get(f"{APP_URL}/getTraceDetails/{trace_id}", timeout=15)
                 response.raise_for_status()
                 data = response.json()
                 return data
@@ -3226,7 +3445,7 @@ def execute_mcp_tool(tool_name, args):
         elif tool_name == 'simulate_error':
             error_type = args.get('error_type', '500')
             try:
-                response = requests.post(
+                response = app_http.post(
                     f"{APP_URL}/simulate/error",
                     json={"error_type": error_type},
                     timeout=15
@@ -3244,7 +3463,7 @@ def execute_mcp_tool(tool_name, args):
 
         elif tool_name == 'reset_bookings':
             try:
-                response = requests.post(f"{APP_URL}/resetBookings", timeout=15)
+                response = app_http.post(f"{APP_URL}/resetBookings", timeout=15)
                 response.raise_for_status()
                 data = response.json()
                 return {
@@ -3256,75 +3475,39 @@ def execute_mcp_tool(tool_name, args):
                 return {"status": "error", "message": f"Failed to reset bookings: {str(e)}"}
 
         elif tool_name == 'get_trace_summary':
-            limit = args.get('limit', 50)
+            hours = args.get('hours', 1)
             try:
-                traces_resp = requests.get(f"{APP_URL}/getRecentTraces?limit={limit}", timeout=15)
-                traces_resp.raise_for_status()
-                traces_data = traces_resp.json()
-                traces_list = traces_data.get('traces', [])
-
-                if not traces_list:
-                    return {"status": "success", "message": "No traces found. No user sessions have been recorded yet.", "total_sessions": 0}
-
-                total_sessions = len(traces_list)
-                total_events = sum(t.get('event_count', 0) for t in traces_list)
-                avg_events = round(total_events / total_sessions, 1) if total_sessions > 0 else 0
-
-                # Calculate durations
-                durations = []
-                for t in traces_list:
-                    started = t.get('started_at')
-                    ended = t.get('ended_at')
-                    if started and ended:
-                        try:
-                            start_dt = datetime.fromisoformat(started)
-                            end_dt = datetime.fromisoformat(ended)
-                            dur_ms = (end_dt - start_dt).total_seconds() * 1000
-                            durations.append(dur_ms)
-                        except:
-                            pass
-                avg_duration_ms = round(sum(durations) / len(durations), 1) if durations else 0
-
-                # Count by status
-                success_count = sum(1 for t in traces_list if t.get('overall_status') == 'success')
-                error_count = total_sessions - success_count
-                error_rate = round((error_count / total_sessions) * 100, 1) if total_sessions > 0 else 0
-
-                # Count bookings
-                booking_sessions = 0
-                flow_counts = {}
-                for t in traces_list:
-                    actions = t.get('actions', [])
-                    actions_str = ','.join(sorted(actions)) if isinstance(actions, list) else str(actions)
-                    flow_counts[actions_str] = flow_counts.get(actions_str, 0) + 1
-                    if isinstance(actions, list):
-                        if 'BOOKING_CONFIRMED' in actions:
-                            booking_sessions += 1
-                    elif 'BOOKING_CONFIRMED' in str(actions):
-                        booking_sessions += 1
-
-                # Top flows
-                top_flows = sorted(flow_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-                top_flows_list = [{"flow": f, "count": c} for f, c in top_flows]
-
-                # Unique users (by IP)
-                unique_ips = len(set(t.get('user_ip', '') for t in traces_list if t.get('user_ip')))
-
+                # Aggregated in SQL by the booking app over the full window
+                stats_resp = app_http.get(f"{APP_URL}/traceStats", params={'hours': hours}, timeout=15)
+                stats_resp.raise_for_status()
+                stats = stats_resp.json()
+                sessions = stats.get('sessions', {})
+                total_sessions = sessions.get('total_sessions', 0)
+
+                if not total_sessions:
+                    return {"status": "success", "message": f"No traces found in the last {hours}h. No user sessions have been recorded yet.", "total_sessions": 0}
+
+                total_events = sessions.get('total_events', 0)
+                booking_sessions = sessions.get('booking_sessions', 0)
+                error_rate = sessions.get('error_rate_pct', 0)
                 return {
                     "status": "success",
+                    "window": f"last {hours}h (since {stats.get('since')})",
                     "summary": {
                         "total_sessions": total_sessions,
                         "total_events": total_events,
-                        "avg_events_per_session": avg_events,
-                        "avg_session_duration_ms": avg_duration_ms,
-                        "success_rate": f"{round(100 - error_rate, 1)}%",
+                        "avg_events_per_session": sessions.get('avg_events_per_session', 0),
+                        "avg_session_duration_ms": sessions.get('avg_session_duration_ms', 0),
+                        "success_rate": f"{sessions.get('success_rate_pct', 0)}%",
                         "error_rate": f"{error_rate}%",
                         "booking_sessions": booking_sessions,
-                        "booking_rate": f"{round((booking_sessions / total_sessions) * 100, 1)}%" if total_sessions > 0 else "0%",
-                        "unique_users_by_ip": unique_ips
+                        "booking_rate": f"{sessions.get('booking_rate_pct', 0)}%",
+                        "unique_users_by_ip": sessions.get('unique_users_by_ip', 0)
                     },
-                    "top_user_flows": top_flows_list,
-                    "message": f"Analyzed {total_sessions} sessions with {total_events} total events. {booking_sessions} resulted in bookings. Error rate: {error_rate}%."
+                    "latency_by_action": stats.get('actions', []),
+                    "booking_funnel": stats.get('funnel', {}),
+                    "top_user_flows": stats.get('top_flows', []),
+                    "message": f"Analyzed {total_sessions} sessions with {total_events} total events in the last {hours}h. {booking_sessions} resulted in bookings. Error rate: {error_rate}%."
                 }
             except Exception as e:
                 return {"status": "error", "message": f"Failed to get trace summary: {str(e)}"}
@@ -3336,6 +3519,12 @@ def execute_mcp_tool(tool_name, args):
         return {"error": str(e)}
 
 
+# Preallocate metric label sets for every route (HEAD/OPTIONS are answered by Flask itself)
+for _rule in app.url_map.iter_rules():
+    for _method in _rule.methods - {'HEAD', 'OPTIONS'}:
+        _endpoint_metric_children(_rule.rule, _method)
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     logger.info(f"Starting MCP Server on port {port}")
@@ -0,0 +1,216 @@
+"""
+Admission Control — Priority classes, fair scheduling and load shedding for agent work.
+
+Every agent execution is classified before it touches the MCP server:
+
+- critical     lifecycle operations (restart/start/stop, monitor start/stop)
+- interactive  cheap reads a user is waiting on (health, logs, traces, status)
+- background   expensive analysis (dashboards, failure analysis, autonomous loops)
+
+Each class has its own wait queue, a max in-flight limit and a weight. When
+a slot frees up, the next class is picked by stride scheduling: every class
+advances by 1/weight per admission, and the eligible class with the lowest
+pass goes next. Under contention critical work is admitted most often, and
+background work still makes progress. A global in-flight cap keeps agent work
+within the executor threads.
+
+Requests are shed with AdmissionRejected when the class queue is full or a
+request waits past the class's max wait.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_INFLIGHT = int(os.environ.get("ADMISSION_MAX_INFLIGHT", 12))
+
+# class → (weight, max in flight, max queued, max wait seconds)
+ADMISSION_CLASSES = {
+    "critical": (
+        8,
+        int(os.environ.get("ADMISSION_CRITICAL_INFLIGHT", 2)),
+        int(os.environ.get("ADMISSION_CRITICAL_QUEUE", 20)),
+        float(os.environ.get("ADMISSION_CRITICAL_WAIT_S", 60)),
+    ),
+    "interactive": (
+        4,
+        int(os.environ.get("ADMISSION_INTERACTIVE_INFLIGHT", 8)),
+        int(os.environ.get("ADMISSION_INTERACTIVE_QUEUE", 50)),
+        float(os.environ.get("ADMISSION_INTERACTIVE_WAIT_S", 15)),
+    ),
+    "background": (
+        1,
+        int(os.environ.get("ADMISSION_BACKGROUND_INFLIGHT", 3)),
+        int(os.environ.get("ADMISSION_BACKGROUND_QUEUE", 10)),
+        float(os.environ.get("ADMISSION_BACKGROUND_WAIT_S", 30)),
+    ),
+}
+
+CRITICAL_ACTIONS = {
+    ("deployment_agent", "restart_app"), ("deployment_agent", "start_app"), ("deployment_agent", "stop_app"),
+    ("monitoring_agent", "start"), ("monitoring_agent", "stop"),
+    ("runbook_agent", "start"), ("runbook_agent", "stop"),
+}
+BACKGROUND_ACTIONS = {
+    ("dashboard_agent", "get_dashboard"), ("dashboard_agent", "get_failure_analysis"),
+    ("dashboard_agent", "get_response_times"), ("trace_agent", "get_trace_summary"),
+    ("log_agent", "query_logs"),
+}
+
+
+def classify(agent_name: str, action: str, autonomous: bool = False) -> str:
+    """Priority class for one agent call; autonomous investigations are background unless critical."""
+    if (agent_name, action) in CRITICAL_ACTIONS:
+        return "critical"
+    if autonomous or (agent_name, action) in BACKGROUND_ACTIONS:
+        return "background"
+    return "interactive"
+
+
+class AdmissionRejected(RuntimeError):
+    """Request shed — the class queue is full or the wait ran out."""
+
+    def __init__(self, klass: str, reason: str, retry_after: int):
+        super().__init__(f"{klass} capacity exhausted ({reason})")
+        self.klass = klass
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Class:
+    __slots__ = ("name", "weight", "max_inflight", "max_queue", "max_wait", "waiters",
+                 "inflight", "pass_value", "stats")
+
+    def __init__(self, name: str, weight: int, max_inflight: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.weight = weight
+        self.max_inflight = max(max_inflight, 1)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiters: deque = deque()     # futures, oldest first
+        self.inflight = 0
+        self.pass_value = 0.0
+        self.stats = {"admitted": 0, "shed_queue_full": 0, "shed_timeout": 0,
+                      "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+
+class AdmissionController:
+    """Per-class queues with weighted fair admission. Use `async with controller.slot(klass)`."""
+
+    def __init__(self, classes: Dict[str, tuple] = ADMISSION_CLASSES, max_inflight: int = ADMISSION_MAX_INFLIGHT):
+        self._classes = {name: _Class(name, *cfg) for name, cfg in classes.items()}
+        self.max_inflight = max_inflight
+        self._inflight = 0
+
+    @asynccontextmanager
+    async def slot(self, klass: str):
+        c = self._classes[klass]
+        await self._acquire(c)
+        try:
+            yield
+        finally:
+            c.inflight -= 1
+            self._inflight -= 1
+            self._dispatch()
+
+    def _eligible(self, c: _Class) -> bool:
+        return c.inflight < c.max_inflight and self._inflight < self.max_inflight
+
+    async def _acquire(self, c: _Class):
+        enqueued = time.perf_counter()
+        # Fast path: nothing of this class waiting and capacity free
+        if not c.waiters and self._eligible(c):
+            self._admit(c, enqueued)
+            return
+        if len(c.waiters) >= c.max_queue:
+            c.stats["shed_queue_full"] += 1
+            raise AdmissionRejected(c.name, f"{c.max_queue} already queued", self._retry_after(c))
+
+        if not c.waiters:
+            # An idle class re-enters at the current pass — no credit for time spent idle
+            c.pass_value = max(c.pass_value, self._min_pass())
+        future = asyncio.get_event_loop().create_future()
+        c.waiters.append((future, enqueued))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), c.max_wait)
+        except asyncio.TimeoutError:
+            if future.done():
+                return      # admitted in the same tick the wait expired
+            self._remove(c, future)
+            c.stats["shed_timeout"] += 1
+            raise AdmissionRejected(c.name, f"waited {c.max_wait:.0f}s", self._retry_after(c))
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted as the caller went away — hand it on
+                c.inflight -= 1
+                self._inflight -= 1
+                self._dispatch()
+            else:
+                self._remove(c, future)
+            raise
+
+    def _remove(self, c: _Class, future):
+        for i, (f, _) in enumerate(c.waiters):
+            if f is future:
+                del c.waiters[i]
+                break
+        future.cancel()
+
+    def _admit(self, c: _Class, enqueued: float):
+        wait_ms = (time.perf_counter() - enqueued) * 1000
+        c.inflight += 1
+        self._inflight += 1
+        c.pass_value += 1.0 / c.weight
+        c.stats["admitted"] += 1
+        c.stats["wait_ms_total"] += wait_ms
+        c.stats["wait_ms_max"] = max(c.stats["wait_ms_max"], wait_ms)
+
+    def _min_pass(self) -> float:
+        busy = [c.pass_value for c in self._classes.values() if c.waiters or c.inflight]
+        return min(busy) if busy else 0.0
+
+    def _dispatch(self):
+        """Admit waiters while capacity lasts, lowest pass (weighted fair share) first."""
+        while self._inflight < self.max_inflight:
+            ready = [c for c in self._classes.values() if c.waiters and self._eligible(c)]
+            if not ready:
+                return
+            c = min(ready, key=lambda k: k.pass_value)
+            future, enqueued = c.waiters.popleft()
+            if future.done():
+                continue
+            self._admit(c, enqueued)
+            future.set_result(None)
+
+    @staticmethod
+    def _retry_after(c: _Class) -> int:
+        return max(1, int(c.max_wait / 4))
+
+    def get_stats(self) -> dict:
+        classes = {}
+        for c in self._classes.values():
+            s = c.stats
+            classes[c.name] = {
+                "weight": c.weight,
+                "in_flight": c.inflight,
+                "max_in_flight": c.max_inflight,
+                "queue_depth": len(c.waiters),
+                "max_queue": c.max_queue,
+                "admitted": s["admitted"],
+                "shed_queue_full": s["shed_queue_full"],
+                "shed_timeout": s["shed_timeout"],
+                "avg_wait_ms": round(s["wait_ms_total"] / s["admitted"], 1) if s["admitted"] else 0.0,
+                "max_wait_ms": round(s["wait_ms_max"], 1),
+                "oldest_wait_ms": round((time.perf_counter() - c.waiters[0][1]) * 1000, 1) if c.waiters else 0.0,
+            }
+        return {"in_flight": self._inflight, "max_in_flight": self.max_inflight, "classes": classes}
+
+
+# ── Singleton ───────────────────────────────────────────────────────
+admission = AdmissionController()
@@ -0,0 +1,153 @@
+"""
+Agent Pool — Long-lived worker agents with a task queue per agent type.
+
+The default (ephemeral) mode builds a new agent per query and keeps it alive
+for the inspection cooldown with a sleeping task. In pooled mode each agent
+type gets AGENT_POOL_WORKERS long-lived workers that pull tasks from a bounded
+queue, which also caps how many calls of that type run at once.
+
+Every task is still registered as its own record (ID "task-…", with the
+worker that ran it), so the registry, inspect view and history look the same.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+from admission_control import AdmissionRejected
+from agent_registry import registry
+from trace_context import current, use
+
+logger = logging.getLogger(__name__)
+
+AGENT_EXECUTION_MODE = os.environ.get("AGENT_EXECUTION_MODE", "ephemeral").lower()   # ephemeral | pooled
+AGENT_POOL_WORKERS = int(os.environ.get("AGENT_POOL_WORKERS", 2))
+AGENT_POOL_QUEUE_MAX = int(os.environ.get("AGENT_POOL_QUEUE_MAX", 50))
+
+
+class PoolFull(AdmissionRejected):
+    """The agent type's task queue is at AGENT_POOL_QUEUE_MAX.
+
+    A kind of shedding, so callers answer it like any other AdmissionRejected
+    (klass is the agent type here).
+    """
+
+
+class AgentPool:
+    """Per-type worker pools, started lazily on the running event loop."""
+
+    def __init__(self, agent_classes: Dict[str, type], mcp_client,
+                 workers: int = AGENT_POOL_WORKERS, max_queue: int = AGENT_POOL_QUEUE_MAX):
+        self.agent_classes = agent_classes
+        self.mcp = mcp_client
+        self.workers = max(workers, 1)
+        self.max_queue = max_queue
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: Dict[str, List[asyncio.Task]] = {}
+        self._busy: Dict[str, int] = {}
+        self._stats: Dict[str, dict] = {}
+
+    def _ensure_workers(self, agent_type: str) -> asyncio.Queue:
+        if agent_type not in self._queues:
+            cls = self.agent_classes[agent_type]
+            self._queues[agent_type] = asyncio.Queue(maxsize=self.max_queue)
+            self._busy[agent_type] = 0
+            self._stats[agent_type] = {
+                "submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "cancelled": 0,
+                "queue_wait_ms_total": 0.0, "run_ms_total": 0.0,
+            }
+            self._tasks[agent_type] = [
+                asyncio.create_task(self._worker(agent_type, f"{agent_type}-w{i}",
+                                                 cls(mcp_client=self.mcp, register=False)))
+                for i in range(self.workers)
+            ]
+            logger.info("Agent pool started: %s × %d workers", agent_type, self.workers)
+        return self._queues[agent_type]
+
+    async def run(self, agent_type: str, action: str, params: dict,
+                  event_callback: Optional[Callable] = None) -> dict:
+        """
+        Queue a task and wait for its result (same shape as BaseAgent.run).
+
+        If the caller is cancelled while the task is still queued, the task is
+        skipped; once a worker has started it, it runs to completion.
+        """
+        queue = self._ensure_workers(agent_type)
+        stats = self._stats[agent_type]
+        stats["submitted"] += 1
+        future = asyncio.get_event_loop().create_future()
+        try:
+            # Workers outlive the caller's context, so the caller's span travels with the task
+            queue.put_nowait((time.perf_counter(), action, params, event_callback, current(), future))
+        except asyncio.QueueFull:
+            stats["rejected"] += 1
+            raise PoolFull(agent_type, f"{self.max_queue} already queued for {agent_type} workers",
+                           self._retry_after(agent_type))
+        return await future
+
+    async def _worker(self, agent_type: str, worker_id: str, agent):
+        queue = self._queues[agent_type]
+        stats = self._stats[agent_type]
+        while True:
+            enqueued, action, params, event_callback, trace, future = await queue.get()
+            if future.cancelled():
+                stats["cancelled"] += 1
+                continue
+            started = time.perf_counter()
+            stats["queue_wait_ms_total"] += (started - enqueued) * 1000
+            self._busy[agent_type] += 1
+            result = None
+            # Nothing here may end the loop or leave the caller's future unresolved
+            try:
+                agent.start_task(event_callback, execution_mode="pooled", worker_id=worker_id)
+                with use(trace):
+                    result = await agent.run(action, params)
+            except Exception as e:
+                logger.error("Pool worker %s failed: %s", worker_id, e)
+                result = {"status": "error", "agent_id": agent.agent_id, "agent_type": agent_type,
+                          "action": action, "error": str(e)}
+            finally:
+                self._busy[agent_type] -= 1
+                try:
+                    registry.deregister(agent, result or {"status": "cancelled"}, final_status="completed")
+                except Exception as e:
+                    logger.error("Pool worker %s could not close its task record: %s", worker_id, e)
+                # The caller owns the result now; don't keep it on the worker until the next task
+                agent.result = None
+                if future.done():
+                    pass
+                elif result is None:
+                    future.cancel()  # the worker itself is being cancelled
+                else:
+                    future.set_result(result)
+
+            stats["run_ms_total"] += (time.perf_counter() - started) * 1000
+            stats["completed" if result.get("status") == "success" else "failed"] += 1
+
+    def _retry_after(self, agent_type: str) -> int:
+        """Seconds for the workers to get through a full queue at their average run time."""
+        s = self._stats[agent_type]
+        done = s["completed"] + s["failed"]
+        avg_run_s = s["run_ms_total"] / done / 1000 if done else 1.0
+        return max(1, round(avg_run_s * self.max_queue / self.workers))
+
+    def get_stats(self) -> dict:
+        per_type = {}
+        for agent_type, s in self._stats.items():
+            done = s["completed"] + s["failed"]
+            per_type[agent_type] = {
+                **{k: v for k, v in s.items() if not k.endswith("_total")},
+                "workers": len(self._tasks.get(agent_type, [])),
+                "busy": self._busy.get(agent_type, 0),
+                "queue_depth": self._queues[agent_type].qsize(),
+                "avg_queue_wait_ms": round(s["queue_wait_ms_total"] / done, 1) if done else 0.0,
+                "avg_run_ms": round(s["run_ms_total"] / done, 1) if done else 0.0,
+            }
+        return {
+            "mode": AGENT_EXECUTION_MODE,
+            "workers_per_type": self.workers,
+            "queue_max": self.max_queue,
+            "agent_types": per_type,
+        }
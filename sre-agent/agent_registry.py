@@ -5,30 +5,177 @@ Provides proof that agents are created, executed, and destroyed with:
 - Unique IDs, Python object IDs (memory address), thread info
 - Precise creation/completion timestamps
 - Full execution audit trail with every pipeline event recorded
+
+Audit trails are kept compact: events are (monotonic ns, interned step,
+status code, detail) tuples, capped per agent, and only turned into dicts
+when someone reads them.
+
+Every change to an agent bumps its `rev` and is pushed to listeners as a diff
+(status change or new event). A short per-agent backlog lets watchers resume
+from the last rev they saw instead of re-fetching the whole entry.
 """
 
 import os
+import sys
+import time
+import asyncio
 import threading
 import logging
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+
+from history_store import HistoryStore
+from persistence import history_db
 
 logger = logging.getLogger(__name__)
 
+AGENT_MAX_EVENTS = int(os.environ.get("AGENT_MAX_EVENTS", 200))
+# Diffs kept per active agent for resume; watchers further behind get a snapshot
+AGENT_DIFF_BACKLOG = int(os.environ.get("AGENT_DIFF_BACKLOG", 50))
+
+# "destroyed" — ephemeral agent torn down; "completed" — pooled task finished, worker lives on
+FINAL_STATUSES = ("destroyed", "completed")
+
+EVENT_STATUSES = ("pending", "running", "completed", "error")
+_STATUS_CODES = {name: code for code, name in enumerate(EVENT_STATUSES)}
+
+# Wall-clock offset of the monotonic clock, so monotonic stamps can be shown as UTC
+_WALL_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+def monotonic_to_iso(ts_ns: int) -> str:
+    """Naive-UTC ISO timestamp for a time.monotonic_ns() reading."""
+    return datetime.utcfromtimestamp((ts_ns + _WALL_OFFSET_NS) / 1e9).isoformat()
+
+
+class EventLog:
+    """
+    Bounded audit trail for one agent.
+
+    The first half of the cap is kept verbatim (creation and setup steps); after
+    that a ring buffer keeps the most recent events and counts what it drops.
+    """
+
+    __slots__ = ("head", "tail", "dropped", "_head_cap")
+
+    def __init__(self, cap: int = AGENT_MAX_EVENTS):
+        self._head_cap = cap // 2
+        self.head: list = []
+        self.tail: deque = deque(maxlen=cap - self._head_cap)
+        self.dropped = 0
+
+    def append(self, ts_ns: int, step: str, status: str, detail: str) -> tuple:
+        record = (ts_ns, sys.intern(step), _STATUS_CODES.get(status, 1), detail)
+        if len(self.head) < self._head_cap:
+            self.head.append(record)
+            return record
+        if len(self.tail) == self.tail.maxlen:
+            self.dropped += 1
+        self.tail.append(record)
+        return record
+
+    @staticmethod
+    def to_dict(record: tuple, agent_id: str, agent_type: str) -> dict:
+        ts_ns, step, code, detail = record
+        return {
+            "id": f"{ts_ns & 0xffffffff:08x}",
+            "step": step,
+            "status": EVENT_STATUSES[code],
+            "detail": detail,
+            "agent_id": agent_id,
+            "agent_type": agent_type,
+            "timestamp": monotonic_to_iso(ts_ns),
+        }
+
+    def to_dicts(self, agent_id: str, agent_type: str) -> List[dict]:
+        return [self.to_dict(r, agent_id, agent_type) for r in (*self.head, *self.tail)]
+
+    def approx_bytes(self) -> int:
+        """Container + tuples + detail strings; interned step names are shared, so not counted."""
+        records = (*self.head, *self.tail)
+        return (sys.getsizeof(self.head) + sys.getsizeof(self.tail)
+                + sum(sys.getsizeof(r) + sys.getsizeof(r[3]) for r in records))
+
+    def __len__(self) -> int:
+        return len(self.head) + len(self.tail)
+
+
+def _public(entry: dict) -> dict:
+    """Registry entry as served to the API — events expanded to dicts."""
+    log: EventLog = entry["events"]
+    return {
+        **entry,
+        "events": log.to_dicts(entry["agent_id"], entry["agent_type"]),
+        "events_dropped": log.dropped,
+    }
+
+
+async def _stored_agent_run(agent_id: str) -> Optional[dict]:
+    """History DB lookup; SQLite blocks, so it runs in the default executor."""
+    return await asyncio.get_running_loop().run_in_executor(None, history_db.get_agent_run, agent_id)
+
 
 class AgentRegistry:
     """Central registry that tracks all ephemeral agent lifecycles."""
 
     def __init__(self, max_completed: int = 200):
         self._active: Dict[str, dict] = {}       # agent_id → metadata
-        self._completed: List[dict] = []          # finished agents (FIFO)
-        self._max_completed = max_completed
+        self._completed = HistoryStore(max_completed, key="agent_id")  # finished agents (ring buffer)
+        self._backlog: Dict[str, deque] = {}      # agent_id → recent diffs (active agents only)
+        self._listeners: List[Callable[[dict], None]] = []
         self._lock = threading.Lock()
         self._total_created = 0
         self._total_destroyed = 0
 
-    def register(self, agent) -> dict:
-        """Register a newly created agent. Returns the registry entry."""
+    # ── Change feed ─────────────────────────────────────────────────
+    def add_listener(self, fn: Callable[[dict], None]) -> None:
+        """
+        Receive every diff as it happens. Called with the registry lock held,
+        so diffs for one agent arrive in rev order — listeners must not block.
+        """
+        self._listeners.append(fn)
+
+    def _publish(self, entry: dict, op: str, **fields) -> None:
+        """Bump the entry's rev and push a diff. Caller holds the lock."""
+        entry["rev"] += 1
+        diff = {"agent_id": entry["agent_id"], "rev": entry["rev"], "op": op, **fields}
+        backlog = self._backlog.get(entry["agent_id"])
+        if backlog is not None:
+            backlog.append(diff)
+        for fn in self._listeners:
+            try:
+                fn(diff)
+            except Exception as e:
+                logger.error("Registry listener failed: %s", e)
+
+    @staticmethod
+    def _snapshot(agent: dict) -> dict:
+        return {"agent_id": agent["agent_id"], "rev": agent.get("rev", 0), "op": "snapshot", "agent": agent}
+
+    async def diffs_since(self, agent_id: str, rev: Optional[int] = None) -> Optional[List[dict]]:
+        """
+        What a watcher needs to catch up: the diffs after `rev` if the backlog
+        still reaches back that far, otherwise a one-item snapshot. None if the
+        agent is unknown.
+        """
+        with self._lock:
+            entry = self._active.get(agent_id)
+            if entry:
+                backlog = self._backlog.get(agent_id)
+                if rev is not None and rev >= entry["rev"]:
+                    return []
+                if rev is not None and backlog and backlog[0]["rev"] <= rev + 1:
+                    return [d for d in backlog if d["rev"] > rev]
+                return [self._snapshot(_public(entry))]
+        entry = self._completed.get(agent_id)
+        if entry:
+            return [] if rev is not None and rev >= entry["rev"] else [self._snapshot(_public(entry))]
+        stored = await _stored_agent_run(agent_id)
+        return [self._snapshot(stored)] if stored else None
+
+    def register(self, agent, **extra) -> dict:
+        """Register a newly created agent (or pooled task). Returns the registry entry."""
         with self._lock:
             self._total_created += 1
             entry = {
@@ -49,33 +196,40 @@ class AgentRegistry:
                 "duration_seconds": None,
                 "result_status": None,
                 "result_size_bytes": None,
-                "events": [],                            # audit trail
+                "events": EventLog(),                    # compact, capped audit trail
                 "seq": self._total_created,
+                "rev": 0,                                # bumped on every diff
+                **extra,
             }
             self._active[agent.agent_id] = entry
+            self._backlog[agent.agent_id] = deque(maxlen=AGENT_DIFF_BACKLOG)
+            self._publish(entry, "status", changes={"status": "active"})
             logger.info(
                 "AGENT CREATED: %s [%s] obj@%s pid=%s",
                 agent.agent_id, agent.AGENT_TYPE, hex(id(agent)), os.getpid()
             )
             return entry
 
-    def record_event(self, agent_id: str, event: dict):
-        """Add a pipeline event to an agent's audit trail."""
+    def record_event(self, agent_id: str, event):
+        """Add a pipeline event (base_agent.PipelineEvent) to an agent's audit trail."""
         with self._lock:
             entry = self._active.get(agent_id)
             if entry:
-                entry["events"].append(event)
+                log: EventLog = entry["events"]
+                record = log.append(event.ts_ns, event.step, event.status, event.detail)
+                self._publish(entry, "event", event=log.to_dict(record, agent_id, entry["agent_type"]),
+                              events_dropped=log.dropped)
 
-    def update_action(self, agent_id: str, action: str, params: dict):
-        """Record what action/params the agent is executing."""
+    def update_action(self, agent_id: str, action: str, params: dict, **fields):
+        """Record what action/params the agent is executing (plus e.g. its trace and span IDs)."""
         with self._lock:
             entry = self._active.get(agent_id)
             if entry:
-                entry["action"] = action
-                entry["params"] = params
-                entry["status"] = "executing"
+                changes = {"status": "executing", "action": action, "params": params, **fields}
+                entry.update(changes)
+                self._publish(entry, "status", changes=changes)
 
-    def deregister(self, agent, result: dict) -> Optional[dict]:
+    def deregister(self, agent, result: dict, final_status: str = "destroyed") -> Optional[dict]:
         """Deregister an agent after it completes. Moves to completed list."""
         with self._lock:
             entry = self._active.pop(agent.agent_id, None)
@@ -84,39 +238,71 @@ class AgentRegistry:
             self._total_destroyed += 1
             completed_at = datetime.utcnow()
             entry["completed_at"] = completed_at.isoformat()
-            entry["status"] = "destroyed"
+            entry["status"] = final_status
             entry["duration_seconds"] = (
                 completed_at - agent.created_at
             ).total_seconds()
             entry["result_status"] = result.get("status", "unknown")
-            entry["result_size_bytes"] = len(str(result))
+            entry["result_size_bytes"] = getattr(agent, "result_size_bytes", None) or len(str(result))
+            self._publish(entry, "status", changes={
+                k: entry[k] for k in ("status", "completed_at", "duration_seconds",
+                                      "result_status", "result_size_bytes")
+            })
+            self._backlog.pop(agent.agent_id, None)
             self._completed.append(entry)
-            if len(self._completed) > self._max_completed:
-                self._completed.pop(0)
             logger.info(
-                "AGENT DESTROYED: %s [%s] duration=%.1fs status=%s",
-                agent.agent_id, agent.AGENT_TYPE,
+                "AGENT %s: %s [%s] duration=%.1fs status=%s",
+                final_status.upper(), agent.agent_id, agent.AGENT_TYPE,
                 entry["duration_seconds"], entry["result_status"]
             )
-            return entry
+        public = _public(entry)
+        history_db.record_agent_run(public)
+        return public
 
     # ── Query methods ───────────────────────────────────────────────
     def get_active(self) -> List[dict]:
         with self._lock:
-            return list(self._active.values())
+            return [_public(e) for e in self._active.values()]
+
+    def is_active(self, agent_id: str) -> bool:
+        with self._lock:
+            return agent_id in self._active
 
     def get_completed(self, limit: int = 50) -> List[dict]:
+        return [_public(e) for e in self._completed.recent(limit)]
+
+    async def get_agent(self, agent_id: str) -> Optional[dict]:
         with self._lock:
-            return list(reversed(self._completed[-limit:]))
+            entry = self._active.get(agent_id)
+            if entry:
+                return _public(entry)
+        entry = self._completed.get(agent_id)
+        if entry:
+            return _public(entry)
+        # Older agents (or ones finished by another worker) come from the history DB
+        return await _stored_agent_run(agent_id)
 
-    def get_agent(self, agent_id: str) -> Optional[dict]:
+    def get_memory(self) -> dict:
+        """Approximate audit-trail memory per tracked agent (active + completed window)."""
         with self._lock:
-            if agent_id in self._active:
-                return self._active[agent_id]
-            for entry in reversed(self._completed):
-                if entry["agent_id"] == agent_id:
-                    return entry
-            return None
+            active = list(self._active.values())
+        active_ids = {e["agent_id"] for e in active}
+        per_agent = [
+            {
+                "agent_id": e["agent_id"],
+                "state": "active" if e["agent_id"] in active_ids else "completed",
+                "events": len(e["events"]),
+                "events_dropped": e["events"].dropped,
+                "event_bytes": e["events"].approx_bytes(),
+            }
+            for e in active + self._completed.recent(self._completed.maxlen)
+        ]
+        return {
+            "max_events_per_agent": AGENT_MAX_EVENTS,
+            "tracked_agents": len(per_agent),
+            "total_event_bytes": sum(a["event_bytes"] for a in per_agent),
+            "per_agent": per_agent,
+        }
 
     def get_stats(self) -> dict:
         with self._lock:
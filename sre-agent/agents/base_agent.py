@@ -3,27 +3,43 @@ Base Agent — Abstract class for all ephemeral SRE agents.
 Each agent gets created, executes its task, emits pipeline events, and dies.
 """
 
+import os
+import sys
+import time
 import uuid
 import logging
 from datetime import datetime
 from abc import ABC, abstractmethod
 from typing import Callable, Optional
-from agent_registry import registry
+from agent_registry import registry, monotonic_to_iso
+from trace_context import span
 
 logger = logging.getLogger(__name__)
 
+# Results bigger than this are replaced by a summary once the response is delivered
+AGENT_RESULT_MAX_BYTES = int(os.environ.get("AGENT_RESULT_MAX_BYTES", 64 * 1024))
+
 
 class PipelineEvent:
     """Represents a step in the agent's execution pipeline."""
 
+    __slots__ = ("step", "status", "detail", "agent_id", "agent_type", "ts_ns")
+
     def __init__(self, step: str, status: str = "running", detail: str = "", agent_id: str = "", agent_type: str = ""):
-        self.id = str(uuid.uuid4())[:8]
-        self.step = step
+        self.step = sys.intern(step)  # a handful of distinct step names, emitted thousands of times
         self.status = status          # pending | running | completed | error
         self.detail = detail
         self.agent_id = agent_id
         self.agent_type = agent_type
-        self.timestamp = datetime.utcnow().isoformat()
+        self.ts_ns = time.monotonic_ns()
+
+    @property
+    def id(self) -> str:
+        return f"{self.ts_ns & 0xffffffff:08x}"
+
+    @property
+    def timestamp(self) -> str:
+        return monotonic_to_iso(self.ts_ns)
 
     def to_dict(self):
         return {
@@ -44,27 +60,51 @@ class BaseAgent(ABC):
     AGENT_ICON = "🤖"
     AGENT_DESCRIPTION = "Base Agent"
 
-    def __init__(self, mcp_client, event_callback: Optional[Callable] = None):
+    def __init__(self, mcp_client, event_callback: Optional[Callable] = None, register: bool = True):
         self.agent_id = f"agent-{uuid.uuid4().hex[:8]}"
         self.mcp = mcp_client
         self._emit = event_callback or (lambda e: None)
         self.created_at = datetime.utcnow()
         self.completed_at = None
         self.result = None
-        registry.register(self)
+        self.result_size_bytes = None
+        if register:
+            registry.register(self)
+
+    def start_task(self, event_callback: Optional[Callable] = None, **registry_fields) -> str:
+        """
+        Pooled mode: give a long-lived worker a fresh identity for its next task.
+
+        Each task is registered as its own record, so the audit view looks the
+        same as with ephemeral agents. Returns the task's ID.
+        """
+        self.agent_id = f"task-{uuid.uuid4().hex[:8]}"
+        self._emit = event_callback or (lambda e: None)
+        self.created_at = datetime.utcnow()
+        self.completed_at = None
+        self.result = None
+        self.result_size_bytes = None
+        registry.register(self, **registry_fields)
+        return self.agent_id
 
     def emit(self, step: str, status: str = "running", detail: str = ""):
         event = PipelineEvent(
             step=step, status=status, detail=detail,
             agent_id=self.agent_id, agent_type=self.AGENT_TYPE
         )
-        registry.record_event(self.agent_id, event.to_dict())
+        registry.record_event(self.agent_id, event)
         self._emit(event.to_dict())
         return event
 
     async def run(self, action: str, params: dict) -> dict:
         """Execute the agent lifecycle: create → execute → (orchestrator handles destruction)."""
-        registry.update_action(self.agent_id, action, params)
+        # The run is a child span of the investigation; MCP calls made in execute() carry it
+        with span() as ctx:
+            registry.update_action(self.agent_id, action, params,
+                                   trace_id=ctx.trace_id, span_id=ctx.span_id, parent_span_id=ctx.parent_id)
+            return await self._run(action, params)
+
+    async def _run(self, action: str, params: dict) -> dict:
         self.emit("🔍 Analyzing request", "completed", f"Action: {action}")
         self.emit(f"{self.AGENT_ICON} Creating {self.AGENT_DESCRIPTION}", "running", f"ID: {self.agent_id}")
 
@@ -75,8 +115,9 @@ class BaseAgent(ABC):
             # Execute the actual work
             result = await self.execute(action, params)
             self.result = result
+            self.result_size_bytes = len(str(result))
 
-            self.emit("📦 Processing results", "completed", f"Got {len(str(result))} bytes")
+            self.emit("📦 Processing results", "completed", f"Got {self.result_size_bytes} bytes")
             self.completed_at = datetime.utcnow()
             duration = (self.completed_at - self.created_at).total_seconds()
             self.emit(f"✅ {self.AGENT_DESCRIPTION} completed", "completed", f"Duration: {duration:.1f}s")
@@ -100,6 +141,23 @@ class BaseAgent(ABC):
                 "error": str(e)
             }
 
+    def compact_result(self, max_bytes: int = AGENT_RESULT_MAX_BYTES) -> None:
+        """
+        Drop a large result once the orchestrator is done with it.
+
+        Agents stay alive for the inspection cooldown; holding full dashboards
+        or log dumps for that long is what makes memory grow with traffic.
+        """
+        if self.result is None or (self.result_size_bytes or 0) <= max_bytes:
+            return
+        preview = str(self.result)[:1024]
+        self.result = {
+            "status": self.result.get("status", "unknown") if isinstance(self.result, dict) else "unknown",
+            "truncated": True,
+            "size_bytes": self.result_size_bytes,
+            "preview": preview,
+        }
+
     @abstractmethod
     async def execute(self, action: str, params: dict) -> dict:
         """Override in subclasses to do actual work."""
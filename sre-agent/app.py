@@ -9,19 +9,30 @@ import os
 import json
 import asyncio
 import logging
+import threading
+import time
 import uuid
 from datetime import datetime
 from typing import Dict, List
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from mcp_client import MCPClient
 from llm_brain import LLMBrain
-from agent_registry import registry
-from watsonx_evaluator import WatsonxEvaluator
+from context_builder import compact_json
+from intent_router import router
+from history_store import HistoryStore
+from agent_registry import FINAL_STATUSES, registry
+from watsonx_evaluator import WatsonxEvaluator, get_evaluation_history, get_evaluation_stats
+from persistence import history_db
+from eval_queue import EvaluationQueue
+from broadcast_hub import hub
+from agent_pool import AGENT_EXECUTION_MODE, AgentPool
+from admission_control import CRITICAL_ACTIONS, AdmissionRejected, admission, classify
+from trace_context import ContextThreadPoolExecutor, begin, parse_traceparent
 from agents.log_agent import LogAgent
 from agents.health_agent import HealthAgent
 from agents.monitoring_agent import MonitoringAgent
@@ -40,12 +51,26 @@ app = FastAPI(title="SRE Agent Orchestrator", version="1.0.0")
 app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
+@app.on_event("startup")
+async def install_context_executor():
+    # Agents make MCP calls via run_in_executor(None, ...); carry the caller's trace span into those threads
+    asyncio.get_running_loop().set_default_executor(ContextThreadPoolExecutor())
+
+
+@app.on_event("shutdown")
+async def flush_history_db():
+    # The history writer is a daemon thread; without this, runs still queued are lost on every restart
+    await asyncio.get_running_loop().run_in_executor(None, history_db.flush)
+
+
 # ── Shared instances ────────────────────────────────────────────────
 mcp = MCPClient()
 brain = LLMBrain()
 evaluator = WatsonxEvaluator()
+eval_queue = EvaluationQueue(evaluator)
 AGENT_COOLDOWN_SECONDS = int(os.environ.get("AGENT_COOLDOWN_SECONDS", 120))
 MAX_AUTONOMOUS_STEPS = int(os.environ.get("MAX_AUTONOMOUS_STEPS", 5))
+MAX_PARALLEL_ACTIONS = int(os.environ.get("MAX_PARALLEL_ACTIONS", 4))
 
 # Agent registry
 AGENT_CLASSES = {
@@ -58,18 +83,45 @@ AGENT_CLASSES = {
     "deployment_agent": DeploymentAgent,
 }
 
-# ── Connected WebSocket clients ─────────────────────────────────────
-connected_clients: Dict[str, WebSocket] = {}
+# Pooled execution mode (AGENT_EXECUTION_MODE=pooled) reuses long-lived workers per agent type
+agent_pool = AgentPool(AGENT_CLASSES, mcp)
 
 # ── Agent run history ───────────────────────────────────────────────
-agent_history: List[dict] = []
 MAX_HISTORY = 100
+agent_history = HistoryStore(
+    MAX_HISTORY, key="session_id",
+    metrics=lambda r: {"ttft_ms": r.get("ttft_ms"), "total_ms": r.get("total_ms"),
+                       "router_hit": 1 if r.get("routed_by") == "router" else 0},
+)
+
+# ── Agent change feed ───────────────────────────────────────────────
+# Registry diffs go to WebSocket watchers through the hub and to SSE watchers through their own queues
+AGENT_STREAM_QUEUE = int(os.environ.get("AGENT_STREAM_QUEUE", 100))
+AGENT_STREAM_KEEPALIVE_SECONDS = 15
+_agent_streams: Dict[str, set] = {}   # agent_id → {(loop, asyncio.Queue)}
+
+
+def _offer(queue: asyncio.Queue, diff: dict):
+    # A full queue drops the diff; the stream notices the rev gap and catches up from the registry
+    try:
+        queue.put_nowait(diff)
+    except asyncio.QueueFull:
+        pass
+
+
+def on_agent_diff(diff: dict):
+    hub.publish("agent_diff", [f"inspect:{diff['agent_id']}"], diff)
+    for loop, queue in tuple(_agent_streams.get(diff["agent_id"], ())):
+        loop.call_soon_threadsafe(_offer, queue, diff)
+
+
+registry.add_listener(on_agent_diff)
 
 # ── Agent cooldown pool (keeps Python refs alive for demo) ──────
 _cooldown_agents: Dict[str, object] = {}
 
 
-async def delayed_agent_destruction(agent, agent_name: str):
+async def delayed_agent_destruction(agent, agent_name: str, session_id: str):
     """Keep agent alive in registry for cooldown period, then destroy it."""
     agent_id = agent.agent_id
     try:
@@ -80,10 +132,11 @@ async def delayed_agent_destruction(agent, agent_name: str):
     result = agent.result or {"status": "unknown"}
     registry.deregister(agent, result)
     _cooldown_agents.pop(agent_id, None)
-    await broadcast_pipeline_event({
+    broadcast_pipeline_event({
         "step": f"🗑️ Destroying {agent.AGENT_DESCRIPTION}",
         "status": "completed",
         "detail": f"Agent {agent_id} terminated after {AGENT_COOLDOWN_SECONDS}s cooldown",
+        "session_id": session_id,
         "agent_id": agent_id,
         "agent_type": agent_name,
         "timestamp": datetime.utcnow().isoformat()
@@ -92,33 +145,101 @@ async def delayed_agent_destruction(agent, agent_name: str):
 
 
 # ── WebSocket manager ──────────────────────────────────────────────
-async def broadcast_pipeline_event(event: dict):
-    """Send pipeline event to all connected WebSocket clients."""
-    message = json.dumps({"type": "pipeline_event", "data": event})
-    dead = []
-    for cid, ws in connected_clients.items():
-        try:
-            await ws.send_text(message)
-        except Exception:
-            dead.append(cid)
-    for cid in dead:
-        connected_clients.pop(cid, None)
+def broadcast_pipeline_event(event: dict):
+    """Publish a pipeline event to clients subscribed to its session or agent (batched by the hub)."""
+    hub.publish_event(event)
+
+
+def send_chat_response(client_id: str, message: str, agent_type: str = "", session_id: str = "",
+                       ttft_ms: float = None):
+    """Queue a chat response for a specific client."""
+    if not hub.send(client_id, {
+        "type": "chat_response",
+        "data": {
+            "message": message,
+            "agent_type": agent_type,
+            "session_id": session_id,
+            "ttft_ms": ttft_ms,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    }):
+        logger.warning("Chat response for %s dropped — client %s is gone", session_id, client_id)
+
+
+def make_evaluation_delivery(client_id: str, agent_id: str, agent_name: str):
+    """Callback the evaluation queue awaits once this session's scorecard is ready."""
+    async def deliver(eval_result: dict):
+        # Send evaluation result directly to this client
+        hub.send(client_id, {"type": "evaluation_result", "data": eval_result})
+
+        broadcast_pipeline_event({
+            "step": "📊 Evaluation complete",
+            "status": "completed",
+            "detail": f"Overall: {round(eval_result.get('overall_score', 0) * 100)}% | Engine: {eval_result.get('evaluation_engine', '?')}"
+                      f" | batch {eval_result.get('batch_size', 1)} | queued {eval_result.get('queue_wait_ms', 0):.0f}ms",
+            "session_id": eval_result.get("session_id"),
+            "agent_id": agent_id,
+            "agent_type": agent_name,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    return deliver
 
 
-async def send_chat_response(ws: WebSocket, message: str, agent_type: str = "", session_id: str = ""):
-    """Send a chat response to a specific client."""
+async def stream_chat_response(client_id: str, agent_name: str, action: str, data: dict,
+                               session_id: str, session_start: float):
+    """
+    Stream the formatted response to one client as chat_delta frames.
+
+    Claude's streaming iterator blocks, so it runs in the executor and hands deltas
+    to the event loop through a queue. Deltas that pile up while a frame is being
+    queued go out together in the next one. Deltas are droppable under
+    backpressure — the final chat_response carries the full text anyway.
+    Returns (full_text, ttft_ms, stream_ms); ttft_ms is measured from when the
+    user's message arrived, which is what the operator actually waits for.
+    """
+    loop = asyncio.get_event_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for delta in brain.stream_response(agent_name, action, data):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, delta)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    stream_start = time.perf_counter()
+    producer = loop.run_in_executor(None, produce)
+    parts: List[str] = []
+    ttft_ms = None
+    finished = False
     try:
-        await ws.send_text(json.dumps({
-            "type": "chat_response",
-            "data": {
-                "message": message,
-                "agent_type": agent_type,
-                "session_id": session_id,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        }))
-    except Exception as e:
-        logger.error("Failed to send chat response: %s", e)
+        while not finished:
+            chunk = [await queue.get()]
+            while not queue.empty():
+                chunk.append(queue.get_nowait())
+            if chunk[-1] is done:
+                chunk.pop()
+                finished = True
+            delta = "".join(chunk)
+            if not delta:
+                continue
+            if ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - session_start) * 1000, 1)
+            parts.append(delta)
+            hub.send(client_id, {
+                "type": "chat_delta",
+                "data": {"session_id": session_id, "agent_type": agent_name, "delta": delta}
+            }, droppable=True)
+    finally:
+        # A cancelled session stops pulling tokens from Claude
+        stop.set()
+    await producer
+    return "".join(parts).strip(), ttft_ms, round((time.perf_counter() - stream_start) * 1000, 1)
 
 
 # ── Routes ──────────────────────────────────────────────────────────
@@ -138,9 +259,43 @@ async def health():
     }
 
 
+async def _query_history_db(fn, **kwargs) -> dict:
+    """Run a (blocking) SQLite history query off the event loop."""
+    return await asyncio.get_event_loop().run_in_executor(None, lambda: fn(**kwargs))
+
+
 @app.get("/api/history")
-async def get_history():
-    return {"history": agent_history[-50:]}
+async def get_history(limit: int = 50, offset: int = 0, agent: str = None, status: str = None,
+                      session_id: str = None, since: str = None, until: str = None):
+    """Session history, oldest first within the page. Served from SQLite when enabled."""
+    if history_db.enabled:
+        page = await _query_history_db(
+            history_db.query_sessions, limit=limit, offset=offset, agent=agent,
+            status=status, session_id=session_id, since=since, until=until,
+        )
+        history, total, source = page["items"][::-1], page["total"], "sqlite"
+    else:
+        history = [
+            r for r in agent_history.recent(agent_history.maxlen)
+            if (agent is None or r.get("agent") == agent)
+            and (status is None or r.get("status") == status)
+            and (session_id is None or r.get("session_id") == session_id)
+        ]
+        total, source = len(history), "memory"
+        history = history[offset:offset + limit][::-1]
+    return {
+        "history": history,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "source": source,
+        "stats": {
+            "sessions": len(agent_history),
+            "avg_ttft_ms": agent_history.aggregate("ttft_ms", 1),
+            "avg_total_ms": agent_history.aggregate("total_ms", 1),
+            "router_hit_rate": agent_history.aggregate("router_hit"),
+        },
+    }
 
 
 @app.get("/api/agents")
@@ -166,27 +321,185 @@ async def get_active_agents():
 
 
 @app.get("/api/agents/completed")
-async def get_completed_agents(limit: int = 50):
-    """Full audit trail of completed (destroyed) agents with proof."""
-    completed = registry.get_completed(limit)
-    return {"completed_agents": completed, "count": len(completed)}
+async def get_completed_agents(limit: int = 50, offset: int = 0, agent_type: str = None,
+                               status: str = None, since: str = None, until: str = None):
+    """Full audit trail of completed (destroyed) agents with proof, newest first."""
+    if history_db.enabled:
+        page = await _query_history_db(
+            history_db.query_agent_runs, limit=limit, offset=offset, agent_type=agent_type,
+            status=status, since=since, until=until,
+        )
+        completed, total = page["items"], page["total"]
+    else:
+        completed = [
+            e for e in registry.get_completed(limit + offset)
+            if (agent_type is None or e.get("agent_type") == agent_type)
+            and (status is None or e.get("result_status") == status)
+        ]
+        total = len(completed)
+        completed = completed[offset:offset + limit]
+    return {"completed_agents": completed, "count": len(completed), "total": total, "offset": offset}
 
 
 @app.get("/api/agents/stats")
 async def get_agent_stats():
-    """High-level stats: total created, destroyed, active count."""
-    return registry.get_stats()
+    """High-level stats: total created, destroyed, active count, and memory held per agent."""
+    memory = registry.get_memory()
+    memory["cooldown_agents"] = [
+        {
+            "agent_id": agent_id,
+            "result_size_bytes": agent.result_size_bytes,
+            "result_truncated": isinstance(agent.result, dict) and agent.result.get("truncated", False),
+        }
+        for agent_id, agent in list(_cooldown_agents.items())
+    ]
+    return {**registry.get_stats(), "memory": memory}
+
+
+@app.get("/api/agents/pool")
+async def get_agent_pool_stats():
+    """Execution mode and, when pooled, per-type workers, queue depth and timings."""
+    return agent_pool.get_stats()
+
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    """Per priority class: in flight, queue depth, wait times and shed counts."""
+    return admission.get_stats()
+
+
+@app.get("/api/llm/stats")
+async def get_llm_stats():
+    """Token usage, prompt-cache hits and latency per LLM call type."""
+    return brain.get_stats()
+
+
+@app.get("/api/router/stats")
+async def get_router_stats():
+    """Fast-path intent router hit rate and estimated LLM time saved."""
+    return router.get_stats()
+
+
+@app.get("/api/evaluations")
+async def get_evaluations(limit: int = 50, offset: int = 0, agent_type: str = None,
+                          session_id: str = None, since: str = None, until: str = None):
+    """Evaluation records, newest first."""
+    if history_db.enabled:
+        page = await _query_history_db(
+            history_db.query_evaluations, limit=limit, offset=offset, agent_type=agent_type,
+            session_id=session_id, since=since, until=until,
+        )
+        return {"evaluations": page["items"], "total": page["total"], "offset": offset}
+    evaluations = get_evaluation_history(limit + offset)[offset:]
+    return {"evaluations": evaluations, "total": len(evaluations), "offset": offset}
+
+
+@app.get("/api/evaluations/stats")
+async def get_evaluations_stats(agent_type: str = None, since: str = None, until: str = None):
+    """Governance score averages — over any time range when the history DB is enabled."""
+    if history_db.enabled:
+        return await _query_history_db(history_db.evaluation_stats, agent_type=agent_type, since=since, until=until)
+    return get_evaluation_stats()
+
+
+@app.get("/api/history/db")
+async def get_history_db_stats():
+    """History DB writer health: queue depth, rows written, dropped rows."""
+    return history_db.get_stats()
+
+
+@app.get("/api/evaluations/queue")
+async def get_evaluation_queue_stats():
+    """Evaluation queue depth, sampling, shedding and batch timings."""
+    return eval_queue.get_stats()
+
+
+@app.get("/api/ws/stats")
+async def get_ws_stats():
+    """Broadcast hub: connected clients, per-client queue depth, dropped frames, batching."""
+    return hub.get_stats()
 
 
 @app.get("/api/agents/{agent_id}")
 async def get_agent_detail(agent_id: str):
     """Inspect a specific agent by ID — full lifecycle with all events."""
-    entry = registry.get_agent(agent_id)
+    entry = await registry.get_agent(agent_id)
     if not entry:
         return JSONResponse({"error": f"Agent {agent_id} not found"}, status_code=404)
     return entry
 
 
+@app.get("/api/agents/{agent_id}/stream")
+async def stream_agent(request: Request, agent_id: str, since: int = None):
+    """
+    Server-sent events for one agent: a snapshot (or the diffs missed since
+    Last-Event-ID / ?since=), then every status change and new event as it
+    happens. The event id is the agent's rev. The stream ends once the agent
+    is destroyed.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    rev = int(last_event_id) if last_event_id.isdigit() else since
+
+    loop = asyncio.get_event_loop()
+    watcher = (loop, asyncio.Queue(maxsize=AGENT_STREAM_QUEUE))
+    _agent_streams.setdefault(agent_id, set()).add(watcher)
+
+    def unwatch():
+        watchers = _agent_streams.get(agent_id)
+        if watchers is not None:
+            watchers.discard(watcher)
+            if not watchers:
+                _agent_streams.pop(agent_id, None)
+
+    # Subscribed before catching up, so nothing published in between is missed
+    initial = await registry.diffs_since(agent_id, rev)
+    if initial is None:
+        unwatch()
+        return JSONResponse({"error": f"Agent {agent_id} not found"}, status_code=404)
+    if not initial and not registry.is_active(agent_id):
+        # Reconnect after the final diff — 204 tells EventSource to stop retrying
+        unwatch()
+        return Response(status_code=204)
+
+    def frame(diff: dict) -> str:
+        return f"id: {diff['rev']}\nevent: agent_diff\ndata: {json.dumps(diff)}\n\n"
+
+    def is_final(diff: dict) -> bool:
+        state = diff.get("agent") or diff.get("changes") or {}
+        return state.get("status") in FINAL_STATUSES
+
+    async def events():
+        last = rev or 0
+        try:
+            pending = list(initial)
+            while True:
+                for diff in pending:
+                    if diff["rev"] <= last and diff["op"] != "snapshot":
+                        continue
+                    yield frame(diff)
+                    last = diff["rev"]
+                    if is_final(diff):
+                        return
+                try:
+                    diff = await asyncio.wait_for(watcher[1].get(), AGENT_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    pending = []
+                    continue
+                if diff["rev"] > last + 1:
+                    # Diffs were dropped — refill from the registry's backlog (or a snapshot)
+                    pending = await registry.diffs_since(agent_id, last) or []
+                else:
+                    pending = [diff]
+        finally:
+            unwatch()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ── Agent Inspector Page ────────────────────────────────────────
 @app.get("/inspect/{agent_id}", response_class=HTMLResponse)
 async def inspect_agent(request: Request, agent_id: str):
@@ -198,161 +511,193 @@ async def inspect_agent(request: Request, agent_id: str):
     )
 
 
-# ── WebSocket endpoint ─────────────────────────────────────────────
-@app.websocket("/ws")
-async def websocket_endpoint(ws: WebSocket):
-    await ws.accept()
-    client_id = str(uuid.uuid4())[:8]
-    connected_clients[client_id] = ws
-    logger.info("Client %s connected. Total: %d", client_id, len(connected_clients))
-
-    try:
-        # Send welcome
-        await ws.send_text(json.dumps({
-            "type": "system",
-            "data": {
-                "message": "🤖 SRE Agent Orchestrator connected. Ask me anything about your application!",
-                "client_id": client_id,
-                "agents": list(AGENT_CLASSES.keys())
-            }
-        }))
-
-        while True:
-            raw = await ws.receive_text()
-            data = json.loads(raw)
-            user_message = data.get("message", "").strip()
-
-            if not user_message:
-                continue
+# ── WebSocket sessions ─────────────────────────────────────────────
+# Investigations from one connection run as concurrent tasks; beyond the limit they wait for a slot
+WS_MAX_CONCURRENT_SESSIONS = int(os.environ.get("WS_MAX_CONCURRENT_SESSIONS", 3))
+WS_MAX_PENDING_SESSIONS = int(os.environ.get("WS_MAX_PENDING_SESSIONS", 10))
+# How long a finished session's topics stay subscribed, for late frames such as its evaluation
+SESSION_TOPIC_LINGER_SECONDS = int(os.environ.get("SESSION_TOPIC_LINGER_SECONDS", 30))
 
-            session_id = str(uuid.uuid4())[:8]
-            logger.info("[%s] User: %s", session_id, user_message)
 
+async def run_session(client_id: str, session_id: str, user_message: str, session_start: float,
+                      slots: asyncio.Semaphore):
+    """One investigation — classify, run agent, stream, evaluate. Every frame is tagged with session_id."""
+    agent = None
+    # Root span of the investigation; agent runs, MCP tools and booking endpoints join it via traceparent
+    trace = begin()
+    try:
+        async with slots:
             # ── Pipeline: Step 1 — Classify intent ──────────────
-            await broadcast_pipeline_event({
+            broadcast_pipeline_event({
+                "session_id": session_id,
                 "step": "🧠 Analyzing user query",
                 "status": "running",
                 "detail": user_message[:80],
+                "trace_id": trace.trace_id,
                 "agent_id": session_id,
                 "agent_type": "orchestrator",
                 "timestamp": datetime.utcnow().isoformat()
             })
 
-            intent = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: brain.classify_intent(user_message)
-            )
+            intent = router.route(user_message)
+            if intent is None:
+                classify_start = time.perf_counter()
+                intent = await asyncio.get_event_loop().run_in_executor(
+                    None, lambda: brain.classify_intent(user_message)
+                )
+                router.record_llm_latency((time.perf_counter() - classify_start) * 1000)
 
             agent_name = intent.get("agent", "health_agent")
             action = intent.get("action", "check_all")
             params = intent.get("params", {})
             reasoning = intent.get("reasoning", "")
 
-            await broadcast_pipeline_event({
+            broadcast_pipeline_event({
+                "session_id": session_id,
                 "step": "🧠 Intent classified",
                 "status": "completed",
                 "detail": f"Agent: {agent_name} | Action: {action} | {reasoning}",
+                "routed_by": intent.get("routed_by", "llm"),
                 "agent_id": session_id,
                 "agent_type": "orchestrator",
                 "timestamp": datetime.utcnow().isoformat()
             })
 
-            # ── Pipeline: Step 2 — Spawn ephemeral agent ────────
+            # ── Pipeline: Step 2 — Resolve agent ────────────────
             agent_cls = AGENT_CLASSES.get(agent_name)
             if not agent_cls:
-                await send_chat_response(ws, f"❌ Unknown agent: {agent_name}", "", session_id)
-                continue
+                send_chat_response(client_id, f"❌ Unknown agent: {agent_name}", "", session_id)
+                return
 
-            # Create event callback that broadcasts pipeline events
-            def make_callback():
-                loop = asyncio.get_event_loop()
+            # Agent events are tagged with the session and handed to the hub, which batches them
+            def make_callback(session_id=session_id):
                 def cb(event):
-                    asyncio.run_coroutine_threadsafe(broadcast_pipeline_event(event), loop)
+                    event["session_id"] = session_id
+                    broadcast_pipeline_event(event)
                 return cb
 
-            agent = agent_cls(mcp_client=mcp, event_callback=make_callback())
-
-            # ── Pipeline: Step 3 — Execute ──────────────────────
-            result = await agent.run(action, params)
-
-            # ── Pipeline: Step 3.5 — Keep agent alive for inspection ─
-            _cooldown_agents[agent.agent_id] = agent
-            await broadcast_pipeline_event({
-                "step": "🔗 Agent available for inspection",
-                "status": "completed",
-                "detail": f"Inspect agent {agent.agent_id} before auto-destruction",
-                "inspect_url": f"/inspect/{agent.agent_id}",
-                "agent_id": agent.agent_id,
-                "agent_type": agent_name,
-                "cooldown_remaining": AGENT_COOLDOWN_SECONDS,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            asyncio.create_task(delayed_agent_destruction(agent, agent_name))
+            # ── Pipeline: Step 3 — Admit by priority class, then execute ─
+            priority = classify(agent_name, action)
+            try:
+                async with admission.slot(priority):
+                    if AGENT_EXECUTION_MODE == "pooled":
+                        # Long-lived worker from the pool
+                        result = await agent_pool.run(agent_name, action, params, event_callback=make_callback())
+                    else:
+                        agent = agent_cls(mcp_client=mcp, event_callback=make_callback())
+                        hub.subscribe(client_id, [agent.agent_id])
+                        result = await agent.run(action, params)
+            except AdmissionRejected as e:
+                broadcast_pipeline_event({
+                    "session_id": session_id,
+                    "step": "🚦 Request shed — orchestrator busy",
+                    "status": "error",
+                    "detail": f"Priority: {priority} | {e.reason}",
+                    "agent_id": session_id,
+                    "agent_type": "orchestrator",
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                send_chat_response(client_id, f"🚦 The orchestrator is busy with other {priority} requests "
+                                              f"({e.reason}). Please try again in ~{e.retry_after}s.",
+                                   "", session_id)
+                return
+
+            if AGENT_EXECUTION_MODE == "pooled":
+                agent_id = result.get("agent_id")
+                broadcast_pipeline_event({
+                    "session_id": session_id,
+                    "step": "🔗 Task record available for inspection",
+                    "status": "completed",
+                    "detail": f"Pooled task {agent_id} finished — worker returned to the pool",
+                    "inspect_url": f"/inspect/{agent_id}",
+                    "agent_id": agent_id,
+                    "agent_type": agent_name,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+            else:
+                agent_id = agent.agent_id
+
+                # ── Pipeline: Step 3.5 — Keep agent alive for inspection ─
+                _cooldown_agents[agent_id] = agent
+                broadcast_pipeline_event({
+                    "session_id": session_id,
+                    "step": "🔗 Agent available for inspection",
+                    "status": "completed",
+                    "detail": f"Inspect agent {agent_id} before auto-destruction",
+                    "inspect_url": f"/inspect/{agent_id}",
+                    "agent_id": agent_id,
+                    "agent_type": agent_name,
+                    "cooldown_remaining": AGENT_COOLDOWN_SECONDS,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                asyncio.create_task(delayed_agent_destruction(agent, agent_name, session_id))
 
             # ── Pipeline: Step 4 — Format response with LLM ────
-            await broadcast_pipeline_event({
+            broadcast_pipeline_event({
+                "session_id": session_id,
                 "step": "🧠 Formatting response with AI",
                 "status": "running",
                 "detail": "Claude is summarizing the results",
-                "agent_id": agent.agent_id,
+                "agent_id": agent_id,
                 "agent_type": agent_name,
                 "timestamp": datetime.utcnow().isoformat()
             })
 
-            formatted = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: brain.format_response(agent_name, action, result.get("data", result))
+            # ── Stream response to chat, then send the final copy ─
+            formatted, ttft_ms, stream_ms = await stream_chat_response(
+                client_id, agent_name, action, result.get("data", result), session_id, session_start
             )
+            send_chat_response(client_id, formatted, agent_name, session_id, ttft_ms)
 
-            await broadcast_pipeline_event({
+            broadcast_pipeline_event({
+                "session_id": session_id,
                 "step": "🧠 Response formatted",
                 "status": "completed",
-                "detail": f"{len(formatted)} chars",
-                "agent_id": agent.agent_id,
+                "detail": f"{len(formatted)} chars | first token {ttft_ms:.0f}ms | streamed {stream_ms:.0f}ms"
+                          if ttft_ms is not None else f"{len(formatted)} chars",
+                "agent_id": agent_id,
                 "agent_type": agent_name,
                 "timestamp": datetime.utcnow().isoformat()
             })
 
-            # ── Send response to chat ───────────────────────────
-            await send_chat_response(ws, formatted, agent_name, session_id)
-
             # ── Pipeline: Step 5 — Evaluate with IBM watsonx.governance ─
-            await broadcast_pipeline_event({
+            broadcast_pipeline_event({
+                "session_id": session_id,
                 "step": "📊 Evaluating with IBM watsonx.governance",
                 "status": "running",
-                "detail": "Running Answer Relevance, Faithfulness & Content Safety",
-                "agent_id": agent.agent_id,
+                "detail": "Queued: Answer Relevance, Faithfulness & Content Safety (results arrive asynchronously)",
+                "agent_id": agent_id,
                 "agent_type": agent_name,
                 "timestamp": datetime.utcnow().isoformat()
             })
 
             raw_context = str(result.get("data", ""))[:2000]  # cap context size
-            eval_result = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: evaluator.evaluate_response(
-                    session_id=session_id,
-                    user_query=user_message,
-                    agent_response=formatted,
-                    agent_type=agent_name,
-                    action=action,
-                    raw_context=raw_context,
-                )
+            eval_status = eval_queue.submit(
+                {
+                    "session_id": session_id,
+                    "user_query": user_message,
+                    "agent_response": formatted,
+                    "agent_type": agent_name,
+                    "action": action,
+                    "raw_context": raw_context,
+                },
+                make_evaluation_delivery(client_id, agent_id, agent_name),
             )
-
-            # Send evaluation result directly to this client
-            try:
-                await ws.send_text(json.dumps({
-                    "type": "evaluation_result",
-                    "data": eval_result
-                }))
-            except Exception as e:
-                logger.error("Failed to send eval result: %s", e)
-
-            await broadcast_pipeline_event({
-                "step": "📊 Evaluation complete",
-                "status": "completed",
-                "detail": f"Overall: {round(eval_result.get('overall_score', 0) * 100)}% | Engine: {eval_result.get('evaluation_engine', '?')}",
-                "agent_id": agent.agent_id,
-                "agent_type": agent_name,
-                "timestamp": datetime.utcnow().isoformat()
-            })
+            # Response delivered and evaluation has its own copy — stop holding a large result
+            if agent is not None:
+                agent.compact_result()
+
+            if eval_status != "queued":
+                broadcast_pipeline_event({
+                    "session_id": session_id,
+                    "step": "📊 Evaluation skipped",
+                    "status": "completed",
+                    "detail": "Session not sampled for evaluation" if eval_status == "sampled_out"
+                              else "Evaluation queue full — shedding load",
+                    "agent_id": agent_id,
+                    "agent_type": agent_name,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
 
             # ── Record history ──────────────────────────────────
             run_record = {
@@ -360,17 +705,22 @@ async def websocket_endpoint(ws: WebSocket):
                 "user_query": user_message,
                 "agent": agent_name,
                 "action": action,
-                "agent_id": agent.agent_id,
+                "agent_id": agent_id,
                 "status": result.get("status", "unknown"),
                 "duration": result.get("duration_seconds"),
+                "routed_by": intent.get("routed_by", "llm"),
+                "ttft_ms": ttft_ms,
+                "stream_ms": stream_ms,
+                "evaluation": eval_status,
+                "total_ms": round((time.perf_counter() - session_start) * 1000, 1),
                 "timestamp": datetime.utcnow().isoformat()
             }
             agent_history.append(run_record)
-            if len(agent_history) > MAX_HISTORY:
-                agent_history.pop(0)
+            history_db.record_session(run_record)
 
             # ── Final pipeline event ────────────────────────────
-            await broadcast_pipeline_event({
+            broadcast_pipeline_event({
+                "session_id": session_id,
                 "step": "✨ Request complete",
                 "status": "completed",
                 "detail": f"Session {session_id} | {result.get('duration_seconds', 0):.1f}s",
@@ -379,12 +729,135 @@ async def websocket_endpoint(ws: WebSocket):
                 "timestamp": datetime.utcnow().isoformat()
             })
 
+    except asyncio.CancelledError:
+        # An agent cancelled mid-run never reached the cooldown pool — release it here
+        if agent is not None and agent.agent_id not in _cooldown_agents:
+            registry.deregister(agent, {"status": "cancelled"})
+        broadcast_pipeline_event({
+            "session_id": session_id,
+            "step": "⏹️ Request cancelled",
+            "status": "error",
+            "detail": f"Session {session_id} cancelled by user",
+            "agent_id": session_id,
+            "agent_type": "orchestrator",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        send_chat_response(client_id, "⏹️ Investigation cancelled.", "", session_id)
+        raise
+    except Exception as e:
+        logger.error("[%s] Session failed: %s", session_id, e)
+        broadcast_pipeline_event({
+            "session_id": session_id,
+            "step": "❌ Request failed",
+            "status": "error",
+            "detail": str(e)[:200],
+            "agent_id": session_id,
+            "agent_type": "orchestrator",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        send_chat_response(client_id, f"❌ Request failed: {e}", "", session_id)
+    finally:
+        # Keep the topics until the last frames for them are out: an ephemeral agent's
+        # destruction after its cooldown, or the evaluation
+        topics = [session_id]
+        linger = SESSION_TOPIC_LINGER_SECONDS
+        if agent is not None:
+            topics.append(agent.agent_id)
+            linger = max(linger, AGENT_COOLDOWN_SECONDS)
+        hub.unsubscribe_later(client_id, topics, linger)
+
+
+# ── WebSocket endpoint ─────────────────────────────────────────────
+@app.websocket("/ws")
+async def websocket_endpoint(ws: WebSocket):
+    await ws.accept()
+    client_id = str(uuid.uuid4())[:8]
+    hub.register(client_id, ws)
+    sessions: Dict[str, asyncio.Task] = {}
+    slots = asyncio.Semaphore(WS_MAX_CONCURRENT_SESSIONS)
+    logger.info("Client %s connected. Total: %d", client_id, len(hub))
+
+    try:
+        # Send welcome
+        hub.send(client_id, {
+            "type": "system",
+            "data": {
+                "message": "🤖 SRE Agent Orchestrator connected. Ask me anything about your application!",
+                "client_id": client_id,
+                "agents": list(AGENT_CLASSES.keys())
+            }
+        })
+
+        while True:
+            raw = await ws.receive_text()
+            data = json.loads(raw)
+
+            # Topic control: {"type": "subscribe" | "unsubscribe", "topics": [session or agent IDs, or "*"]}
+            if data.get("type") == "subscribe":
+                hub.subscribe(client_id, data.get("topics", []))
+                continue
+            if data.get("type") == "unsubscribe":
+                hub.unsubscribe(client_id, data.get("topics", []))
+                continue
+            # Inspect: {"type": "watch_agent", "agent_id": ..., "since": rev} → catch-up diffs, then live ones
+            if data.get("type") == "watch_agent":
+                agent_id = data.get("agent_id", "")
+                hub.subscribe(client_id, [f"inspect:{agent_id}"])
+                diffs = await registry.diffs_since(agent_id, data.get("since"))
+                hub.send(client_id, {
+                    "type": "agent_diff_batch",
+                    "data": diffs if diffs is not None else [{"agent_id": agent_id, "rev": 0, "op": "gone"}],
+                })
+                continue
+            if data.get("type") == "unwatch_agent":
+                hub.unsubscribe(client_id, [f"inspect:{data.get('agent_id', '')}"])
+                continue
+            # Cancellation: {"type": "cancel", "session_id": ...}; without a session_id, cancel all
+            if data.get("type") == "cancel":
+                targets = [data["session_id"]] if data.get("session_id") else list(sessions)
+                for sid in targets:
+                    task = sessions.get(sid)
+                    if task:
+                        task.cancel()
+                continue
+
+            user_message = data.get("message", "").strip()
+
+            if not user_message:
+                continue
+
+            if len(sessions) >= WS_MAX_PENDING_SESSIONS:
+                send_chat_response(client_id, f"⏳ {len(sessions)} investigations already in progress — "
+                                              f"wait for one to finish or cancel it.")
+                continue
+
+            session_id = str(uuid.uuid4())[:8]
+            session_start = time.perf_counter()
+            hub.subscribe(client_id, [session_id])
+            logger.info("[%s] User: %s", session_id, user_message)
+
+            # Ack first so the client can match its message to the session (and cancel it)
+            hub.send(client_id, {
+                "type": "session_started",
+                "data": {
+                    "session_id": session_id,
+                    "client_msg_id": data.get("client_msg_id"),
+                    "queued": slots.locked(),
+                    "active_sessions": len(sessions) + 1,
+                }
+            })
+            task = asyncio.create_task(run_session(client_id, session_id, user_message, session_start, slots))
+            sessions[session_id] = task
+            task.add_done_callback(lambda _, sid=session_id: sessions.pop(sid, None))
+
     except WebSocketDisconnect:
         logger.info("Client %s disconnected", client_id)
     except Exception as e:
         logger.error("WebSocket error for %s: %s", client_id, e)
     finally:
-        connected_clients.pop(client_id, None)
+        for task in list(sessions.values()):
+            task.cancel()
+        hub.unregister(client_id)
 
 
 # ── Quick POST endpoint (for non-WebSocket clients) ────────────────
@@ -395,59 +868,156 @@ async def query(request: Request):
     user_message = body.get("message", "")
     if not user_message:
         return JSONResponse({"error": "message is required"}, status_code=400)
+    # Continue the caller's trace if it sent one
+    trace = begin(parse_traceparent(request.headers.get("traceparent"), request.headers.get("tracestate", "")))
 
     observations: list = []
     final_response = ""
     last_agent_name = "health_agent"
     last_action = "check_all"
+    loop = asyncio.get_event_loop()
+    query_start = time.perf_counter()
+    llm_ms = 0.0
 
     for step_num in range(1, MAX_AUTONOMOUS_STEPS + 1):
-        decision = brain.autonomous_think(user_message, list(observations))
+        think_start = time.perf_counter()
+        decision = await loop.run_in_executor(
+            None, lambda: brain.autonomous_think(user_message, list(observations))
+        )
+        think_ms = (time.perf_counter() - think_start) * 1000
+        llm_ms += think_ms
 
         if decision.get("type") == "final_answer":
             final_response = decision.get("summary", "")
             break
 
-        a_name = decision.get("agent", "health_agent")
-        a_action = decision.get("action", "check_all")
-        a_params = decision.get("params", {})
-        last_agent_name = a_name
-        last_action = a_action
-
-        agent_cls = AGENT_CLASSES.get(a_name)
-        if not agent_cls:
-            observations.append({
-                "action_taken": decision,
-                "result": {"error": f"Unknown agent: {a_name}"}
-            })
-            continue
+        step_start = time.perf_counter()
+        if decision.get("type") == "parallel_actions":
+            branches = await run_parallel_batch(decision.get("actions"))
+            result = branches
+            last_agent_name = "multi_agent"
+            last_action = "parallel_actions"
+        else:
+            branch = await run_autonomous_branch(
+                decision.get("agent", "health_agent"),
+                decision.get("action", "check_all"),
+                decision.get("params", {}),
+            )
+            branches = [branch]
+            result = branch["result"]
+            last_agent_name = branch["agent"]
+            last_action = branch["action"]
 
-        agent = agent_cls(mcp_client=mcp)
-        result = await agent.run(a_action, a_params)
-        registry.deregister(agent, result)
         observations.append({
             "action_taken": decision,
-            "result": result.get("data", result)
+            "result": result,
+            "parallel": decision.get("type") == "parallel_actions",
+            "think_ms": round(think_ms, 1),
+            "duration_ms": round((time.perf_counter() - step_start) * 1000, 1),
+            "branches": [{k: b[k] for k in ("agent", "action", "status", "duration_ms")} for b in branches],
         })
 
     if not final_response:
         last_result = observations[-1]["result"] if observations else {}
-        final_response = brain.format_response(last_agent_name, last_action, last_result)
+        format_start = time.perf_counter()
+        final_response = await loop.run_in_executor(
+            None, lambda: brain.format_response(last_agent_name, last_action, last_result)
+        )
+        llm_ms += (time.perf_counter() - format_start) * 1000
 
     return {
         "autonomous": True,
+        "trace_id": trace.trace_id,
         "steps_taken": len(observations),
+        "tool_calls": sum(len(o["branches"]) for o in observations),
         "last_agent": last_agent_name,
         "last_action": last_action,
         "result": final_response,
         "observations": [
-            {"step": i + 1, "agent": o["action_taken"].get("agent"), "thought": o["action_taken"].get("thought", "")[:120]}
+            {
+                "step": i + 1,
+                "agent": o["action_taken"].get("agent"),
+                "thought": o["action_taken"].get("thought", "")[:120],
+                "parallel": o["parallel"],
+                "think_ms": o["think_ms"],
+                "duration_ms": o["duration_ms"],
+                "branches": o["branches"],
+            }
             for i, o in enumerate(observations)
         ],
+        "timing": {
+            "total_ms": round((time.perf_counter() - query_start) * 1000, 1),
+            "llm_ms": round(llm_ms, 1),
+            "tools_ms": round(sum(o["duration_ms"] for o in observations), 1),
+        },
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
+def _valid_action(a) -> bool:
+    return (isinstance(a, dict) and isinstance(a.get("agent", ""), str)
+            and isinstance(a.get("action", ""), str) and isinstance(a.get("params", {}), dict))
+
+
+async def run_parallel_batch(actions) -> list:
+    """
+    Run a parallel_actions step; branches come back in the order they were requested.
+
+    Only read-only calls run concurrently. State-changing (critical) actions run
+    alone, one at a time, after the rest of the batch; the prompt asks for that,
+    but nothing else enforces it. Malformed entries become error branches.
+    """
+    batch = actions[:MAX_PARALLEL_ACTIONS] if isinstance(actions, list) else []
+    branches: list = [None] * len(batch)
+    concurrent, serial = [], []
+    for i, a in enumerate(batch):
+        if not _valid_action(a):
+            branches[i] = {"agent": "invalid", "action": "invalid", "status": "error", "duration_ms": 0.0,
+                           "result": {"error": "Malformed action, expected {agent, action, params}: "
+                                               f"{compact_json(a)[:200]}"}}
+        elif (a.get("agent"), a.get("action")) in CRITICAL_ACTIONS:
+            serial.append(i)
+        else:
+            concurrent.append(i)
+
+    def run(i):
+        a = batch[i]
+        return run_autonomous_branch(a.get("agent", "health_agent"), a.get("action", "check_all"), a.get("params", {}))
+
+    for i, branch in zip(concurrent, await asyncio.gather(*(run(i) for i in concurrent))):
+        branches[i] = branch
+    for i in serial:
+        branches[i] = await run(i)
+    return branches
+
+
+async def run_autonomous_branch(agent_name: str, action: str, params: dict) -> dict:
+    """Run one tool call of an autonomous step with its own agent (or pooled task) and timing."""
+    start = time.perf_counter()
+    agent_cls = AGENT_CLASSES.get(agent_name)
+    if not agent_cls:
+        status, data = "error", {"error": f"Unknown agent: {agent_name}"}
+    else:
+        try:
+            async with admission.slot(classify(agent_name, action, autonomous=True)):
+                if AGENT_EXECUTION_MODE == "pooled":
+                    result = await agent_pool.run(agent_name, action, params)
+                else:
+                    agent = agent_cls(mcp_client=mcp)
+                    result = await agent.run(action, params)
+                    registry.deregister(agent, result)
+            status, data = result.get("status", "unknown"), result.get("data", result)
+        except AdmissionRejected as e:
+            status, data = "busy", {"error": str(e), "retry_after_seconds": e.retry_after}
+    return {
+        "agent": agent_name,
+        "action": action,
+        "status": status,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "result": data,
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
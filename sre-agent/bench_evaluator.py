@@ -0,0 +1,133 @@
+"""
+Benchmark — heuristic evaluator, per-record vs batch.
+
+Replays (query, response, context) triples through the original one-record
+heuristic and through score_heuristics_batch, checks that every score matches,
+and prints timings.
+
+Usage:
+    python bench_evaluator.py                       # synthetic history
+    python bench_evaluator.py --history evals.jsonl # one JSON object per line with
+                                                    # user_query, agent_response, raw_context
+"""
+
+import argparse
+import json
+import random
+import time
+
+from watsonx_evaluator import np, score_heuristics_batch
+
+
+def legacy_metrics(user_query: str, agent_response: str, raw_context: str) -> dict:
+    """The per-record scoring as it was before batching — the parity reference."""
+    metrics = {}
+    query_words = set(user_query.lower().split())
+    response_words = set(agent_response.lower().split())
+    stop_words = {"the", "a", "an", "is", "are", "was", "were", "in", "on", "at",
+                  "to", "for", "of", "and", "or", "but", "not", "with", "this", "that",
+                  "it", "be", "as", "by", "from", "has", "have", "had", "do", "does",
+                  "did", "will", "would", "could", "should", "may", "might", "can",
+                  "me", "my", "i", "you", "your", "we", "our", "they", "their", "what",
+                  "how", "when", "where", "why", "which", "who", "check", "show", "get"}
+    query_keywords = query_words - stop_words
+    if query_keywords:
+        overlap = len(query_keywords & response_words) / len(query_keywords)
+        answer_relevance = min(round(overlap * 1.2, 3), 1.0)
+    else:
+        answer_relevance = 0.5
+    if len(agent_response) > 200:
+        answer_relevance = min(answer_relevance + 0.15, 1.0)
+    if any(indicator in agent_response for indicator in ["✅", "❌", "⚠️", "###", "**"]):
+        answer_relevance = min(answer_relevance + 0.1, 1.0)
+    metrics["answer_relevance"] = round(answer_relevance, 3)
+
+    faithfulness_signals = 0
+    faithful_patterns = ["|", "```", "timestamp", "status", "error", "health",
+                         "ms", "seconds", "%", "count", "total", "avg"]
+    for pattern in faithful_patterns:
+        if pattern.lower() in agent_response.lower():
+            faithfulness_signals += 1
+    faithfulness = min(round(faithfulness_signals / len(faithful_patterns) * 1.5, 3), 1.0)
+    if raw_context:
+        ctx_words = set(raw_context.lower().split())
+        ctx_overlap = len(response_words & ctx_words) / max(len(response_words), 1)
+        faithfulness = min(round((faithfulness + ctx_overlap) / 2 * 1.3, 3), 1.0)
+    metrics["faithfulness"] = round(faithfulness, 3)
+
+    unsafe_patterns = ["hack", "exploit", "attack", "password", "credential",
+                       "kill", "destroy", "damage", "malicious", "inject"]
+    unsafe_count = sum(1 for p in unsafe_patterns if p in agent_response.lower())
+    metrics["content_safety"] = round(max(1.0 - (unsafe_count * 0.2), 0.0), 3)
+    return metrics
+
+
+_QUERIES = ["is the app healthy?", "check logs for errors in the last 6 hours", "show recent traces",
+            "why is booking slow", "show me the SRE dashboard", "restart the app", "any failed payments?"]
+_LINES = ["| Endpoint | Status | Avg (ms) |", "|---|---|---|", "| /create | ✅ 200 | 41 |",
+          "**Health:** ✅ healthy, database reachable", "### Error summary", "❌ 12 errors in the last hour",
+          "Total requests: 1,240 — error rate 0.9%", "```\nTraceback: psycopg2.OperationalError\n```",
+          "⚠️ Latency p95 at 820 ms, above the 500 ms target", "Timestamp 2026-10-18T12:00:00Z",
+          "No malicious activity or credential leaks detected.", "Suggest restarting the worker pool."]
+
+
+def synthetic_history(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    history = []
+    for _ in range(n):
+        response = "\n".join(rng.choice(_LINES) for _ in range(rng.randint(3, 30)))
+        context = json.dumps({"status": "success", "logs": [
+            {"severity": rng.choice(["ERROR", "INFO"]), "message": rng.choice(_LINES)}
+            for _ in range(rng.randint(0, 20))
+        ]}) if rng.random() < 0.8 else ""
+        history.append((rng.choice(_QUERIES), response, context[:2000]))
+    return history
+
+
+def load_history(path: str) -> list:
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(r.get("user_query", ""), r.get("agent_response", ""), r.get("raw_context", "")) for r in rows]
+
+
+def _timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", help="JSONL file of evaluation inputs to replay")
+    parser.add_argument("--records", type=int, default=2000, help="synthetic records when no --history")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per variant; best time is reported")
+    args = parser.parse_args()
+
+    history = load_history(args.history) if args.history else synthetic_history(args.records)
+
+    legacy = [legacy_metrics(*t) for t in history]
+    variants = {"batch": False}
+    if np is not None:
+        variants["batch+numpy"] = True
+    for name, use_numpy in variants.items():
+        batch = score_heuristics_batch(history, use_numpy=use_numpy)
+        mismatches = sum(
+            1 for old, new in zip(legacy, batch)
+            if any(old[k] != new[k]["score"] for k in old)
+        )
+        if mismatches:
+            raise SystemExit(f"{name}: {mismatches} of {len(history)} records scored differently")
+
+    print(f"{len(history)} records — all variants match the per-record scores")
+    baseline = _timed(lambda: [legacy_metrics(*t) for t in history], args.repeat)
+    print(f"  per-record     {baseline:9.1f} ms")
+    for name, use_numpy in variants.items():
+        ms = _timed(lambda: score_heuristics_batch(history, use_numpy=use_numpy), args.repeat)
+        print(f"  {name:<14} {ms:9.1f} ms   ({baseline / ms:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Broadcast Hub — Fan-out of pipeline events and chat frames to WebSocket clients.
+
+- Every client gets a bounded outbound buffer drained by its own sender task,
+  so a slow socket only delays itself.
+- When a buffer is full, the oldest droppable frame (pipeline updates, stream
+  deltas) is discarded; chat responses and evaluations are never dropped.
+- Clients receive pipeline events only for topics they subscribed to — their
+  own session IDs and any agent IDs they are inspecting ("*" = everything).
+- Emits from any thread are buffered and flushed every HUB_BATCH_MS as one
+  frame per client and kind (`pipeline_batch`, `agent_diff_batch`); each
+  payload is serialized once.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HUB_CLIENT_QUEUE = int(os.environ.get("HUB_CLIENT_QUEUE", 256))
+HUB_BATCH_MS = int(os.environ.get("HUB_BATCH_MS", 5))
+
+ALL_TOPICS = "*"
+# Frame kind → frame type used when a flush carries more than one payload of that kind
+BATCH_TYPES = {"pipeline_event": "pipeline_batch", "agent_diff": "agent_diff_batch"}
+
+
+class _Client:
+    """Outbound state for one WebSocket connection."""
+
+    __slots__ = ("ws", "buffer", "ready", "topics", "task", "sent", "dropped")
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.buffer: deque = deque()      # (text, droppable)
+        self.ready = asyncio.Event()
+        self.topics: set = set()
+        self.task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+
+    def enqueue(self, text: str, droppable: bool) -> None:
+        if len(self.buffer) >= HUB_CLIENT_QUEUE:
+            if droppable:
+                self.dropped += 1
+                return
+            # Make room for a frame that must arrive by discarding the oldest droppable one
+            for i, (_, old_droppable) in enumerate(self.buffer):
+                if old_droppable:
+                    del self.buffer[i]
+                    self.dropped += 1
+                    break
+        self.buffer.append((text, droppable))
+        self.ready.set()
+
+
+class BroadcastHub:
+    """Per-client queues, topic routing and batched cross-thread publishing."""
+
+    def __init__(self):
+        self._clients: Dict[str, _Client] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[tuple] = []          # (kind, topics, payload)
+        self._pending_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._frames_flushed = 0
+        self._events_published = 0
+
+    # ── Connections ─────────────────────────────────────────────────
+    def register(self, client_id: str, ws, topics: Iterable[str] = ()) -> None:
+        self._loop = asyncio.get_event_loop()
+        client = _Client(ws)
+        client.topics.update(topics)
+        client.task = asyncio.create_task(self._sender(client_id, client))
+        self._clients[client_id] = client
+
+    def unregister(self, client_id: str) -> None:
+        client = self._clients.pop(client_id, None)
+        if client and client.task:
+            client.task.cancel()
+
+    def subscribe(self, client_id: str, topics: Iterable[str]) -> None:
+        client = self._clients.get(client_id)
+        if client:
+            client.topics.update(t for t in topics if t)
+
+    def unsubscribe(self, client_id: str, topics: Iterable[str]) -> None:
+        client = self._clients.get(client_id)
+        if client:
+            client.topics.difference_update(topics)
+
+    def unsubscribe_later(self, client_id: str, topics: Iterable[str], delay: float) -> None:
+        """Unsubscribe once `delay` seconds and one batch window have passed. Must be called on the event loop."""
+        asyncio.get_event_loop().call_later(delay + 2 * HUB_BATCH_MS / 1000,
+                                            self.unsubscribe, client_id, list(topics))
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def _sender(self, client_id: str, client: _Client):
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                while client.buffer:
+                    text, _ = client.buffer.popleft()
+                    await client.ws.send_text(text)
+                    client.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info("Client %s send failed, dropping connection: %s", client_id, e)
+            self._clients.pop(client_id, None)
+
+    # ── Direct frames ───────────────────────────────────────────────
+    def send(self, client_id: str, payload: dict, droppable: bool = False) -> bool:
+        """Queue a frame for one client. Must be called on the event loop."""
+        client = self._clients.get(client_id)
+        if not client:
+            return False
+        client.enqueue(json.dumps(payload), droppable)
+        return True
+
+    # ── Topic frames (any thread) ───────────────────────────────────
+    def publish_event(self, event: dict) -> None:
+        """Buffer a pipeline event for its session and agent topics."""
+        self.publish("pipeline_event", {event.get("session_id"), event.get("agent_id")} - {None, ""}, event)
+
+    def publish(self, kind: str, topics: Iterable[str], payload: dict) -> None:
+        """Buffer a payload for every client subscribed to one of `topics`; safe from any thread."""
+        if self._loop is None:
+            return
+        with self._pending_lock:
+            self._pending.append((kind, frozenset(topics), payload))
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self._loop.call_soon_threadsafe(self._loop.call_later, HUB_BATCH_MS / 1000, self._flush)
+
+    def _flush(self) -> None:
+        with self._pending_lock:
+            events, self._pending = self._pending, []
+            self._flush_scheduled = False
+        if not events or not self._clients:
+            return
+        self._events_published += len(events)
+
+        encoded = [(kind, topics, json.dumps(payload)) for kind, topics, payload in events]
+        for client in list(self._clients.values()):
+            wants_all = ALL_TOPICS in client.topics
+            by_kind: Dict[str, List[str]] = {}
+            for kind, topics, text in encoded:
+                if wants_all or topics & client.topics:
+                    by_kind.setdefault(kind, []).append(text)
+            for kind, parts in by_kind.items():
+                if len(parts) == 1:
+                    frame = '{"type": "' + kind + '", "data": ' + parts[0] + '}'
+                else:
+                    frame = '{"type": "' + BATCH_TYPES.get(kind, kind) + '", "data": [' + ", ".join(parts) + ']}'
+                client.enqueue(frame, droppable=True)
+                self._frames_flushed += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "events_published": self._events_published,
+            "frames_flushed": self._frames_flushed,
+            "batch_ms": HUB_BATCH_MS,
+            "client_queue_max": HUB_CLIENT_QUEUE,
+            "per_client": {
+                cid: {
+                    "queued": len(c.buffer),
+                    "sent": c.sent,
+                    "dropped": c.dropped,
+                    "topics": len(c.topics),
+                }
+                for cid, c in list(self._clients.items())
+            },
+        }
+
+
+# ── Singleton ───────────────────────────────────────────────────────
+hub = BroadcastHub()
@@ -0,0 +1,138 @@
+"""
+Context Builder — Assembles compact, cache-friendly prompts for the LLM Brain.
+
+Two jobs:
+- Mark the stable prefix (system prompt + prior turns) for Anthropic prompt
+  caching so repeated ReAct steps only pay full price for the new tail.
+- Reduce raw MCP tool output to a structured digest (counts, severity
+  breakdown, top-k errors, key metrics) instead of slicing JSON mid-value.
+"""
+
+import os
+import re
+import json
+from collections import Counter
+from typing import Any, List
+
+OBSERVATION_CHAR_BUDGET = int(os.environ.get("LLM_OBSERVATION_CHAR_BUDGET", 1500))
+REPORT_CHAR_BUDGET = int(os.environ.get("LLM_REPORT_CHAR_BUDGET", 4000))
+DIGEST_TOP_K = int(os.environ.get("LLM_DIGEST_TOP_K", 5))
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Higher rank = more important when picking the top-k log lines
+SEVERITY_RANK = {"CRITICAL": 5, "FATAL": 5, "ERROR": 4, "WARNING": 3, "WARN": 3,
+                 "INFO": 2, "VERBOSE": 1, "DEBUG": 1}
+
+MAX_STRING = 240
+MAX_DEPTH = 4
+
+# Collapses ids, numbers and hex so repeated errors group under one signature
+_VOLATILE = re.compile(r"0x[0-9a-fA-F]+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}|\d+")
+
+
+def compact_json(obj: Any) -> str:
+    """JSON without indentation or spaces after separators."""
+    return json.dumps(obj, separators=(",", ":"), default=str, ensure_ascii=False)
+
+
+def cached_system(prompt: str) -> List[dict]:
+    """System prompt as a content block marked as a cache breakpoint."""
+    return [{"type": "text", "text": prompt, "cache_control": CACHE_CONTROL}]
+
+
+def mark_cache_breakpoint(messages: List[dict], trailer: str = "") -> List[dict]:
+    """
+    Mark the last message as a cache breakpoint.
+
+    On the next ReAct step everything up to here is an identical prefix,
+    so the provider serves it from cache and only the new turns are billed in full.
+    `trailer` is appended after the breakpoint as its own block: instructions that
+    only apply to this step must go there, or the next step's prefix won't match.
+    """
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    content = [dict(block) for block in content]
+    content[-1]["cache_control"] = CACHE_CONTROL
+    if trailer:
+        content.append({"type": "text", "text": trailer})
+    return messages[:-1] + [{**last, "content": content}]
+
+
+def digest(data: Any, top_k: int = DIGEST_TOP_K, depth: int = 0) -> Any:
+    """Reduce arbitrary tool output to a structured summary that keeps the signal."""
+    if isinstance(data, str):
+        return data if len(data) <= MAX_STRING else data[:MAX_STRING] + "…"
+    if isinstance(data, dict):
+        if depth >= MAX_DEPTH:
+            return {"keys": len(data)}
+        return {k: digest(v, top_k, depth + 1) for k, v in data.items() if v not in (None, "", [], {})}
+    if isinstance(data, (list, tuple)):
+        return _digest_list(list(data), top_k, depth)
+    return data
+
+
+def _digest_list(items: list, top_k: int, depth: int) -> Any:
+    if not items:
+        return []
+    if all(isinstance(i, (int, float)) and not isinstance(i, bool) for i in items):
+        return {"count": len(items), "min": min(items), "max": max(items),
+                "avg": round(sum(items) / len(items), 3)}
+    if all(isinstance(i, dict) for i in items) and any("message" in i for i in items):
+        return _digest_logs(items, top_k)
+    if len(items) <= top_k:
+        return [digest(i, top_k, depth + 1) for i in items]
+    return {
+        "count": len(items),
+        "first": [digest(i, top_k, depth + 1) for i in items[:top_k]],
+        "omitted": len(items) - top_k,
+    }
+
+
+def _digest_logs(logs: List[dict], top_k: int) -> dict:
+    """Severity counts plus the top-k distinct messages, worst and most frequent first."""
+    by_severity = Counter(str(l.get("severity", "UNKNOWN")).upper() for l in logs)
+    groups = {}
+    for log in logs:
+        msg = str(log.get("message", ""))
+        sig = _VOLATILE.sub("#", msg)[:120]
+        sev = str(log.get("severity", "UNKNOWN")).upper()
+        g = groups.get(sig)
+        if g is None:
+            groups[sig] = {"severity": sev, "message": msg[:MAX_STRING], "count": 1,
+                           "last_seen": log.get("timestamp")}
+        else:
+            g["count"] += 1
+            g["last_seen"] = log.get("timestamp") or g["last_seen"]
+            if SEVERITY_RANK.get(sev, 0) > SEVERITY_RANK.get(g["severity"], 0):
+                g["severity"] = sev
+    top = sorted(groups.values(),
+                 key=lambda g: (SEVERITY_RANK.get(g["severity"], 0), g["count"]),
+                 reverse=True)[:top_k]
+    return {
+        "count": len(logs),
+        "by_severity": dict(by_severity),
+        "distinct_messages": len(groups),
+        "top": top,
+    }
+
+
+def encode_observation(data: Any, budget: int = OBSERVATION_CHAR_BUDGET) -> str:
+    """
+    Compact digest of a tool result that fits the character budget.
+
+    Shrinks top-k before resorting to a hard cut, so the output stays valid JSON
+    in all but pathological cases.
+    """
+    top_k = DIGEST_TOP_K
+    text = compact_json(digest(data, top_k))
+    while len(text) > budget and top_k > 1:
+        top_k -= 1 if top_k <= 3 else 2
+        text = compact_json(digest(data, top_k))
+    if len(text) > budget:
+        text = text[:budget] + "…"
+    return text
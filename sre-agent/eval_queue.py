@@ -0,0 +1,140 @@
+"""
+Evaluation Queue — Runs governance evaluation off the response critical path.
+
+Sessions submit an evaluation job and move on. A small pool of asyncio workers
+drains the queue, groups waiting jobs into batches (one watsonx.governance run
+per batch) and hands each result to the job's delivery callback.
+
+Under load only a sample of sessions is evaluated, and when the queue is full
+new jobs are shed rather than delaying the chat.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+EVAL_WORKERS = int(os.environ.get("EVAL_WORKERS", 2))
+EVAL_BATCH_SIZE = int(os.environ.get("EVAL_BATCH_SIZE", 8))
+EVAL_BATCH_WAIT_MS = int(os.environ.get("EVAL_BATCH_WAIT_MS", 250))
+EVAL_QUEUE_MAX = int(os.environ.get("EVAL_QUEUE_MAX", 200))
+EVAL_SAMPLE_RATE = float(os.environ.get("EVAL_SAMPLE_RATE", 1.0))
+# Once this many jobs are waiting, sampling drops to EVAL_HIGH_LOAD_SAMPLE_RATE
+EVAL_HIGH_LOAD_DEPTH = int(os.environ.get("EVAL_HIGH_LOAD_DEPTH", 50))
+EVAL_HIGH_LOAD_SAMPLE_RATE = float(os.environ.get("EVAL_HIGH_LOAD_SAMPLE_RATE", 0.25))
+
+Deliver = Callable[[dict], Awaitable[None]]
+
+
+class EvaluationQueue:
+    """Bounded, sampled, batching job queue in front of WatsonxEvaluator."""
+
+    def __init__(self, evaluator, workers: int = EVAL_WORKERS, batch_size: int = EVAL_BATCH_SIZE,
+                 batch_wait_ms: int = EVAL_BATCH_WAIT_MS, max_queue: int = EVAL_QUEUE_MAX):
+        self.evaluator = evaluator
+        self.workers = max(workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue = None
+        self._tasks: List[asyncio.Task] = []
+        self._stats = {
+            "submitted": 0, "queued": 0, "sampled_out": 0, "shed": 0,
+            "evaluated": 0, "failed": 0, "batches": 0,
+            "queue_wait_ms_total": 0.0, "eval_ms_total": 0.0,
+        }
+
+    def _ensure_workers(self):
+        """Start the worker pool on the running loop the first time it's needed."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+            logger.info("Evaluation queue started: %d workers, batch ≤%d", self.workers, self.batch_size)
+
+    def sample_rate(self) -> float:
+        depth = self._queue.qsize() if self._queue else 0
+        return EVAL_HIGH_LOAD_SAMPLE_RATE if depth >= EVAL_HIGH_LOAD_DEPTH else EVAL_SAMPLE_RATE
+
+    def submit(self, job: dict, deliver: Deliver) -> str:
+        """
+        Enqueue an evaluation without waiting for it.
+
+        job holds evaluate_response's keyword arguments; deliver is awaited with
+        the result. Returns "queued", "sampled_out" or "shed".
+        """
+        self._ensure_workers()
+        self._stats["submitted"] += 1
+        if random.random() >= self.sample_rate():
+            self._stats["sampled_out"] += 1
+            return "sampled_out"
+        try:
+            self._queue.put_nowait((time.perf_counter(), job, deliver))
+        except asyncio.QueueFull:
+            self._stats["shed"] += 1
+            logger.warning("Evaluation queue full (%d) — shedding session %s",
+                           self.max_queue, job.get("session_id"))
+            return "shed"
+        self._stats["queued"] += 1
+        return "queued"
+
+    async def _next_batch(self) -> list:
+        """Wait for one job, then gather whatever else arrives within the batch window."""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self, worker_id: int):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            jobs = [job for _, job, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.evaluator.evaluate_batch, jobs)
+            except Exception as e:
+                logger.error("Evaluation worker %d batch failed: %s", worker_id, e)
+                results = [{"session_id": j.get("session_id"), "status": "error", "error": str(e)}
+                           for j in jobs]
+                self._stats["failed"] += len(jobs)
+            else:
+                # Only batches that produced scores count toward evaluated and the averages
+                self._stats["batches"] += 1
+                self._stats["evaluated"] += len(batch)
+                self._stats["eval_ms_total"] += (time.perf_counter() - started) * 1000
+                self._stats["queue_wait_ms_total"] += sum(started - enqueued for enqueued, _, _ in batch) * 1000
+
+            for (enqueued, job, deliver), result in zip(batch, results):
+                wait_ms = (started - enqueued) * 1000
+                result = {**result, "queue_wait_ms": round(wait_ms, 1), "batch_size": len(batch)}
+                try:
+                    await deliver(result)
+                except Exception as e:
+                    logger.error("Failed to deliver evaluation for %s: %s", job.get("session_id"), e)
+                finally:
+                    self._queue.task_done()
+
+    def get_stats(self) -> dict:
+        s = self._stats
+        return {
+            **{k: v for k, v in s.items() if not k.endswith("_total")},
+            "workers": len(self._tasks),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_max": self.max_queue,
+            "sample_rate": self.sample_rate(),
+            "avg_batch_size": round(s["evaluated"] / s["batches"], 2) if s["batches"] else 0.0,
+            "avg_queue_wait_ms": round(s["queue_wait_ms_total"] / s["evaluated"], 1) if s["evaluated"] else 0.0,
+            "avg_batch_eval_ms": round(s["eval_ms_total"] / s["batches"], 1) if s["batches"] else 0.0,
+        }
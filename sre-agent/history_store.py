@@ -0,0 +1,90 @@
+"""
+History Store — Bounded, indexed, self-aggregating record history.
+
+Shared by the evaluator, the agent registry and the orchestrator's run
+history. Appends, evictions, lookups by ID and aggregate reads are all O(1):
+records live in a ring buffer (deque), a dict indexes them by key, and running
+sums/counts are adjusted as records enter and leave the window.
+"""
+
+import threading
+from collections import deque
+from itertools import islice
+from typing import Callable, Dict, List, Optional
+
+# record → {aggregate name: numeric value or None (not counted)}
+MetricsFn = Callable[[dict], Dict[str, Optional[float]]]
+
+
+class HistoryStore:
+    """Thread-safe ring buffer with a key index and running aggregates."""
+
+    def __init__(self, maxlen: int, key: Optional[str] = None, metrics: Optional[MetricsFn] = None):
+        self.maxlen = maxlen
+        self._key = key
+        self._metrics = metrics
+        self._items: deque = deque()
+        self._index: Dict[str, dict] = {}
+        self._sums: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._total_appended = 0
+        self._lock = threading.Lock()
+
+    def append(self, record: dict) -> None:
+        # Metrics are extracted outside the lock — only the bookkeeping is serialized
+        values = self._metrics(record) if self._metrics else None
+        with self._lock:
+            if len(self._items) >= self.maxlen:
+                self._evict()
+            self._items.append((record, values))
+            self._total_appended += 1
+            if self._key:
+                self._index[record.get(self._key)] = record
+            if values:
+                self._apply(values, 1)
+
+    def _evict(self) -> None:
+        record, values = self._items.popleft()
+        if self._key:
+            key = record.get(self._key)
+            # A newer record may have taken over the key — keep that one
+            if self._index.get(key) is record:
+                del self._index[key]
+        if values:
+            self._apply(values, -1)
+
+    def _apply(self, values: Dict[str, Optional[float]], sign: int) -> None:
+        for name, value in values.items():
+            if value is None:
+                continue
+            self._sums[name] = self._sums.get(name, 0.0) + sign * value
+            self._counts[name] = self._counts.get(name, 0) + sign
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            return self._index.get(key)
+
+    def recent(self, limit: int = 50, newest_first: bool = True) -> List[dict]:
+        """The last `limit` records; O(limit)."""
+        with self._lock:
+            latest = [record for record, _ in islice(reversed(self._items), max(limit, 0))]
+        return latest if newest_first else latest[::-1]
+
+    def aggregate(self, name: str, decimals: int = 3) -> Optional[float]:
+        """Running mean of one metric over the current window, or None if no samples."""
+        with self._lock:
+            count = self._counts.get(name, 0)
+            total = self._sums.get(name, 0.0)
+        return round(total / count, decimals) if count else None
+
+    def sums(self) -> Dict[str, dict]:
+        """Snapshot of every metric's running sum and sample count."""
+        with self._lock:
+            return {name: {"sum": self._sums[name], "count": self._counts[name]} for name in self._sums}
+
+    @property
+    def total_appended(self) -> int:
+        return self._total_appended
+
+    def __len__(self) -> int:
+        return len(self._items)
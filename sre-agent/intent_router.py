@@ -0,0 +1,271 @@
+"""
+Intent Router — Local fast path in front of LLMBrain.classify_intent.
+
+Common one-liners ("is the app healthy?", "show recent traces") map directly
+to an agent + action, so they don't need a Claude round-trip. Each known intent
+is a set of regex patterns plus parameter extractors. Only a single clear,
+high-confidence match is dispatched locally; anything ambiguous, compound or
+open-ended falls back to the LLM.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+ROUTER_MIN_CONFIDENCE = float(os.environ.get("INTENT_ROUTER_MIN_CONFIDENCE", 0.8))
+ROUTER_MAX_WORDS = int(os.environ.get("INTENT_ROUTER_MAX_WORDS", 16))
+# A runner-up this close to the best match makes the query ambiguous
+ROUTER_MARGIN = 0.15
+
+
+# ── Parameter extractors ────────────────────────────────────────────
+# Time window → hours, keyed by the unit's first letter (only the units below can match)
+_UNIT_HOURS = {"m": 1 / 60, "h": 1, "d": 24, "w": 168}
+_HOURS = re.compile(r"\b(?:last|past|previous)\s+(\d{1,3})\s*"
+                    r"(m|min|mins|minute|minutes|h|hr|hrs|hour|hours|d|day|days|w|wk|wks|week|weeks)\b")
+_PERIOD = re.compile(r"\b(?:last|past|previous)\s+(hour|day|week)\b|\b(today)\b")
+_PERIOD_HOURS = {"hour": 1, "day": 24, "today": 24, "week": 168}
+# Any mention of a time window, convertible or not
+_TIME = re.compile(r"\b\d+\s*(?:s|m|h|d|w|y|mo)\b|\b(?:secs?|seconds?|mins?|minutes?|hrs?|hours?|days?|wks?|weeks?|"
+                   r"months?|years?|yrs?|yesterday|today|tonight|weekend)\b")
+_LIMIT = re.compile(r"\b(?:last|top|latest|recent)\s+(\d{1,4})\b(?!\s*(?:s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|"
+                    r"d|days?|w|wks?|weeks?|mo|months?|y|yrs?|years?)\b)")
+_INTERVAL = re.compile(r"\bevery\s+(\d{1,3})\s*(?:m|min|mins|minute|minutes)\b")
+_TRACE_ID = re.compile(r"\btrace\s+(?:id\s+)?([0-9a-f]{8}(?:-?[0-9a-f]{4,})*)\b")
+
+
+def _hours(text: str) -> Optional[float]:
+    m = _HOURS.search(text)
+    if m:
+        hours = int(m.group(1)) * _UNIT_HOURS[m.group(2)[0]]
+        return int(hours) if hours == int(hours) else round(hours, 2)
+    m = _PERIOD.search(text)
+    return _PERIOD_HOURS[m.group(1) or m.group(2)] if m else None
+
+
+def _unhandled_time(text: str, extract) -> bool:
+    """A time window the matched intent would drop or misread (months, "yesterday", or no hours param)."""
+    if not _TIME.search(_INTERVAL.sub(" ", text)):
+        return False
+    return "hours" not in extract or _hours(text) is None
+
+
+def _limit(text: str) -> Optional[int]:
+    m = _LIMIT.search(text)
+    return int(m.group(1)) if m else None
+
+
+def _interval(text: str) -> Optional[int]:
+    m = _INTERVAL.search(text)
+    return int(m.group(1)) if m else None
+
+
+def _trace_id(text: str) -> Optional[str]:
+    m = _TRACE_ID.search(text)
+    return m.group(1) if m else None
+
+
+EXTRACTORS: Dict[str, Callable[[str], object]] = {
+    "hours": _hours,
+    "limit": _limit,
+    "interval_minutes": _interval,
+    "trace_id": _trace_id,
+}
+
+# ── Intent table ────────────────────────────────────────────────────
+# (agent, action, default params, extracted params, [(pattern, confidence), ...])
+# Defaults mirror the examples in llm_brain.SYSTEM_PROMPT.
+_APP = r"(?:the\s+)?(?:app|application|service|booking\s+app|system)"
+
+INTENT_TABLE = [
+    ("health_agent", "check_all", {}, (), [
+        (rf"^(?:is|are)\s+{_APP}\s+(?:healthy|up|ok|okay|alive|running|working)\W*$", 0.95),
+        (r"^(?:run\s+(?:a\s+)?|do\s+(?:a\s+)?)?(?:full\s+)?health\s*check\W*$", 0.95),
+        (rf"^(?:check\s+)?(?:the\s+)?health(?:\s+of\s+{_APP})?\W*$", 0.9),
+        (rf"\bhow\s+(?:is|'s)\s+{_APP}\s+doing\b", 0.85),
+    ]),
+    ("health_agent", "check_database_health", {}, (), [
+        (r"^(?:is\s+the\s+)?(?:db|database)\s+(?:healthy|up|ok|alive|reachable)\W*$", 0.95),
+        (r"\b(?:check\s+)?(?:db|database)\s+health\b", 0.9),
+    ]),
+    ("log_agent", "get_error_logs", {"hours": 24, "limit": 100}, ("hours", "limit"), [
+        (r"^(?:check|show|get|list|fetch)\s+(?:me\s+)?(?:the\s+)?(?:logs\s+for\s+errors|error\s+logs)\b", 0.95),
+        (r"^(?:any|are\s+there\s+any)\s+errors(?:\s+in\s+(?:the\s+)?logs)?\b", 0.9),
+        (r"\berror\s+logs\b", 0.85),
+    ]),
+    ("log_agent", "get_recent_logs", {"limit": 50}, ("limit",), [
+        (r"^(?:show|get|list|fetch)\s+(?:me\s+)?(?:the\s+)?(?:recent|latest|last\s+\d+)\s+logs\W*$", 0.95),
+        (r"^(?:recent|latest)\s+logs\W*$", 0.95),
+        (r"^(?:show|get)\s+(?:me\s+)?(?:the\s+)?logs\W*$", 0.85),
+    ]),
+    ("trace_agent", "get_trace_details", {}, ("trace_id",), [
+        (r"\btrace\s+(?:id\s+)?[0-9a-f]{8}(?:-?[0-9a-f]{4,})*\b", 0.9),
+    ]),
+    ("trace_agent", "get_recent_traces", {"limit": 20}, ("limit",), [
+        (r"^(?:show|get|list|fetch)\s+(?:me\s+)?(?:the\s+)?(?:recent|latest|last\s+\d+)\s+(?:request\s+)?traces\W*$", 0.95),
+        (r"^(?:recent|latest)\s+(?:request\s+)?traces\W*$", 0.95),
+    ]),
+    ("trace_agent", "get_trace_summary", {"hours": 1}, ("hours",), [
+        (r"\btraces?\s+summary\b|\bsummar(?:y|ize)\s+(?:of\s+)?(?:the\s+)?traces\b", 0.9),
+    ]),
+    ("dashboard_agent", "get_dashboard", {}, (), [
+        (r"^(?:show|open|get|display)\s+(?:me\s+)?(?:the\s+)?(?:sre\s+)?dashboard\W*$", 0.95),
+        (r"\bgolden\s+signals\b", 0.9),
+        (r"^(?:sre\s+)?dashboard\W*$", 0.95),
+    ]),
+    ("dashboard_agent", "get_response_times", {}, (), [
+        (r"^(?:show|get|what\s+are)\s+(?:me\s+)?(?:the\s+)?(?:endpoint\s+)?(?:response\s+times|latenc(?:y|ies))\W*$", 0.95),
+    ]),
+    ("dashboard_agent", "get_failure_analysis", {}, (), [
+        (r"^(?:show|get|run)\s+(?:me\s+)?(?:the\s+|a\s+)?failure\s+analysis\W*$", 0.95),
+    ]),
+    ("deployment_agent", "get_deployment_history", {}, (), [
+        (r"\bdeployment\s+history\b|^(?:show|list)\s+(?:me\s+)?(?:the\s+)?(?:recent\s+)?deployments\W*$", 0.95),
+    ]),
+    # Lifecycle actions only on exact imperative phrasing — anything softer goes to the LLM
+    ("deployment_agent", "restart_app", {}, (), [
+        (rf"^(?:please\s+)?restart\s+{_APP}\W*$", 0.95),
+    ]),
+    ("deployment_agent", "stop_app", {}, (), [
+        (rf"^(?:please\s+)?stop\s+{_APP}\W*$", 0.95),
+    ]),
+    ("deployment_agent", "start_app", {}, (), [
+        (rf"^(?:please\s+)?start\s+{_APP}\W*$", 0.95),
+    ]),
+    ("monitoring_agent", "start", {"interval_minutes": 5}, ("interval_minutes",), [
+        (r"^(?:start|enable|begin)\s+(?:continuous\s+)?monitoring\b", 0.95),
+    ]),
+    ("monitoring_agent", "stop", {}, (), [
+        (r"^(?:stop|disable|end)\s+(?:continuous\s+)?monitoring\W*$", 0.95),
+    ]),
+    ("monitoring_agent", "status", {}, (), [
+        (r"^(?:is\s+)?monitoring\s+(?:status|running|on|active)\W*$", 0.9),
+    ]),
+    ("runbook_agent", "start", {"interval_minutes": 5}, ("interval_minutes",), [
+        (r"^(?:start|enable)\s+(?:the\s+)?(?:automated\s+)?runbook(?:\s+monitoring)?\b", 0.95),
+    ]),
+    ("runbook_agent", "stop", {}, (), [
+        (r"^(?:stop|disable)\s+(?:the\s+)?(?:automated\s+)?runbook(?:\s+monitoring)?\W*$", 0.95),
+    ]),
+    ("runbook_agent", "status", {}, (), [
+        (r"^(?:is\s+)?(?:the\s+)?runbook(?:\s+monitoring)?\s+(?:status|running|on|active)\W*$", 0.9),
+    ]),
+]
+
+_COMPILED = [
+    (agent, action, defaults, extract, [(re.compile(p), conf) for p, conf in patterns])
+    for agent, action, defaults, extract, patterns in INTENT_TABLE
+]
+
+# Wording that signals reasoning, negation or multi-step work — the LLM should decide
+_NEEDS_LLM = re.compile(
+    r"\b(?:why|how\s+come|root\s+cause|investigate|diagnose|compare|explain|should|"
+    r"don'?t|do\s+not|never|unless|if|then|and|also|after|before|but)\b"
+)
+
+
+class IntentRouter:
+    """Table-driven intent matcher with hit-rate and time-saved accounting."""
+
+    def __init__(self, enabled: bool = ROUTER_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._total = 0
+        self._hits = 0
+        self._by_intent: Dict[str, int] = {}
+        self._fallback_reasons: Dict[str, int] = {}
+        self._route_us_total = 0.0
+        self._llm_calls = 0
+        self._llm_ms_total = 0.0
+
+    def route(self, user_message: str) -> Optional[dict]:
+        """Return an intent dict (same shape as classify_intent) or None to use the LLM."""
+        start = time.perf_counter()
+        intent, reason = self._match(user_message)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        logger.debug("Intent router: %s (%.0fµs)", reason, elapsed_us)
+        with self._lock:
+            self._total += 1
+            self._route_us_total += elapsed_us
+            if intent:
+                self._hits += 1
+                key = f"{intent['agent']}.{intent['action']}"
+                self._by_intent[key] = self._by_intent.get(key, 0) + 1
+            else:
+                self._fallback_reasons[reason] = self._fallback_reasons.get(reason, 0) + 1
+        return intent
+
+    def _match(self, user_message: str):
+        if not self.enabled:
+            return None, "disabled"
+        text = " ".join(user_message.lower().split())
+        if len(text.split()) > ROUTER_MAX_WORDS:
+            return None, "too_long"
+        if _NEEDS_LLM.search(text):
+            return None, "needs_reasoning"
+
+        scored = []
+        for agent, action, defaults, extract, patterns in _COMPILED:
+            conf = max((c for p, c in patterns if p.search(text)), default=0.0)
+            if conf:
+                scored.append((conf, agent, action, defaults, extract))
+        if not scored:
+            return None, "no_match"
+        scored.sort(key=lambda s: s[0], reverse=True)
+        conf, agent, action, defaults, extract = scored[0]
+        if conf < ROUTER_MIN_CONFIDENCE:
+            return None, "low_confidence"
+        if len(scored) > 1 and scored[1][0] >= conf - ROUTER_MARGIN:
+            return None, "ambiguous"
+
+        if ("hours" in extract or "limit" in extract) and _unhandled_time(text, extract):
+            return None, "unsupported_time_range"
+
+        params = dict(defaults)
+        for name in extract:
+            value = EXTRACTORS[name](text)
+            if value is not None:
+                params[name] = value
+        if action == "get_trace_details" and not params.get("trace_id"):
+            return None, "missing_param"
+        return {
+            "agent": agent,
+            "action": action,
+            "params": params,
+            "reasoning": f"Fast-path router match (confidence {conf:.2f})",
+            "routed_by": "router",
+            "confidence": conf,
+        }, "hit"
+
+    def record_llm_latency(self, latency_ms: float) -> None:
+        """Record a classify_intent round-trip; the average prices each router hit."""
+        with self._lock:
+            self._llm_calls += 1
+            self._llm_ms_total += latency_ms
+
+    def get_stats(self) -> dict:
+        """Hit rate, per-intent hits, fallback reasons and estimated LLM time saved."""
+        with self._lock:
+            avg_llm_ms = self._llm_ms_total / self._llm_calls if self._llm_calls else None
+            return {
+                "enabled": self.enabled,
+                "total_routed": self._total,
+                "hits": self._hits,
+                "fallbacks": self._total - self._hits,
+                "hit_rate": round(self._hits / self._total, 3) if self._total else 0.0,
+                "hits_by_intent": dict(self._by_intent),
+                "fallback_reasons": dict(self._fallback_reasons),
+                "avg_route_us": round(self._route_us_total / self._total, 1) if self._total else 0.0,
+                "avg_llm_classify_ms": round(avg_llm_ms, 1) if avg_llm_ms is not None else None,
+                "llm_classify_samples": self._llm_calls,
+                "estimated_time_saved_ms": round(self._hits * avg_llm_ms, 1) if avg_llm_ms is not None else None,
+            }
+
+
+router = IntentRouter()
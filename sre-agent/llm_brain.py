@@ -5,9 +5,17 @@ pick the right agent, and format human-readable responses.
 
 import os
 import json
+import time
 import logging
+import threading
+from typing import Iterator
 from anthropic import Anthropic
 
+from context_builder import (
+    cached_system, compact_json, encode_observation, mark_cache_breakpoint,
+    OBSERVATION_CHAR_BUDGET, REPORT_CHAR_BUDGET,
+)
+
 logger = logging.getLogger(__name__)
 
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY', '')
@@ -54,7 +62,8 @@ If there are errors, suggest potential actions."""
 
 
 AUTONOMOUS_SYSTEM_PROMPT = """You are an Autonomous SRE Agent operating in a ReAct (Reason + Act) loop.
-Your mission: fully resolve the user's SRE goal by chaining tool calls autonomously — one step at a time.
+Your mission: fully resolve the user's SRE goal by chaining tool calls autonomously — one step at a time,
+running independent tool calls side by side when that saves a round-trip.
 
 Available tools (agents):
   log_agent        — get_error_logs, get_recent_logs, search_logs
@@ -76,7 +85,17 @@ FORMAT A — take a tool action:
   "params": { ... }
 }
 
-FORMAT B — final answer (when you have gathered enough data):
+FORMAT B — take several independent tool actions at once (they run concurrently):
+{
+  "type": "parallel_actions",
+  "thought": "Explain why these calls are independent and what each should tell you",
+  "actions": [
+    {"agent": "<agent_name>", "action": "<action_name>", "params": { ... }},
+    {"agent": "<agent_name>", "action": "<action_name>", "params": { ... }}
+  ]
+}
+
+FORMAT C — final answer (when you have gathered enough data):
 {
   "type": "final_answer",
   "thought": "Explain why no further tool calls are needed",
@@ -86,11 +105,27 @@ FORMAT B — final answer (when you have gathered enough data):
 Autonomous reasoning rules:
 - ALWAYS include a "thought" field that shows your internal reasoning before acting.
 - Chain agents intelligently: e.g. health check → if issues found → check logs → if errors → check traces.
+- When several read-only checks do not depend on each other (e.g. health + error logs + recent traces),
+  request them together with FORMAT B instead of one per step.
+- Never put state-changing actions (restart_app, stop_app, start_app, start/stop monitoring or runbooks)
+  in a parallel batch — run those alone with FORMAT A.
 - Do NOT repeat the same agent+action combination if you already have that result.
 - Prefer targeted follow-up queries over re-running broad checks.
 - Decide "final_answer" when: (a) the goal is clearly resolved, (b) you have enough evidence, OR (c) you have run 4+ steps.
 - In your final_answer summary, always include: findings, root cause (if any), recommendations."""
 
+# Sent after the cache breakpoint, since they only apply to the step being asked for
+AUTONOMOUS_FIRST_STEP_PROMPT = ("This is your first step. Think about what information you need "
+                                "to fully resolve this goal and choose the best first tool to call.")
+AUTONOMOUS_NEXT_STEP_PROMPT = ("You now have the above observations. "
+                               "Reason carefully: is the goal fully resolved? "
+                               "If yes, provide a final_answer. If not, what is the next best tool call?")
+
+
+_USAGE_FIELDS = ("input_tokens", "output_tokens",
+                 "cache_read_input_tokens", "cache_creation_input_tokens")
+_COUNTER_FIELDS = ("calls", "errors") + _USAGE_FIELDS
+
 
 class LLMBrain:
     """Anthropic Claude-based reasoning engine for the SRE orchestrator."""
@@ -98,14 +133,60 @@ class LLMBrain:
     def __init__(self, api_key: str = None):
         self.client = Anthropic(api_key=api_key or ANTHROPIC_API_KEY)
         self.model = "claude-sonnet-4-20250514"
+        self._stats_lock = threading.Lock()
+        self._stats = {}   # call kind → token / latency counters
+
+    def _create(self, kind: str, **kwargs):
+        """messages.create with per-call token, cache and latency accounting."""
+        start = time.perf_counter()
+        try:
+            response = self.client.messages.create(model=self.model, **kwargs)
+        except Exception:
+            self._record(kind, (time.perf_counter() - start) * 1000, None)
+            raise
+        self._record(kind, (time.perf_counter() - start) * 1000, getattr(response, "usage", None))
+        return response
+
+    def _record(self, kind: str, latency_ms: float, usage) -> None:
+        with self._stats_lock:
+            s = self._stats.setdefault(kind, {
+                **dict.fromkeys(_COUNTER_FIELDS, 0),
+                "latency_ms_total": 0.0, "latency_ms_max": 0.0, "last_latency_ms": 0.0,
+            })
+            s["calls"] += 1
+            s["latency_ms_total"] += latency_ms
+            s["latency_ms_max"] = max(s["latency_ms_max"], latency_ms)
+            s["last_latency_ms"] = latency_ms
+            if usage is None:
+                s["errors"] += 1
+                return
+            for field in _USAGE_FIELDS:
+                s[field] += getattr(usage, field, 0) or 0
+
+    def get_stats(self) -> dict:
+        """Per call-kind token usage, cache hit ratio and latency."""
+        with self._stats_lock:
+            by_kind = {}
+            for kind, s in self._stats.items():
+                prompt_tokens = (s["input_tokens"] + s["cache_read_input_tokens"]
+                                 + s["cache_creation_input_tokens"])
+                by_kind[kind] = {
+                    **{k: s[k] for k in _COUNTER_FIELDS},
+                    "cache_hit_ratio": round(s["cache_read_input_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+                    "avg_latency_ms": round(s["latency_ms_total"] / s["calls"], 1) if s["calls"] else 0.0,
+                    "max_latency_ms": round(s["latency_ms_max"], 1),
+                    "last_latency_ms": round(s["last_latency_ms"], 1),
+                }
+        totals = {k: sum(v[k] for v in by_kind.values()) for k in _COUNTER_FIELDS}
+        return {"model": self.model, "totals": totals, "by_call": by_kind}
 
     def classify_intent(self, user_message: str) -> dict:
         """Determine which agent and action to invoke from a user message."""
         try:
-            response = self.client.messages.create(
-                model=self.model,
+            response = self._create(
+                "classify_intent",
                 max_tokens=500,
-                system=SYSTEM_PROMPT,
+                system=cached_system(SYSTEM_PROMPT),
                 messages=[{"role": "user", "content": user_message}]
             )
             text = response.content[0].text.strip()
@@ -133,75 +214,102 @@ class LLMBrain:
                 "reasoning": f"LLM error: {str(e)}, defaulting to health check"
             }
 
+    def _format_request(self, agent_name: str, action: str, raw_data: dict) -> dict:
+        """Request kwargs shared by the blocking and streaming formatters."""
+        return {
+            "max_tokens": 2000,
+            "system": cached_system(RESPONSE_PROMPT),
+            "messages": [{
+                "role": "user",
+                "content": (
+                    f"Agent: {agent_name}\n"
+                    f"Action: {action}\n"
+                    f"Data digest (long lists summarized):\n```json\n"
+                    f"{encode_observation(raw_data, REPORT_CHAR_BUDGET)}\n```\n\n"
+                    "Format this into a clear SRE report."
+                )
+            }],
+        }
+
+    @staticmethod
+    def _raw_fallback(raw_data: dict) -> str:
+        return f"**Raw Result:**\n```json\n{json.dumps(raw_data, indent=2, default=str)[:2000]}\n```"
+
     def format_response(self, agent_name: str, action: str, raw_data: dict) -> str:
         """Turn raw MCP tool output into a human-friendly markdown response."""
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=2000,
-                system=RESPONSE_PROMPT,
-                messages=[{
-                    "role": "user",
-                    "content": (
-                        f"Agent: {agent_name}\n"
-                        f"Action: {action}\n"
-                        f"Raw Data:\n```json\n{json.dumps(raw_data, indent=2, default=str)[:4000]}\n```\n\n"
-                        "Format this into a clear SRE report."
-                    )
-                }]
-            )
+            response = self._create("format_response", **self._format_request(agent_name, action, raw_data))
             return response.content[0].text.strip()
         except Exception as e:
             logger.error("LLM formatting failed: %s", e)
-            return f"**Raw Result:**\n```json\n{json.dumps(raw_data, indent=2, default=str)[:2000]}\n```"
+            return self._raw_fallback(raw_data)
+
+    def stream_response(self, agent_name: str, action: str, raw_data: dict) -> Iterator[str]:
+        """
+        Streaming variant of format_response — yields text deltas as Claude produces them.
+
+        Blocking iterator; run it off the event loop. On failure before the first
+        token it yields the raw-result fallback instead, so callers always get text.
+        """
+        start = time.perf_counter()
+        usage = None
+        emitted = False
+        try:
+            with self.client.messages.stream(
+                model=self.model, **self._format_request(agent_name, action, raw_data)
+            ) as stream:
+                for text in stream.text_stream:
+                    emitted = True
+                    yield text
+                usage = stream.get_final_message().usage
+        except Exception as e:
+            logger.error("LLM streaming failed: %s", e)
+            yield "\n\n⚠️ Response stream interrupted." if emitted else self._raw_fallback(raw_data)
+        finally:
+            self._record("format_response_stream", (time.perf_counter() - start) * 1000, usage)
 
     def autonomous_think(self, goal: str, observations: list) -> dict:
         """
         Autonomous ReAct step.
 
         Given the original user goal and a list of past observations
-        (each with 'action_taken' and 'result'), returns either:
-          {"type": "action",       "thought": ..., "agent": ..., "action": ..., "params": ...}
-          {"type": "final_answer", "thought": ..., "summary": ...}
+        (each with 'action_taken' and 'result'), returns one of:
+          {"type": "action",           "thought": ..., "agent": ..., "action": ..., "params": ...}
+          {"type": "parallel_actions", "thought": ..., "actions": [{"agent": ..., "action": ..., "params": ...}, ...]}
+          {"type": "final_answer",     "thought": ..., "summary": ...}
+
+        Parallel observations carry 'parallel': True and a list of per-branch results.
+        Results are sent as compact digests and the conversation prefix is marked
+        for prompt caching, so each step only pays full price for the newest turn.
         """
         text = ""
         try:
-            if not observations:
-                messages = [{
-                    "role": "user",
-                    "content": (
-                        f"User Goal: {goal}\n\n"
-                        "This is your first step. Think about what information you need "
-                        "to fully resolve this goal and choose the best first tool to call."
+            # Every message is sent unchanged on later steps; only the trailer varies
+            messages = [{"role": "user", "content": f"User Goal: {goal}"}]
+            for i, obs in enumerate(observations):
+                messages.append({
+                    "role": "assistant",
+                    "content": compact_json(obs["action_taken"])
+                })
+                if obs.get("parallel"):
+                    # Each branch gets its own budget so one large result can't crowd out the others
+                    observation = "\n".join(
+                        f"[{b['agent']}.{b['action']}] {encode_observation(b['result'], OBSERVATION_CHAR_BUDGET)}"
+                        for b in obs["result"]
                     )
-                }]
-            else:
-                messages = [{"role": "user", "content": f"User Goal: {goal}"}]
-                for i, obs in enumerate(observations):
-                    messages.append({
-                        "role": "assistant",
-                        "content": json.dumps(obs["action_taken"])
-                    })
-                    is_last = (i == len(observations) - 1)
-                    suffix = (
-                        "\n\nYou now have the above observations. "
-                        "Reason carefully: is the goal fully resolved? "
-                        "If yes, provide a final_answer. If not, what is the next best tool call?"
-                        if is_last else ""
-                    )
-                    messages.append({
-                        "role": "user",
-                        "content": (
-                            f"Observation {i + 1}: "
-                            f"{json.dumps(obs['result'], default=str)[:1500]}{suffix}"
-                        )
-                    })
-
-            response = self.client.messages.create(
-                model=self.model,
+                else:
+                    observation = encode_observation(obs['result'], OBSERVATION_CHAR_BUDGET)
+                messages.append({
+                    "role": "user",
+                    "content": f"Observation {i + 1}: {observation}"
+                })
+
+            response = self._create(
+                "autonomous_think",
                 max_tokens=800,
-                system=AUTONOMOUS_SYSTEM_PROMPT,
-                messages=messages
+                system=cached_system(AUTONOMOUS_SYSTEM_PROMPT),
+                messages=mark_cache_breakpoint(
+                    messages, AUTONOMOUS_NEXT_STEP_PROMPT if observations else AUTONOMOUS_FIRST_STEP_PROMPT)
             )
             text = response.content[0].text.strip()
             # Strip potential markdown code fences
@@ -9,6 +9,8 @@ import logging
 import requests
 from datetime import datetime
 
+from trace_context import outbound_headers
+
 logger = logging.getLogger(__name__)
 
 MCP_SERVER_URL = os.environ.get(
@@ -37,7 +39,7 @@ class MCPClient:
             "method": method,
             "params": params or {}
         }
-        headers = {"Content-Type": "application/json", "X-API-Key": self.api_key}
+        headers = {"Content-Type": "application/json", "X-API-Key": self.api_key, **outbound_headers()}
         try:
             resp = requests.post(f"{self.base_url}/mcp", json=payload, headers=headers, timeout=timeout)
             resp.raise_for_status()
@@ -51,7 +53,7 @@ class MCPClient:
             return {"error": str(e)}
 
     def _rest(self, endpoint: str, payload: dict = None, timeout: int = 90):
-        headers = {"Content-Type": "application/json", "X-API-Key": self.api_key}
+        headers = {"Content-Type": "application/json", "X-API-Key": self.api_key, **outbound_headers()}
         try:
             resp = requests.post(f"{self.base_url}{endpoint}", json=payload or {}, headers=headers, timeout=timeout)
             resp.raise_for_status()
@@ -0,0 +1,378 @@
+"""
+Persistence — Durable agent, session and evaluation history in SQLite.
+
+The in-memory history stores only hold the last few hundred records and die
+with the process. This layer keeps everything in a WAL-mode SQLite file, so
+history survives restarts and every uvicorn worker reads the same data.
+
+- Writes are queued and flushed by one background thread in batches (one
+  transaction per batch); request handlers never wait on disk.
+- Agent audit trails are stored as zlib-compressed compact tuples
+  (offset ms, step, status code, detail) instead of lists of string dicts.
+- Indexed columns back paginated queries by time range, agent type,
+  status and session.
+
+Set HISTORY_DB_PATH to an empty string to disable persistence.
+"""
+
+import os
+import json
+import zlib
+import queue
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB_PATH = os.environ.get("HISTORY_DB_PATH", "sre_history.db")
+HISTORY_FLUSH_MS = int(os.environ.get("HISTORY_FLUSH_MS", 500))
+HISTORY_BATCH_SIZE = int(os.environ.get("HISTORY_BATCH_SIZE", 200))
+HISTORY_QUEUE_MAX = int(os.environ.get("HISTORY_QUEUE_MAX", 10000))
+
+_EVENT_STATUS = {"pending": 0, "running": 1, "completed": 2, "error": 3}
+_EVENT_STATUS_NAMES = {v: k for k, v in _EVENT_STATUS.items()}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agent_runs (
+    agent_id      TEXT PRIMARY KEY,
+    agent_type    TEXT NOT NULL,
+    action        TEXT,
+    status        TEXT,
+    created_at    REAL NOT NULL,
+    completed_at  REAL,
+    duration      REAL,
+    result_size   INTEGER,
+    process_id    INTEGER,
+    params        TEXT,
+    events        BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_agent_runs_completed ON agent_runs (completed_at);
+CREATE INDEX IF NOT EXISTS idx_agent_runs_type ON agent_runs (agent_type, completed_at);
+CREATE INDEX IF NOT EXISTS idx_agent_runs_status ON agent_runs (status, completed_at);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id  TEXT PRIMARY KEY,
+    ts          REAL NOT NULL,
+    user_query  TEXT,
+    agent       TEXT,
+    action      TEXT,
+    agent_id    TEXT,
+    status      TEXT,
+    duration    REAL,
+    routed_by   TEXT,
+    ttft_ms     REAL,
+    stream_ms   REAL,
+    total_ms    REAL,
+    evaluation  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_ts ON sessions (ts);
+CREATE INDEX IF NOT EXISTS idx_sessions_agent ON sessions (agent, ts);
+CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions (status, ts);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    id                INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id        TEXT,
+    ts                REAL NOT NULL,
+    agent_type        TEXT,
+    action            TEXT,
+    engine            TEXT,
+    answer_relevance  REAL,
+    faithfulness      REAL,
+    content_safety    REAL,
+    safety_passed     INTEGER,
+    overall_score     REAL,
+    duration          REAL,
+    user_query        TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_ts ON evaluations (ts);
+CREATE INDEX IF NOT EXISTS idx_evaluations_session ON evaluations (session_id);
+CREATE INDEX IF NOT EXISTS idx_evaluations_type ON evaluations (agent_type, ts);
+"""
+
+
+def _epoch(iso: Optional[str]) -> Optional[float]:
+    """Naive-UTC ISO timestamp (as used throughout the app) → epoch seconds."""
+    if not iso:
+        return None
+    return datetime.fromisoformat(iso).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _iso(epoch: Optional[float]) -> Optional[str]:
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def pack_events(events: List[dict], created_at: float) -> bytes:
+    rows = [
+        (
+            round((_epoch(e.get("timestamp")) - created_at) * 1000) if e.get("timestamp") else None,
+            e.get("step", ""),
+            _EVENT_STATUS.get(e.get("status"), 1),
+            e.get("detail", ""),
+        )
+        for e in events
+    ]
+    return zlib.compress(json.dumps(rows, separators=(",", ":"), ensure_ascii=False).encode())
+
+
+def unpack_events(blob: Optional[bytes], created_at: float, agent_id: str, agent_type: str) -> List[dict]:
+    if not blob:
+        return []
+    return [
+        {
+            "step": step,
+            "status": _EVENT_STATUS_NAMES.get(status, "running"),
+            "detail": detail,
+            "agent_id": agent_id,
+            "agent_type": agent_type,
+            "timestamp": _iso(created_at + offset / 1000) if offset is not None else None,
+        }
+        for offset, step, status, detail in json.loads(zlib.decompress(blob))
+    ]
+
+
+class HistoryDB:
+    """WAL-mode SQLite history with a batching background writer."""
+
+    def __init__(self, path: str = HISTORY_DB_PATH):
+        self.path = path
+        self.enabled = bool(path)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=HISTORY_QUEUE_MAX)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._batch_lock = threading.Lock()      # held while a batch is collected and written
+        self._dropped = 0
+        self._written = 0
+        self._batches = 0
+        if self.enabled:
+            try:
+                conn = self._connect()
+                conn.executescript(SCHEMA)
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error("History DB disabled — cannot open %s: %s", path, e)
+                self.enabled = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ── Writes (queued) ─────────────────────────────────────────────
+    def _enqueue(self, sql: str, row: tuple) -> None:
+        if not self.enabled:
+            return
+        if self._writer is None:
+            self._start_writer()
+        try:
+            self._queue.put_nowait((sql, row))
+        except queue.Full:
+            self._dropped += 1
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="history-db-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            # Block for the first row, then collect for at most one flush interval
+            batch = [self._queue.get()]
+            with self._batch_lock:
+                deadline = time.monotonic() + HISTORY_FLUSH_MS / 1000
+                try:
+                    while len(batch) < HISTORY_BATCH_SIZE:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    pass
+                self._flush(conn, batch)
+
+    def _flush(self, conn: sqlite3.Connection, batch: list) -> None:
+        try:
+            with conn:
+                for sql, row in batch:
+                    conn.execute(sql, row)
+            self._written += len(batch)
+            self._batches += 1
+        except sqlite3.Error as e:
+            logger.error("History DB write of %d rows failed: %s", len(batch), e)
+
+    def flush(self) -> None:
+        """Write everything queued so far on the calling thread (shutdown, tests).
+
+        Waits for the writer's in-flight batch first, so nothing it already took is lost.
+        """
+        with self._batch_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch and self.enabled:
+                self._flush(self._connect(), batch)
+
+    def record_agent_run(self, entry: dict) -> None:
+        created = _epoch(entry["created_at"])
+        self._enqueue(
+            "INSERT OR REPLACE INTO agent_runs VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+            (
+                entry["agent_id"], entry["agent_type"], entry.get("action"), entry.get("result_status"),
+                created, _epoch(entry.get("completed_at")), entry.get("duration_seconds"),
+                entry.get("result_size_bytes"), entry.get("process_id"),
+                json.dumps(entry.get("params"), default=str, separators=(",", ":")),
+                pack_events(entry.get("events", []), created),
+            ),
+        )
+
+    def record_session(self, record: dict) -> None:
+        self._enqueue(
+            "INSERT OR REPLACE INTO sessions VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            (
+                record["session_id"], _epoch(record["timestamp"]), record.get("user_query"),
+                record.get("agent"), record.get("action"), record.get("agent_id"), record.get("status"),
+                record.get("duration"), record.get("routed_by"), record.get("ttft_ms"),
+                record.get("stream_ms"), record.get("total_ms"), record.get("evaluation"),
+            ),
+        )
+
+    def record_evaluation(self, record: dict) -> None:
+        metrics = record.get("metrics", {})
+        safety = metrics.get("content_safety", {})
+        passed = safety.get("passed")
+        self._enqueue(
+            "INSERT INTO evaluations (session_id, ts, agent_type, action, engine, answer_relevance, "
+            "faithfulness, content_safety, safety_passed, overall_score, duration, user_query) "
+            "VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+            (
+                record.get("session_id"), _epoch(record["timestamp"]), record.get("agent_type"),
+                record.get("action"), record.get("evaluation_engine"),
+                metrics.get("answer_relevance", {}).get("score"), metrics.get("faithfulness", {}).get("score"),
+                safety.get("score"), None if passed is None else int(passed),
+                record.get("overall_score"), record.get("evaluation_duration_seconds"), record.get("user_query"),
+            ),
+        )
+
+    # ── Reads ───────────────────────────────────────────────────────
+    @staticmethod
+    def _where(filters: List[tuple], time_col: str, since: Optional[str], until: Optional[str]):
+        clauses, args = [], []
+        for column, value in filters:
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since:
+            clauses.append(f"{time_col} >= ?")
+            args.append(_epoch(since))
+        if until:
+            clauses.append(f"{time_col} < ?")
+            args.append(_epoch(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def _page(self, table: str, time_col: str, where: str, args: list, limit: int, offset: int):
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}{where}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM {table}{where} ORDER BY {time_col} DESC LIMIT ? OFFSET ?",
+            args + [limit, offset],
+        ).fetchall()
+        return rows, total
+
+    def query_agent_runs(self, limit: int = 50, offset: int = 0, agent_type: str = None,
+                         status: str = None, since: str = None, until: str = None) -> dict:
+        where, args = self._where([("agent_type", agent_type), ("status", status)], "completed_at", since, until)
+        rows, total = self._page("agent_runs", "completed_at", where, args, limit, offset)
+        return {"items": [self._agent_row(r) for r in rows], "total": total}
+
+    def get_agent_run(self, agent_id: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        row = self._connect().execute("SELECT * FROM agent_runs WHERE agent_id = ?", (agent_id,)).fetchone()
+        return self._agent_row(row) if row else None
+
+    @staticmethod
+    def _agent_row(r: sqlite3.Row) -> dict:
+        return {
+            "agent_id": r["agent_id"],
+            "agent_type": r["agent_type"],
+            "action": r["action"],
+            "params": json.loads(r["params"]) if r["params"] else None,
+            "status": "destroyed",
+            "result_status": r["status"],
+            "created_at": _iso(r["created_at"]),
+            "completed_at": _iso(r["completed_at"]),
+            "duration_seconds": r["duration"],
+            "result_size_bytes": r["result_size"],
+            "process_id": r["process_id"],
+            "events": unpack_events(r["events"], r["created_at"], r["agent_id"], r["agent_type"]),
+        }
+
+    def query_sessions(self, limit: int = 50, offset: int = 0, agent: str = None, status: str = None,
+                       session_id: str = None, since: str = None, until: str = None) -> dict:
+        where, args = self._where(
+            [("agent", agent), ("status", status), ("session_id", session_id)], "ts", since, until
+        )
+        rows, total = self._page("sessions", "ts", where, args, limit, offset)
+        items = []
+        for r in rows:
+            item = {k: r[k] for k in r.keys() if k != "ts"}
+            item["timestamp"] = _iso(r["ts"])
+            items.append(item)
+        return {"items": items, "total": total}
+
+    def query_evaluations(self, limit: int = 50, offset: int = 0, agent_type: str = None,
+                          session_id: str = None, since: str = None, until: str = None) -> dict:
+        where, args = self._where([("agent_type", agent_type), ("session_id", session_id)], "ts", since, until)
+        rows, total = self._page("evaluations", "ts", where, args, limit, offset)
+        items = []
+        for r in rows:
+            item = {k: r[k] for k in r.keys() if k not in ("id", "ts")}
+            item["timestamp"] = _iso(r["ts"])
+            items.append(item)
+        return {"items": items, "total": total}
+
+    def evaluation_stats(self, agent_type: str = None, since: str = None, until: str = None) -> dict:
+        """Same shape as watsonx_evaluator.get_evaluation_stats, over any time range."""
+        where, args = self._where([("agent_type", agent_type)], "ts", since, until)
+        r = self._connect().execute(
+            "SELECT COUNT(*), AVG(answer_relevance), AVG(faithfulness), AVG(content_safety), "
+            f"SUM(safety_passed) FROM evaluations{where}", args
+        ).fetchone()
+        total = r[0]
+        return {
+            "total_evaluations": total,
+            "avg_answer_relevance": round(r[1], 3) if r[1] is not None else None,
+            "avg_faithfulness": round(r[2], 3) if r[2] is not None else None,
+            "avg_content_safety": round(r[3], 3) if r[3] is not None else None,
+            "content_safety_pass_rate": round((r[4] or 0) / total * 100, 1) if total else None,
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "queued": self._queue.qsize(),
+            "rows_written": self._written,
+            "batches": self._batches,
+            "dropped": self._dropped,
+        }
+
+
+# ── Singleton ───────────────────────────────────────────────────────
+history_db = HistoryDB()
@@ -8,6 +8,9 @@ let ws = null;
 let reconnectTimer = null;
 let agentTimer = null;
 let agentStartTime = null;
+let messageSeq = 0;           // client_msg_id counter, echoed back in session_started
+const streamingText = {};   // session_id → markdown received so far
+const streamingRender = {}; // session_id → pending animation frame
 const AGENT_ICONS = {
     log_agent: '📋', health_agent: '🏥', monitoring_agent: '📡',
     runbook_agent: '📕', trace_agent: '🔗', dashboard_agent: '📊',
@@ -41,6 +44,8 @@ function connect() {
         connectionStatus.className = 'connection-status connected';
         statusText.textContent = 'Connected';
         if (reconnectTimer) { clearTimeout(reconnectTimer); reconnectTimer = null; }
+        // Resume an open inspect panel from the last rev it applied
+        if (inspectState) watchAgent(inspectState.agentId, inspectState.rev);
     };
 
     ws.onclose = () => {
@@ -63,9 +68,24 @@ function connect() {
             case 'pipeline_event':
                 handlePipelineEvent(msg.data);
                 break;
+            case 'pipeline_batch':
+                msg.data.forEach(handlePipelineEvent);
+                break;
+            case 'session_started':
+                handleSessionStarted(msg.data);
+                break;
+            case 'chat_delta':
+                handleChatDelta(msg.data);
+                break;
             case 'chat_response':
                 handleChatResponse(msg.data);
                 break;
+            case 'agent_diff':
+                handleAgentDiffs([msg.data]);
+                break;
+            case 'agent_diff_batch':
+                handleAgentDiffs(msg.data);
+                break;
             case 'evaluation_result':
                 handleEvaluationResult(msg.data);
                 break;
@@ -165,22 +185,98 @@ function handlePipelineEvent(data) {
     saveState();
 }
 
+function findSessionMessage(sessionId) {
+    if (!sessionId) return null;
+    return chatMessages.querySelector(`.agent-message[data-session-id="${CSS.escape(sessionId)}"]`);
+}
+
+function findTypingIndicator(sessionId) {
+    // Several investigations can run at once — each has its own typing indicator
+    return (sessionId && chatMessages.querySelector(`.typing-message[data-pending-session="${CSS.escape(sessionId)}"]`))
+        || chatMessages.querySelector('.typing-message');
+}
+
+function handleSessionStarted(data) {
+    const typing = data.client_msg_id &&
+        chatMessages.querySelector(`.typing-message[data-client-msg-id="${CSS.escape(data.client_msg_id)}"]`);
+    if (!typing) return;
+    typing.dataset.pendingSession = data.session_id;
+    const cancel = document.createElement('button');
+    cancel.className = 'cancel-session-btn';
+    cancel.title = data.queued ? 'Queued — cancel this investigation' : 'Cancel this investigation';
+    cancel.textContent = '⏹';
+    cancel.onclick = () => cancelSession(data.session_id);
+    typing.querySelector('.message-content').appendChild(cancel);
+}
+
+function cancelSession(sessionId) {
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    ws.send(JSON.stringify({ type: 'cancel', session_id: sessionId }));
+}
+
+function handleChatDelta(data) {
+    let div = findSessionMessage(data.session_id);
+    if (!div) {
+        // First token — swap the typing indicator for a live message bubble
+        const typing = findTypingIndicator(data.session_id);
+        if (typing) typing.remove();
+        div = document.createElement('div');
+        div.className = 'message agent-message streaming-message';
+        div.dataset.sessionId = data.session_id;
+        div.innerHTML = `
+            <div class="message-icon">${AGENT_ICONS[data.agent_type] || '🤖'}</div>
+            <div class="message-content"></div>
+        `;
+        chatMessages.appendChild(div);
+        streamingText[data.session_id] = '';
+    }
+    streamingText[data.session_id] = (streamingText[data.session_id] || '') + data.delta;
+
+    // Re-render markdown at most once per frame however fast deltas arrive
+    if (streamingRender[data.session_id]) return;
+    streamingRender[data.session_id] = requestAnimationFrame(() => {
+        delete streamingRender[data.session_id];
+        const content = div.querySelector('.message-content');
+        const text = streamingText[data.session_id];
+        if (!content || text == null) return;
+        try {
+            content.innerHTML = marked.parse(text);
+        } catch (e) {
+            content.innerHTML = `<p>${escapeHtml(text)}</p>`;
+        }
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    });
+}
+
 function handleChatResponse(data) {
     // Remove typing indicator
-    const typing = chatMessages.querySelector('.typing-message');
+    const typing = findTypingIndicator(data.session_id);
     if (typing) typing.remove();
 
-    // Add agent response
     const agentIcon = AGENT_ICONS[data.agent_type] || '🤖';
-    addMessage(data.message, 'agent', agentIcon, data.agent_type);
+    const streamed = findSessionMessage(data.session_id);
+    if (streamed) {
+        // Replace the progressive render with the final copy
+        if (streamingRender[data.session_id]) cancelAnimationFrame(streamingRender[data.session_id]);
+        delete streamingRender[data.session_id];
+        delete streamingText[data.session_id];
+    }
+    const div = addMessage(data.message, 'agent', agentIcon, data.agent_type, data.session_id);
+    if (streamed) {
+        streamed.replaceWith(div);
+        saveState();
+    }
 }
 
 function handleEvaluationResult(data) {
-    // Attach governance scorecard to the last agent message
-    const agentMessages = chatMessages.querySelectorAll('.agent-message:not(.typing-message)');
-    if (agentMessages.length === 0) return;
-    const lastMsg = agentMessages[agentMessages.length - 1];
-    const content = lastMsg.querySelector('.message-content');
+    // Evaluations arrive asynchronously — attach to the message of the evaluated session
+    let targetMsg = findSessionMessage(data.session_id);
+    if (!targetMsg) {
+        const agentMessages = chatMessages.querySelectorAll('.agent-message:not(.typing-message)');
+        if (agentMessages.length === 0) return;
+        targetMsg = agentMessages[agentMessages.length - 1];
+    }
+    const content = targetMsg.querySelector('.message-content');
     if (!content) return;
 
     const metrics = data.metrics || {};
@@ -258,8 +354,10 @@ function sendMessage() {
     startAgentTimer();
 
     // Show typing indicator
+    const clientMsgId = `m${++messageSeq}`;
     const typingDiv = document.createElement('div');
     typingDiv.className = 'message agent-message typing-message';
+    typingDiv.dataset.clientMsgId = clientMsgId;
     typingDiv.innerHTML = `
         <div class="message-icon">🤖</div>
         <div class="message-content">
@@ -272,15 +370,16 @@ function sendMessage() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 
     // Send over WebSocket
-    ws.send(JSON.stringify({ message: text }));
+    ws.send(JSON.stringify({ message: text, client_msg_id: clientMsgId }));
 
     chatInput.value = '';
     chatInput.style.height = 'auto';
 }
 
-function addMessage(content, type, icon, agentType) {
+function addMessage(content, type, icon, agentType, sessionId) {
     const div = document.createElement('div');
     div.className = `message ${type}-message`;
+    if (sessionId) div.dataset.sessionId = sessionId;
 
     let renderedContent = content;
     if (type === 'agent') {
@@ -315,6 +414,7 @@ function addMessage(content, type, icon, agentType) {
 
     // Persist chat to sessionStorage
     saveState();
+    return div;
 }
 
 // ── Pipeline Functions ─────────────────────────────────────────────
@@ -468,19 +568,26 @@ document.querySelectorAll('.hint-chip').forEach(chip => {
 });
 
 // ── Inspect Panel ──────────────────────────────────────────────────
-let inspectPollTimer = null;
+// The registry pushes diffs (status changes, new events) with a per-agent rev;
+// the panel applies them in order and asks to catch up when it sees a gap.
+let inspectState = null;   // { agentId, agent, rev, resyncing, renderFrame }
 
 function openInspectPanel(agentId) {
     const overlay = document.getElementById('inspectOverlay');
     overlay.classList.add('open');
     document.getElementById('inspectBody').innerHTML = '<div class="inspect-loading"><div class="inspect-spinner"></div><p>Loading agent data...</p></div>';
-    fetchInspectData(agentId);
-    inspectPollTimer = setInterval(() => fetchInspectData(agentId), 2000);
+    if (inspectState) unwatchAgent(inspectState.agentId);
+    inspectState = { agentId, agent: null, rev: null, resyncing: true, renderFrame: null };
+    watchAgent(agentId, null);
 }
 
 function closeInspectPanel() {
     document.getElementById('inspectOverlay').classList.remove('open');
-    if (inspectPollTimer) { clearInterval(inspectPollTimer); inspectPollTimer = null; }
+    if (inspectState) {
+        if (inspectState.renderFrame) cancelAnimationFrame(inspectState.renderFrame);
+        unwatchAgent(inspectState.agentId);
+        inspectState = null;
+    }
 }
 
 document.getElementById('inspectClose').addEventListener('click', closeInspectPanel);
@@ -488,21 +595,60 @@ document.getElementById('inspectOverlay').addEventListener('click', (e) => {
     if (e.target === e.currentTarget) closeInspectPanel();
 });
 
-async function fetchInspectData(agentId) {
-    try {
-        const resp = await fetch(`/api/agents/${agentId}`);
-        if (!resp.ok) {
-            renderInspectGone(agentId);
-            if (inspectPollTimer) { clearInterval(inspectPollTimer); inspectPollTimer = null; }
+function watchAgent(agentId, since) {
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    ws.send(JSON.stringify({ type: 'watch_agent', agent_id: agentId, since }));
+}
+
+function unwatchAgent(agentId) {
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    ws.send(JSON.stringify({ type: 'unwatch_agent', agent_id: agentId }));
+}
+
+function handleAgentDiffs(diffs) {
+    const state = inspectState;
+    if (!state) return;
+    for (const diff of diffs) {
+        if (diff.agent_id !== state.agentId) continue;
+        if (diff.op === 'gone') {
+            renderInspectGone(diff.agent_id);
             return;
         }
-        const data = await resp.json();
-        renderInspectData(data);
-        if (data.status === 'destroyed') {
-            if (inspectPollTimer) { clearInterval(inspectPollTimer); inspectPollTimer = null; }
+        if (diff.op === 'snapshot') {
+            state.agent = diff.agent;
+            state.rev = diff.rev;
+            state.resyncing = false;
+            continue;
+        }
+        if (state.rev === null || diff.rev <= state.rev) continue;
+        if (diff.rev !== state.rev + 1) {
+            // Missed diffs (dropped under backpressure) — ask for them once
+            if (!state.resyncing) {
+                state.resyncing = true;
+                watchAgent(state.agentId, state.rev);
+            }
+            return;
         }
-    } catch (err) {
-        console.error('Inspect fetch error:', err);
+        applyAgentDiff(state.agent, diff);
+        state.rev = diff.rev;
+        state.resyncing = false;
+    }
+    if (state.agent && !state.renderFrame) {
+        // Bursts of diffs re-render once per frame
+        state.renderFrame = requestAnimationFrame(() => {
+            state.renderFrame = null;
+            if (inspectState === state) renderInspectData(state.agent);
+        });
+    }
+}
+
+function applyAgentDiff(agent, diff) {
+    if (diff.op === 'event') {
+        agent.events = agent.events || [];
+        agent.events.push(diff.event);
+        agent.events_dropped = diff.events_dropped;
+    } else if (diff.op === 'status') {
+        Object.assign(agent, diff.changes);
     }
 }
 
@@ -570,7 +716,7 @@ function renderInspectData(d) {
         </div>
         <h4 class="inspect-timeline-title">📜 Lifecycle Event Audit Trail</h4>
         <div class="inspect-timeline">${timelineHtml}</div>
-        <div class="inspect-refresh-note"><span class="inspect-live-dot"></span> Auto-refreshing every 2s</div>
+        <div class="inspect-refresh-note"><span class="inspect-live-dot"></span> ${isDead ? 'Final state' : 'Live — updates pushed as they happen'}</div>
     `;
 }
 
@@ -0,0 +1,114 @@
+"""
+Trace Context — W3C traceparent propagation from the orchestrator outwards.
+
+Each investigation opens a trace; every agent run is a child span, and every
+MCP request carries `traceparent` / `tracestate`, so the MCP server and the
+booking app record their work under the same trace ID.
+
+The current span lives in a ContextVar. Agents make MCP calls on executor
+threads, so the loop's default executor is replaced with one that runs each
+job in a copy of the submitting context.
+"""
+
+import random
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+TRACEPARENT_VERSION = "00"
+
+
+class SpanContext(NamedTuple):
+    trace_id: str           # 32 lowercase hex
+    span_id: str            # 16 lowercase hex
+    parent_id: str = ""     # span this one was started under, "" for a root
+    sampled: bool = True
+    tracestate: str = ""
+
+    @property
+    def traceparent(self) -> str:
+        return f"{TRACEPARENT_VERSION}-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("trace_span", default=None)
+
+
+# Not cryptographic, and doesn't need to be — getrandbits is a fraction of the cost of uuid4/urandom
+def new_trace_id() -> str:
+    return f"{random.getrandbits(128) or 1:032x}"
+
+
+def new_span_id() -> str:
+    return f"{random.getrandbits(64) or 1:016x}"
+
+
+def _is_hex(value: str, length: int) -> bool:
+    return len(value) == length and value.strip("0123456789abcdef") == "" and value.strip("0") != ""
+
+
+def parse_traceparent(header: Optional[str], tracestate: str = "") -> Optional[SpanContext]:
+    """The remote parent described by a traceparent header, or None if it is missing or invalid."""
+    if not header:
+        return None
+    parts = header.strip().lower().split("-")
+    if len(parts) < 4 or parts[0] == "ff" or not _is_hex(parts[1], 32) or not _is_hex(parts[2], 16):
+        return None
+    return SpanContext(parts[1], parts[2], sampled=parts[3][-1:] in "13579bdf", tracestate=tracestate or "")
+
+
+def current() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def child_of(parent: Optional[SpanContext]) -> SpanContext:
+    """A new span under `parent`, or the root span of a new trace."""
+    if parent is None:
+        return SpanContext(new_trace_id(), new_span_id())
+    return SpanContext(parent.trace_id, new_span_id(), parent.span_id, parent.sampled, parent.tracestate)
+
+
+def begin(parent: Optional[SpanContext] = None) -> SpanContext:
+    """Start a span for the rest of the current task (each session/request runs in its own task)."""
+    ctx = child_of(parent)
+    _current.set(ctx)
+    return ctx
+
+
+@contextmanager
+def span(parent: Optional[SpanContext] = None):
+    """Make a child of `parent` (default: the current span) current for the block."""
+    ctx = child_of(parent or _current.get())
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def use(ctx: Optional[SpanContext]):
+    """Make an existing span current — for work handed to another task, e.g. a pool worker."""
+    token = _current.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current.reset(token)
+
+
+def outbound_headers() -> dict:
+    """Headers that continue the current trace on a remote service; empty outside a trace."""
+    ctx = _current.get()
+    if ctx is None:
+        return {}
+    headers = {"traceparent": ctx.traceparent}
+    if ctx.tracestate:
+        headers["tracestate"] = ctx.tracestate
+    return headers
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """Default-executor replacement that carries the caller's contextvars (and so the span) into the job."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
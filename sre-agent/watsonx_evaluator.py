@@ -11,7 +11,15 @@ import time
 import logging
 import threading
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional — overlap counts fall back to set arithmetic
+    np = None
+
+from history_store import HistoryStore
+from persistence import history_db
 
 logger = logging.getLogger(__name__)
 
@@ -29,62 +37,202 @@ if WATSONX_SERVICE_INSTANCE_ID and not os.environ.get("WXG_SERVICE_INSTANCE_ID")
 if WATSONX_REGION:
     os.environ.setdefault("WATSONX_REGION", WATSONX_REGION)
 # ── Evaluation state stored per session ─────────────────────────────
-_evaluation_history: List[dict] = []
-_eval_lock = threading.Lock()
 MAX_EVAL_HISTORY = 200
 
 
+def _evaluation_metrics(record: dict) -> dict:
+    """Values folded into the running evaluation aggregates."""
+    metrics = record.get("metrics", {})
+    return {
+        "answer_relevance": metrics.get("answer_relevance", {}).get("score"),
+        "faithfulness": metrics.get("faithfulness", {}).get("score"),
+        "content_safety": metrics.get("content_safety", {}).get("score"),
+        "content_safety_passed": 1 if metrics.get("content_safety", {}).get("passed") is True else 0,
+    }
+
+
+_evaluation_history = HistoryStore(MAX_EVAL_HISTORY, key="session_id", metrics=_evaluation_metrics)
+
+
 def _store_evaluation(record: dict):
     """Thread-safe append to evaluation history."""
-    with _eval_lock:
-        _evaluation_history.append(record)
-        if len(_evaluation_history) > MAX_EVAL_HISTORY:
-            _evaluation_history.pop(0)
+    _evaluation_history.append(record)
+    history_db.record_evaluation(record)
 
 
 def get_evaluation_history(limit: int = 50) -> List[dict]:
     """Return the most recent evaluation records."""
-    with _eval_lock:
-        return list(reversed(_evaluation_history[-limit:]))
+    return _evaluation_history.recent(limit)
 
 
 def get_evaluation_by_session(session_id: str) -> Optional[dict]:
     """Find evaluation result by session ID."""
-    with _eval_lock:
-        for rec in reversed(_evaluation_history):
-            if rec.get("session_id") == session_id:
-                return rec
-    return None
+    return _evaluation_history.get(session_id)
 
 
 def get_evaluation_stats() -> dict:
-    """Aggregate stats across all evaluations."""
-    with _eval_lock:
-        if not _evaluation_history:
-            return {
-                "total_evaluations": 0,
-                "avg_answer_relevance": None,
-                "avg_faithfulness": None,
-                "avg_content_safety": None,
-                "content_safety_pass_rate": None,
-            }
-        total = len(_evaluation_history)
-        ar_scores = [r["metrics"]["answer_relevance"]["score"] for r in _evaluation_history
-                     if r.get("metrics", {}).get("answer_relevance", {}).get("score") is not None]
-        faith_scores = [r["metrics"]["faithfulness"]["score"] for r in _evaluation_history
-                        if r.get("metrics", {}).get("faithfulness", {}).get("score") is not None]
-        safety_scores = [r["metrics"]["content_safety"]["score"] for r in _evaluation_history
-                         if r.get("metrics", {}).get("content_safety", {}).get("score") is not None]
-        safety_passes = [1 for r in _evaluation_history
-                         if r.get("metrics", {}).get("content_safety", {}).get("passed") is True]
-
+    """Aggregate stats across all evaluations (running totals — O(1))."""
+    total = len(_evaluation_history)
+    if not total:
         return {
-            "total_evaluations": total,
-            "avg_answer_relevance": round(sum(ar_scores) / len(ar_scores), 3) if ar_scores else None,
-            "avg_faithfulness": round(sum(faith_scores) / len(faith_scores), 3) if faith_scores else None,
-            "avg_content_safety": round(sum(safety_scores) / len(safety_scores), 3) if safety_scores else None,
-            "content_safety_pass_rate": round(len(safety_passes) / total * 100, 1) if total > 0 else None,
+            "total_evaluations": 0,
+            "avg_answer_relevance": None,
+            "avg_faithfulness": None,
+            "avg_content_safety": None,
+            "content_safety_pass_rate": None,
         }
+    passes = _evaluation_history.sums().get("content_safety_passed", {}).get("sum", 0)
+    return {
+        "total_evaluations": total,
+        "avg_answer_relevance": _evaluation_history.aggregate("answer_relevance"),
+        "avg_faithfulness": _evaluation_history.aggregate("faithfulness"),
+        "avg_content_safety": _evaluation_history.aggregate("content_safety"),
+        "content_safety_pass_rate": round(passes / total * 100, 1),
+    }
+
+
+# ── Heuristic scoring (fallback engine) ─────────────────────────────
+# Tables are compiled once at import; scoring a record lower-cases and tokenizes
+# each text a single time and reuses the result for every metric.
+STOP_WORDS = frozenset({
+    "the", "a", "an", "is", "are", "was", "were", "in", "on", "at",
+    "to", "for", "of", "and", "or", "but", "not", "with", "this", "that",
+    "it", "be", "as", "by", "from", "has", "have", "had", "do", "does",
+    "did", "will", "would", "could", "should", "may", "might", "can",
+    "me", "my", "i", "you", "your", "we", "our", "they", "their", "what",
+    "how", "when", "where", "why", "which", "who", "check", "show", "get",
+})
+FAITHFUL_PATTERNS = ("|", "```", "timestamp", "status", "error", "health",
+                     "ms", "seconds", "%", "count", "total", "avg")
+UNSAFE_PATTERNS = ("hack", "exploit", "attack", "password", "credential",
+                   "kill", "destroy", "damage", "malicious", "inject")
+RELEVANCE_INDICATORS = ("✅", "❌", "⚠️", "###", "**")
+EVAL_USE_NUMPY = os.environ.get("EVAL_USE_NUMPY", "false").lower()
+
+
+class _PatternSet:
+    """
+    Counts which of a fixed set of substrings occur in already-lowercased text.
+
+    The table is lowercased and de-duplicated once. A single-regex alternation
+    was measured slower here than CPython's substring search, so each pattern
+    is a plain `in` scan over text that is lowercased once per record.
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        self._patterns = tuple(dict.fromkeys(p.lower() for p in patterns))
+
+    def count(self, text_lower: str) -> int:
+        return sum(1 for p in self._patterns if p in text_lower)
+
+
+class _Tokenizer:
+    """lower().split() token sets, memoized for one batch (queries and contexts repeat)."""
+
+    def __init__(self):
+        self._cache: Dict[str, frozenset] = {}
+
+    def __call__(self, text: str) -> frozenset:
+        tokens = self._cache.get(text)
+        if tokens is None:
+            tokens = self._cache[text] = frozenset(text.lower().split())
+        return tokens
+
+
+_FAITHFUL_MATCHER = _PatternSet(FAITHFUL_PATTERNS)
+_UNSAFE_MATCHER = _PatternSet(UNSAFE_PATTERNS)
+
+
+def _use_numpy() -> bool:
+    # Opt-in: building the token vocabulary in Python usually costs more than
+    # the vectorized membership test saves (see bench_evaluator.py)
+    return np is not None and EVAL_USE_NUMPY in ("1", "true", "yes")
+
+
+def _overlap_counts_numpy(left: List[set], right: List[set]) -> List[int]:
+    """|left[i] ∩ right[i]| for every row in one vectorized membership test."""
+    vocab: Dict[str, int] = {}
+    def encode(sets):
+        rows, ids = [], []
+        for row, tokens in enumerate(sets):
+            for tok in tokens:
+                rows.append(row)
+                ids.append(vocab.setdefault(tok, len(vocab)))
+        return np.asarray(rows, dtype=np.int64), np.asarray(ids, dtype=np.int64)
+    l_rows, l_ids = encode(left)
+    r_rows, r_ids = encode(right)
+    width = max(len(vocab), 1)
+    hit = np.isin(r_rows * width + r_ids, l_rows * width + l_ids)
+    return np.bincount(r_rows[hit], minlength=len(right)).tolist()
+
+
+def _overlap_counts(left: List[set], right: List[set], vectorize: bool) -> List[int]:
+    if vectorize:
+        return _overlap_counts_numpy(left, right)
+    return [len(a & b) for a, b in zip(left, right)]
+
+
+def score_heuristics_batch(triples: Sequence[Tuple[str, str, str]], use_numpy: Optional[bool] = None) -> List[dict]:
+    """
+    Heuristic governance metrics for many (query, response, context) triples.
+
+    Scores are identical to scoring each record on its own; batching only
+    shares tokenization and lets the overlap counts be computed in bulk.
+    """
+    vectorize = _use_numpy() if use_numpy is None else (use_numpy and np is not None)
+    tokens = _Tokenizer()
+    responses_lower = [response.lower() for _, response, _ in triples]
+    query_keywords = [tokens(query) - STOP_WORDS for query, _, _ in triples]
+    response_words = [frozenset(text.split()) for text in responses_lower]
+    ctx_words = [tokens(context) if context else frozenset() for _, _, context in triples]
+
+    query_hits = _overlap_counts(query_keywords, response_words, vectorize)
+    ctx_hits = _overlap_counts(response_words, ctx_words, vectorize)
+
+    results = []
+    for i, (query, response, context) in enumerate(triples):
+        # ── Answer Relevance (keyword overlap heuristic) ────────
+        if query_keywords[i]:
+            overlap = query_hits[i] / len(query_keywords[i])
+            answer_relevance = min(round(overlap * 1.2, 3), 1.0)  # boost slightly
+        else:
+            answer_relevance = 0.5
+        # Boost relevance if response has substantial content
+        if len(response) > 200:
+            answer_relevance = min(answer_relevance + 0.15, 1.0)
+        if any(indicator in response for indicator in RELEVANCE_INDICATORS):
+            answer_relevance = min(answer_relevance + 0.1, 1.0)
+
+        # ── Faithfulness (context grounding heuristic) ──────────
+        signals = _FAITHFUL_MATCHER.count(responses_lower[i])
+        faithfulness = min(round(signals / len(FAITHFUL_PATTERNS) * 1.5, 3), 1.0)
+        if context:
+            ctx_overlap = ctx_hits[i] / max(len(response_words[i]), 1)
+            faithfulness = min(round((faithfulness + ctx_overlap) / 2 * 1.3, 3), 1.0)
+
+        # ── Content Safety (toxicity/safety heuristic) ──────────
+        unsafe_count = _UNSAFE_MATCHER.count(responses_lower[i])
+        safety_score = max(1.0 - (unsafe_count * 0.2), 0.0)
+
+        results.append({
+            "answer_relevance": {
+                "score": round(answer_relevance, 3),
+                "label": "Answer Relevance",
+                "description": "How relevant the response is to the user query"
+            },
+            "faithfulness": {
+                "score": round(faithfulness, 3),
+                "label": "Faithfulness",
+                "description": "Whether the response is grounded in actual data/context"
+            },
+            "content_safety": {
+                "score": round(safety_score, 3),
+                "passed": safety_score >= 0.5,
+                "label": "Content Safety",
+                "description": "Automated safety checks on generated content"
+            },
+        })
+    return results
 
 
 class WatsonxEvaluator:
@@ -103,6 +251,9 @@ class WatsonxEvaluator:
     def __init__(self):
         self._available = False
         self._evaluator = None
+        # The evaluator's start_run → evaluate → end_run → get_result sequence is stateful;
+        # evaluation workers share it, so only one run may be open at a time
+        self._run_lock = threading.Lock()
         self._agent_app = None
         self._init_error = None
         self._initialize()
@@ -196,6 +347,84 @@ class WatsonxEvaluator:
                 session_id, user_query, agent_response, agent_type, action, raw_context, start_time
             )
 
+    def evaluate_batch(self, items: List[dict]) -> List[dict]:
+        """
+        Evaluate several responses, sharing one watsonx.governance run where possible.
+
+        Each item holds evaluate_response's keyword arguments; results come back
+        in the same order. If the batched run fails or its metrics can't be
+        attributed to individual records, items are evaluated one by one.
+        """
+        if not self._available:
+            start_time = time.time()
+            all_metrics = score_heuristics_batch(
+                [(i["user_query"], i["agent_response"], i.get("raw_context", "")) for i in items]
+            )
+            return [
+                self._fallback_record(i["session_id"], i["user_query"], i["agent_type"], i["action"],
+                                      metrics, start_time)
+                for i, metrics in zip(items, all_metrics)
+            ]
+        if len(items) == 1:
+            return [self.evaluate_response(**items[0])]
+        try:
+            return self._watsonx_batch_evaluation(items, time.time())
+        except Exception as e:
+            logger.error("Batched watsonx evaluation failed, evaluating individually: %s", e)
+            return [self.evaluate_response(**item) for item in items]
+
+    def _watsonx_batch_evaluation(self, items: List[dict], start_time: float) -> List[dict]:
+        """One start_run/end_run around every item in the batch."""
+        with self._run_lock:
+            self._evaluator.start_run()
+            for item in items:
+                raw_context = item.get("raw_context", "")
+                self._evaluator.evaluate({
+                    "input_text": item["user_query"],
+                    "generated_text": item["agent_response"],
+                    "local_context": [raw_context] if raw_context else [item["agent_response"]],
+                    "web_context": [],
+                    "ground_truth": "",
+                })
+            self._evaluator.end_run()
+            metric_df = self._evaluator.get_result().to_df()
+
+        per_record = self._split_batch_df(metric_df, len(items))
+        if per_record is None:
+            raise ValueError("could not attribute batch metrics to individual records")
+
+        duration = time.time() - start_time
+        records = []
+        for item, metric_df in zip(items, per_record):
+            metrics = self._parse_metric_results(metric_df)
+            record = {
+                "session_id": item["session_id"],
+                "user_query": item["user_query"],
+                "agent_type": item["agent_type"],
+                "action": item["action"],
+                "evaluation_engine": "ibm_watsonx_governance",
+                "evaluation_duration_seconds": round(duration, 2),
+                "timestamp": datetime.utcnow().isoformat(),
+                "metrics": metrics,
+                "overall_score": self._compute_overall_score(metrics),
+                "status": "success",
+            }
+            _store_evaluation(record)
+            records.append(record)
+        return records
+
+    @staticmethod
+    def _split_batch_df(metric_df, expected: int):
+        """Split a multi-record metric DataFrame by record, in submission order."""
+        if metric_df is None or metric_df.empty:
+            return None
+        for column in ("record_id", "interaction_id", "message_id"):
+            if column in metric_df.columns:
+                ids = list(dict.fromkeys(metric_df[column]))
+                if len(ids) == expected:
+                    return [metric_df[metric_df[column] == rid] for rid in ids]
+        return None
+
     def _watsonx_evaluation(
         self,
         session_id: str,
@@ -208,9 +437,6 @@ class WatsonxEvaluator:
     ) -> dict:
         """Run actual IBM watsonx.governance evaluation."""
         try:
-            # Start evaluation run (as shown in the notebook)
-            self._evaluator.start_run()
-
             # Create the state dict matching the GraphState pattern from the notebook
             eval_state = {
                 "input_text": user_query,
@@ -220,13 +446,17 @@ class WatsonxEvaluator:
                 "ground_truth": "",  # No ground truth in live SRE queries
             }
 
-            # The evaluator computes metrics on the state
-            self._evaluator.evaluate(eval_state)
-            self._evaluator.end_run()
+            with self._run_lock:
+                # Start evaluation run (as shown in the notebook)
+                self._evaluator.start_run()
+
+                # The evaluator computes metrics on the state
+                self._evaluator.evaluate(eval_state)
+                self._evaluator.end_run()
 
-            # Get results as DataFrame (notebook pattern)
-            eval_result = self._evaluator.get_result()
-            metric_df = eval_result.to_df()
+                # Get results as DataFrame (notebook pattern)
+                eval_result = self._evaluator.get_result()
+                metric_df = eval_result.to_df()
 
             # Parse the DataFrame into our metrics dict
             metrics = self._parse_metric_results(metric_df)
@@ -296,73 +526,11 @@ class WatsonxEvaluator:
         Heuristic-based fallback evaluation when Watson governance is unavailable.
         Uses text analysis to approximate the governance metrics.
         """
-        metrics = {}
-
-        # ── Answer Relevance (keyword overlap heuristic) ────────
-        query_words = set(user_query.lower().split())
-        response_words = set(agent_response.lower().split())
-        # Remove common stop words
-        stop_words = {"the", "a", "an", "is", "are", "was", "were", "in", "on", "at",
-                       "to", "for", "of", "and", "or", "but", "not", "with", "this", "that",
-                       "it", "be", "as", "by", "from", "has", "have", "had", "do", "does",
-                       "did", "will", "would", "could", "should", "may", "might", "can",
-                       "me", "my", "i", "you", "your", "we", "our", "they", "their", "what",
-                       "how", "when", "where", "why", "which", "who", "check", "show", "get"}
-        query_keywords = query_words - stop_words
-        if query_keywords:
-            overlap = len(query_keywords & response_words) / len(query_keywords)
-            answer_relevance = min(round(overlap * 1.2, 3), 1.0)  # boost slightly
-        else:
-            answer_relevance = 0.5
-
-        # Boost relevance if response has substantial content
-        if len(agent_response) > 200:
-            answer_relevance = min(answer_relevance + 0.15, 1.0)
-        if any(indicator in agent_response for indicator in ["✅", "❌", "⚠️", "###", "**"]):
-            answer_relevance = min(answer_relevance + 0.1, 1.0)
-
-        metrics["answer_relevance"] = {
-            "score": round(answer_relevance, 3),
-            "label": "Answer Relevance",
-            "description": "How relevant the response is to the user query"
-        }
-
-        # ── Faithfulness (context grounding heuristic) ──────────
-        # Higher if response contains structured data indicators (tables, metrics, timestamps)
-        faithfulness_signals = 0
-        faithful_patterns = ["|", "```", "timestamp", "status", "error", "health",
-                              "ms", "seconds", "%", "count", "total", "avg"]
-        for pattern in faithful_patterns:
-            if pattern.lower() in agent_response.lower():
-                faithfulness_signals += 1
-        faithfulness = min(round(faithfulness_signals / len(faithful_patterns) * 1.5, 3), 1.0)
-
-        # If raw context available, check overlap
-        if raw_context:
-            ctx_words = set(raw_context.lower().split())
-            ctx_overlap = len(response_words & ctx_words) / max(len(response_words), 1)
-            faithfulness = min(round((faithfulness + ctx_overlap) / 2 * 1.3, 3), 1.0)
-
-        metrics["faithfulness"] = {
-            "score": round(faithfulness, 3),
-            "label": "Faithfulness",
-            "description": "Whether the response is grounded in actual data/context"
-        }
-
-        # ── Content Safety (toxicity/safety heuristic) ──────────
-        unsafe_patterns = [
-            "hack", "exploit", "attack", "password", "credential",
-            "kill", "destroy", "damage", "malicious", "inject"
-        ]
-        unsafe_count = sum(1 for p in unsafe_patterns if p in agent_response.lower())
-        safety_score = max(1.0 - (unsafe_count * 0.2), 0.0)
-        metrics["content_safety"] = {
-            "score": round(safety_score, 3),
-            "passed": safety_score >= 0.5,
-            "label": "Content Safety",
-            "description": "Automated safety checks on generated content"
-        }
+        metrics = score_heuristics_batch([(user_query, agent_response, raw_context)])[0]
+        return self._fallback_record(session_id, user_query, agent_type, action, metrics, start_time)
 
+    def _fallback_record(self, session_id: str, user_query: str, agent_type: str, action: str,
+                         metrics: dict, start_time: float) -> dict:
         duration = time.time() - start_time
         record = {
             "session_id": session_id,